@@ -1,23 +1,143 @@
 import os
+import time
 from argparse import ArgumentParser
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from os import urandom
 
 import numpy as np
 from tqdm import tqdm
 
+from superphot_plus.fit_manifest import FitManifest, fit_fingerprint, prior_hash
 from superphot_plus.lightcurve import Lightcurve
+from superphot_plus.posterior_store import PosteriorShardWriter
 from superphot_plus.samplers.dynesty_sampler import DynestySampler
 from superphot_plus.samplers.iminuit_sampler import IminuitSampler
 from superphot_plus.samplers.licu_sampler import LiCuSampler
 from superphot_plus.samplers.numpyro_sampler import NumpyroSampler
 from superphot_plus.surveys.surveys import Survey
 
+# Relative cost of fitting one light curve point with each sampler.
+SAMPLER_COSTS = {
+    "dynesty": 20.0,
+    "NUTS": 10.0,
+    "licu-mcmc-ceres": 10.0,
+    "svi": 2.0,
+    "iminuit": 1.0,
+    "licu-ceres": 1.0,
+}
+CHUNKS_PER_WORKER = 8
+MAX_RETRIES = 2
+STRAGGLER_FACTOR = 3.0
+
+
+def make_chunks(lightcurves, costs, num_chunks):
+    """Groups light curves into chunks of similar estimated cost.
+
+    Light curves are taken from most to least expensive, so the
+    expensive chunks are scheduled first and the cheap ones fill the
+    tail of the run.
+
+    Parameters
+    ----------
+    lightcurves : list of str
+        The light curve file names.
+    costs : np.ndarray
+        The estimated cost of each light curve.
+    num_chunks : int
+        The approximate number of chunks to make.
+
+    Returns
+    -------
+    list of list of str
+        The light curves of each chunk.
+    """
+    target_cost = np.sum(costs) / max(num_chunks, 1)
+    chunks, chunk, chunk_cost = [], [], 0.0
+    for i in np.argsort(costs, kind="stable")[::-1]:
+        chunk.append(lightcurves[i])
+        chunk_cost += costs[i]
+        if chunk_cost >= target_cost:
+            chunks.append(chunk)
+            chunk, chunk_cost = [], 0.0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def report_timings(chunks, chunk_costs, chunk_seconds, num_fitted, total_seconds):
+    """Prints the throughput of a run, and the chunks that took much
+    longer than their estimated cost suggests.
+
+    Parameters
+    ----------
+    chunks : list of list of str
+        The light curves of each chunk.
+    chunk_costs : list of float
+        The estimated cost of each chunk.
+    chunk_seconds : dict
+        The fitting time of each completed chunk, keyed by chunk index.
+    num_fitted : int
+        The number of light curves fit successfully.
+    total_seconds : float
+        The wall time of the run.
+    """
+    print(
+        f"Fitted {num_fitted} light curves in {total_seconds:.1f} s "
+        f"({num_fitted / max(total_seconds, 1e-9):.2f} light curves/s)."
+    )
+    if not chunk_seconds:
+        return
+
+    idxs = np.array(list(chunk_seconds))
+    seconds = np.array([chunk_seconds[i] for i in idxs])
+    seconds_per_cost = seconds / np.array(chunk_costs)[idxs]
+    slow = seconds_per_cost > STRAGGLER_FACTOR * np.median(seconds_per_cost)
+    for i, chunk_time in zip(idxs[slow], seconds[slow]):
+        print(f"Straggler: chunk {i} took {chunk_time:.1f} s for {chunks[i]}")
+
+
+def run_sampler(sampler, kwargs, lightcurves_dir, lightcurves):
+    """Runs fitting for a set of light curves, in a worker process.
+
+    A module-level function, so that submitting it to a worker pickles
+    only its arguments. A failing light curve does not stop the others.
+
+    Parameters
+    ----------
+    sampler : Sampler
+        The sampler object.
+    kwargs : dict
+        The sampler specific arguments.
+    lightcurves_dir : str
+        Directory where light curve CSV data is stored.
+    lightcurves : list
+        The list of light curve file names.
+
+    Returns
+    -------
+    list of tuple
+        The light curve file name and sampler result of each fit.
+    dict
+        The error of each light curve that failed, keyed by file name.
+    float
+        The seconds spent fitting.
+    """
+    start_time = time.monotonic()
+    fits, errors = [], {}
+    for lc_name in lightcurves:
+        try:
+            lightcurve = Lightcurve.from_file(os.path.join(lightcurves_dir, lc_name))
+            fits.append((lc_name, sampler.run_single_curve(lightcurve, **kwargs)))
+        except Exception as exc: # pylint: disable=broad-except
+            errors[lc_name] = repr(exc)
+    return fits, errors, time.monotonic() - start_time
+
 
 class PosteriorsGenerator:
     """Generates posterior samples using multi-core parallelization."""
 
-    def __init__(self, sampler_name, lightcurves_dir, survey, num_workers, output_dir):
+    def __init__(self, sampler_name, lightcurves_dir, survey, num_workers, output_dir,
+                 shard_events=1000):
         """Generates posterior samples using multi-core parallelization.
 
         Parameters
@@ -32,15 +152,21 @@ class PosteriorsGenerator:
             Number of workers to run in parallel.
         output_dir : str
             Base directory for classification outputs.
+        shard_events : int, optional
+            Number of light curves per posterior shard. Defaults to 1000.
         """
         self.sampler_name = sampler_name
         self.lightcurves_dir = lightcurves_dir
         self.survey = Survey.ZTF() if survey == "ZTF" else Survey.LSST()
         self.num_workers = num_workers
 
-        # Initialize posteriors directory
-        self.posteriors_dir = os.path.join(output_dir, f"{sampler_name}_fits")
-        os.makedirs(self.posteriors_dir, exist_ok=True)
+        # Fingerprints of stored fits, and the sharded store of all their
+        # posteriors. Fits enter the manifest once their shard is written.
+        self.manifest = FitManifest(os.path.join(output_dir, f"{sampler_name}_manifest.json"))
+        self.writer = PosteriorShardWriter(
+            os.path.join(output_dir, f"{sampler_name}_posteriors"), shard_events
+        )
+        self.unflushed = []
 
     def generate_data(self, seed):
         """Distributes data generation between available workers.
@@ -51,42 +177,142 @@ class PosteriorsGenerator:
             Random seed value for deterministic data generation.
         """
         # Determine which posterior files to generate
-        posteriors = self.get_posteriors_to_generate()
+        lightcurves, fingerprints = self.get_posteriors_to_generate()
+        if not lightcurves:
+            return
 
-        # Split realizations evenly between workers
-        splits = np.array_split(posteriors, self.num_workers)
+        # Many small chunks of similar cost, so idle workers pick up the
+        # remaining work instead of waiting on one long static split
+        costs = np.array([self.estimate_cost(f) for f in lightcurves])
+        chunks = make_chunks(lightcurves, costs, self.num_workers * CHUNKS_PER_WORKER)
+        lc_costs = dict(zip(lightcurves, costs))
+        chunk_costs = [sum(lc_costs[f] for f in chunk) for chunk in chunks]
 
         # Initialize sampler
         sampler, kwargs = self.setup_sampler(self.sampler_name, seed)
 
+        start_time = time.monotonic()
+        chunk_seconds = {}
+        num_fitted = 0
+        failed = {}
         with ProcessPoolExecutor(self.num_workers) as executor:
-            for i, split in enumerate(splits):
-                executor.submit(
-                    self.run_sampler,
-                    sampler=sampler,
-                    kwargs=kwargs,
-                    lightcurves=split,
-                    worker_id=i,
-                )
+            pending = {
+                executor.submit(run_sampler, sampler, kwargs, self.lightcurves_dir, chunk): (i, chunk, 0)
+                for i, chunk in enumerate(chunks)
+            }
+            pbar = tqdm(total=len(lightcurves))
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, chunk, attempt = pending.pop(future)
+                    try:
+                        fits, errors, seconds = future.result()
+                    except Exception as exc: # pylint: disable=broad-except
+                        # the worker itself died, so no light curve was fit
+                        fits, errors, seconds = [], {lc_name: repr(exc) for lc_name in chunk}, None
+
+                    # results are written as soon as each chunk finishes
+                    if fits:
+                        self.record_fits(fits, fingerprints)
+                    if attempt == 0 and seconds is not None:
+                        chunk_seconds[i] = seconds
+                    num_fitted += len(fits)
+                    pbar.update(len(fits))
+
+                    # only the light curves that failed are retried
+                    if errors and attempt < MAX_RETRIES:
+                        retry = list(errors)
+                        print(f"{len(retry)} light curves of chunk {i} failed, retrying...")
+                        future = executor.submit(run_sampler, sampler, kwargs, self.lightcurves_dir, retry)
+                        pending[future] = (i, retry, attempt + 1)
+                    elif errors:
+                        failed.update(errors)
+                        pbar.update(len(errors))
+            pbar.close()
+        self.writer.flush()
+        self.update_manifest(fingerprints)
+
+        report_timings(chunks, chunk_costs, chunk_seconds, num_fitted, time.monotonic() - start_time)
+        if failed:
+            print(f"Failed to fit {len(failed)} light curves after {MAX_RETRIES} retries:")
+            for lc_name, error in failed.items():
+                print(f"  {lc_name}: {error}")
+
+    def estimate_cost(self, lc_name):
+        """Estimates the cost of fitting a light curve, as its number of
+        points times the relative cost of the sampler.
+
+        Parameters
+        ----------
+        lc_name : str
+            The name of the light curve file.
+
+        Returns
+        -------
+        float
+            The estimated cost.
+        """
+        with open(os.path.join(self.lightcurves_dir, lc_name), "rb") as file_handle:
+            num_points = sum(1 for _ in file_handle) - 1 # header row
+        return max(num_points, 1) * SAMPLER_COSTS.get(self.sampler_name, 1.0)
 
     def get_posteriors_to_generate(self):
-        """Determines which fit files to generate.
+        """Determines which light curves are new or changed since they
+        were last fit, according to the manifest.
 
         Returns
         -------
         list of str
-            The file names of the missing posterior samples.
+            The file names of the light curves to fit.
+        dict
+            The current fingerprint of every light curve, keyed by file name.
         """
-        lightcurve_files = os.listdir(self.lightcurves_dir)
-        generated_posteriors = os.listdir(self.posteriors_dir)
+        priors_hash = prior_hash(self.survey.priors)
+        # only light curves whose size or modification time changed are read
+        fingerprints = {
+            f: fit_fingerprint(
+                os.path.join(self.lightcurves_dir, f), self.sampler_name, priors_hash,
+                memo=self.manifest.hashes,
+            )
+            for f in os.listdir(self.lightcurves_dir)
+        }
+        self.manifest.save()
+        stale_lightcurves = self.manifest.stale(fingerprints)
+
+        print(f"Skipping {len(fingerprints) - len(stale_lightcurves)} unchanged light curves...")
+        print(f"Generating {len(stale_lightcurves)} posterior samples...")
+
+        return stale_lightcurves, fingerprints
+
+    def record_fits(self, fits, fingerprints):
+        """Buffers refreshed posteriors in the shard writer. Earlier fits
+        of the same events are superseded once their shard is written.
 
-        missing_posteriors = [
-            f for f in lightcurve_files if self.get_posteriors_fn(f) not in generated_posteriors
-        ]
-        print(f"Skipping {len(generated_posteriors)} realizations...")
-        print(f"Generating {len(missing_posteriors)} posterior samples...")
+        Parameters
+        ----------
+        fits : list of tuple
+            The light curve file name and sampler result of each fit.
+        fingerprints : dict
+            The fingerprint of every light curve, keyed by file name.
+        """
+        self.unflushed.extend(lc_name for lc_name, _ in fits)
+        if self.writer.add([posteriors for _, posteriors in fits]):
+            self.update_manifest(fingerprints)
 
-        return missing_posteriors
+    def update_manifest(self, fingerprints):
+        """Records the fits written to shards so far in the manifest.
+
+        Parameters
+        ----------
+        fingerprints : dict
+            The fingerprint of every light curve, keyed by file name.
+        """
+        if not self.unflushed:
+            return
+        for lc_name in self.unflushed:
+            self.manifest.update(lc_name, fingerprints[lc_name])
+        self.manifest.save()
+        self.unflushed = []
 
     def setup_sampler(self, sampler_name, seed):
         """Creates a sampler and its kwargs from its name.
@@ -131,46 +357,6 @@ class PosteriorsGenerator:
 
         return sampler_obj, kwargs
 
-    def run_sampler(self, sampler, kwargs, lightcurves, worker_id):
-        """Runs fitting for a set of light curves.
-
-        Parameters
-        ----------
-        sampler : Sampler
-            The sampler object.
-        kwargs : dict
-            The sampler specific arguments.
-        lightcurves : list
-            The list of light curve file names.
-        worker_id : int
-            The worker identifier.
-        """
-        print(f"Worker {worker_id} has started")
-
-        pbar = tqdm(lightcurves)
-        pbar.set_description(f"Worker {worker_id}")
-
-        for lc_name in pbar:
-            file = os.path.join(self.lightcurves_dir, lc_name)
-            lightcurve = Lightcurve.from_file(file)
-            posteriors = sampler.run_single_curve(lightcurve, **kwargs)
-            posteriors.save_to_file(self.posteriors_dir)
-
-    def get_posteriors_fn(self, filename):
-        """Returns the posteriors filename for a light curve and sampler.
-
-        Parameters
-        ----------
-        filename : str
-            The name of the light curve file.
-
-        Returns
-        -------
-        str
-            The name of the posterior samples file.
-        """
-        return f"{os.path.splitext(filename)[0]}_eqwt_{self.sampler_name}.npz"
-
 
 def extract_cmd_args():
     """Extracts the script command-line arguments."""
@@ -210,6 +396,11 @@ def extract_cmd_args():
         help="Number of workers for multi-core processing",
         default=3,
     )
+    parser.add_argument(
+        "--shard_events",
+        help="Number of light curves per posterior shard",
+        default=1000,
+    )
 
     return parser.parse_args()
 
@@ -223,4 +414,5 @@ if __name__ == "__main__":
         survey=args.survey,
         num_workers=int(args.num_workers),
         output_dir=args.output_dir,
+        shard_events=int(args.shard_events),
     ).generate_data(seed=int.from_bytes(urandom(4), "big"))
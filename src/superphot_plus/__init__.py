@@ -1,9 +1,22 @@
-from .data_generation import import_all_names
-from .model import SuperphotLightGBM, SuperphotMLP, ModelMetrics
-from .priors import generate_priors
-from .samplers import DynestySampler, SVISampler, NUTSSampler
-from .trainer import SuperphotTrainer
-from .config import SuperphotConfig
+import importlib
+
+from .posterior_store import PosteriorStore
+
+# Imported on first access, so that inference-only modules (such as
+# model.export and streaming) load without torch, JAX or snapi.
+_LAZY_EXPORTS = {
+    "DynestySampler": ".samplers",
+    "generate_priors": ".priors",
+    "import_all_names": ".data_generation",
+    "ModelMetrics": ".model",
+    "NUTSSampler": ".samplers",
+    "StreamingClassifier": ".streaming",
+    "SuperphotConfig": ".config",
+    "SuperphotLightGBM": ".model",
+    "SuperphotMLP": ".model",
+    "SuperphotTrainer": ".trainer",
+    "SVISampler": ".samplers",
+}
 
 __all__ = [
     "DynestySampler",
@@ -11,6 +24,8 @@ __all__ = [
     "import_all_names",
     "ModelMetrics",
     "NUTSSampler",
+    "PosteriorStore",
+    "StreamingClassifier",
     "SuperphotConfig",
     "SuperphotLightGBM",
     "SuperphotMLP",
@@ -19,3 +34,13 @@ __all__ = [
 ]
 
 
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
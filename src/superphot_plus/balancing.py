@@ -0,0 +1,110 @@
+"""Class-balanced selection of posterior draws."""
+import numpy as np
+from torch.utils.data import Sampler
+
+
+def class_quotas(labels, fits_per_majority, num_draws=None):
+    """Number of draws to take from each event, so that every class
+    contributes as many draws as fits_per_majority per majority-class
+    event.
+
+    Parameters
+    ----------
+    labels : array-like
+        (num_events,) class label of each event.
+    fits_per_majority : int
+        Draws per event of the most populated class.
+    num_draws : np.ndarray of int, optional
+        (num_events,) number of draws of each event. Events without
+        draws neither count towards their class nor receive a quota.
+
+    Returns
+    -------
+    np.ndarray of int
+        (num_events,) quota of each event.
+    """
+    classes, class_idx = np.unique(np.asarray(labels), return_inverse=True)
+    has_draws = np.ones(len(class_idx), dtype=bool) if num_draws is None else num_draws > 0
+    class_counts = np.bincount(class_idx[has_draws], minlength=len(classes))
+    quotas = np.ceil(
+        fits_per_majority * class_counts.max(initial=0) / np.maximum(class_counts, 1)
+    ).astype(np.int64)
+    return np.where(has_draws, quotas[class_idx], 0)
+
+
+def balanced_rows(num_draws, quotas, rng, oversample=False):
+    """Randomly pick each event's quota of draws from a flat table of
+    draws stored event by event.
+
+    All events are sampled with one call to rng: draws are shuffled
+    within their event, and each event takes its first quota shuffled
+    draws. With oversample, events with fewer draws than their quota
+    cycle through their shuffled draws again.
+
+    Parameters
+    ----------
+    num_draws : np.ndarray of int
+        (num_events,) number of draws of each event, stored back to back.
+    quotas : np.ndarray of int
+        (num_events,) number of draws to pick from each event.
+    rng : np.random.Generator
+        Random generator to draw from.
+    oversample : bool, optional
+        If True, pick exactly quota draws per event, repeating draws where
+        needed. Otherwise, (default) at most num_draws draws are picked.
+
+    Returns
+    -------
+    np.ndarray of int
+        Picked rows, grouped by event in event order.
+    """
+    num_draws = np.asarray(num_draws, dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(num_draws)])
+    event_idx = np.repeat(np.arange(len(num_draws)), num_draws)
+    # rows shuffled within each event, keeping events in order
+    shuffled = np.lexsort((rng.random(offsets[-1]), event_idx))
+
+    quotas = np.asarray(quotas, dtype=np.int64)
+    if not oversample:
+        quotas = np.minimum(quotas, num_draws)
+    quotas = np.where(num_draws > 0, quotas, 0)
+    pick_event = np.repeat(np.arange(len(num_draws)), quotas)
+    rank = np.arange(len(pick_event)) - np.repeat(np.cumsum(quotas) - quotas, quotas)
+    return shuffled[offsets[pick_event] + rank % num_draws[pick_event]]
+
+
+class BalancedSampler(Sampler):
+    """Sampler that re-draws a class-balanced subset of rows every epoch.
+
+    Indexes the full, unbalanced table of draws, so the features are never
+    copied: each iteration only yields a fresh set of row indices, in
+    random order.
+
+    Parameters
+    ----------
+    num_draws : np.ndarray of int
+        (num_events,) number of draws of each event, stored back to back.
+    labels : array-like
+        (num_events,) class label of each event.
+    fits_per_majority : int
+        Draws per event of the most populated class.
+    seed : int, optional
+        Seed of the sampler's random generator.
+    oversample : bool, optional
+        See balanced_rows. Defaults to False.
+    """
+
+    def __init__(self, num_draws, labels, fits_per_majority, seed=None, oversample=False):
+        self.num_draws = np.asarray(num_draws, dtype=np.int64)
+        self.quotas = class_quotas(labels, fits_per_majority, self.num_draws)
+        self.oversample = oversample
+        self.rng = np.random.default_rng(seed)
+
+    def __iter__(self):
+        rows = balanced_rows(self.num_draws, self.quotas, self.rng, self.oversample)
+        return iter(self.rng.permutation(rows).tolist())
+
+    def __len__(self):
+        if self.oversample:
+            return int(self.quotas.sum())
+        return int(np.minimum(self.quotas, self.num_draws).sum())
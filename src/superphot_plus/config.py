@@ -27,9 +27,14 @@ class SuperphotConfig:
     
     # sampling options
     sampler_results_fn: str = "sampler_results"
+    posterior_store_fn: Optional[str] = None
     sampler: str = "dynesty"
     chisq_cutoff: float = 1.2
     
+    # feature caching options
+    feature_cache_dir: Optional[str] = None
+    feature_cache_max_bytes: int = 4 * 2**30
+    
     # plotting options
     figs_dir: str = 'figs'
     metrics_dir: str = 'metrics'
@@ -50,6 +55,7 @@ class SuperphotConfig:
     input_features: Optional[list] = None
     use_redshift_features: bool = False
     fits_per_majority: int = 5
+    resample_each_epoch: bool = False
     
     # single-class options
     target_label: Optional[str] = None
@@ -68,6 +74,9 @@ class SuperphotConfig:
     n_folds: int = 1
     num_epochs: Optional[int] = None
     n_parallel: int = 1
+    ensemble_folds: bool = False
+    patience: Optional[int] = None
+    min_delta: float = 0.0
     
     # reproducibility options
     random_seed: int = 42
@@ -79,6 +88,10 @@ class SuperphotConfig:
             self.transient_data_fn = os.path.join(self.data_dir, self.transient_data_fn)
             self.models_dir = os.path.join(self.data_dir, self.models_dir)
             self.sampler_results_fn = os.path.join(self.data_dir, self.sampler_results_fn)
+            if self.posterior_store_fn is not None:
+                self.posterior_store_fn = os.path.join(self.data_dir, self.posterior_store_fn)
+            if self.feature_cache_dir is not None:
+                self.feature_cache_dir = os.path.join(self.data_dir, self.feature_cache_dir)
             self.figs_dir = os.path.join(self.data_dir, self.figs_dir)
             
             self.metrics_dir = os.path.join(self.figs_dir, self.metrics_dir)
@@ -7,8 +7,12 @@ MAX_ITER = 5000
 DLOGZ = 0.4
 NLIVE = 50
 
+# Scoring parameters
+SCORE_BLOCK_SIZE = 1000
+
 # Numpyro parameters
 PAD_SIZE = 30
+MIN_BUCKET_LENGTH = 16
 
 # Classifier parameters
 INPUT_DROPOUT_FRAC = 0.2
@@ -18,3 +22,4 @@ VALID_RATIO = 0.9
 BATCH_SIZE = 32
 LEARNING_RATE = 1e-4
 NUM_FOLDS = 20
+INFERENCE_CHUNK_SIZE = 8192
@@ -1,75 +1,46 @@
 # Using SNAPI, imports ZTF data directly from TNS and ALeRCE, including non-detections.
+import asyncio
 import os
-import numpy as np
-import itertools
-import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
+import numpy as np
+
 from snapi import Transient, Photometry, TransientGroup
 from snapi.query_agents import TNSQueryAgent, ALeRCEQueryAgent
 
 
-def single_worker_import(batch, skipped_names_fn):
-    """Single worker's script to run in parallel."""
-    name_batch, tns_agent, alerce_agent = batch
-    single_name_import_static = partial(
-        single_name_import,
-        tns_agent=tns_agent,
-        alerce_agent=alerce_agent,
-        skipped_names_fn=skipped_names_fn
-    )
-    
-    transients = []
-    for n in name_batch:
-        transients.append(
-            single_name_import_static(n)
-        )
-    return transients
-
-
-def single_name_import(
-    n, tns_agent, alerce_agent,
-    skipped_names_fn
-):
-    transient = Transient(iid=n)
-    qr_tns, success = tns_agent.query_transient(transient, local=True) # we dont want spectra
-    if not success:
-        with open(skipped_names_fn, "a") as f:
-            f.write(f"{n}: TNS query failed\n")
-        return
-    for result in qr_tns:
-        transient.ingest_query_info(result.to_dict())
-    qr_alerce, success = alerce_agent.query_transient(transient)
-    if not success:
-        with open(skipped_names_fn, "a") as f:
-            f.write(f"{n}: ALeRCE query failed\n")
-        return
-    for result in qr_alerce:
-        transient.ingest_query_info(result.to_dict())
-
-    # quality cuts
+def quality_cuts(transient):
+    """Restrict a transient's photometry to phased, normalized ZTF r and g
+    data, and check that it is well sampled and variable enough to fit.
+
+    Parameters
+    ----------
+    transient : Transient
+        Transient with ingested TNS and ALeRCE data. Its photometry is
+        replaced by the processed photometry.
+
+    Returns
+    -------
+    str or None
+        Why the transient was skipped, or None if it passed all cuts.
+    """
     if transient.photometry is None:
-        with open(skipped_names_fn, "a") as f:
-            f.write(f"{n}: No photometry.\n")
-        return
+        return "No photometry."
 
     phot = transient.photometry
     phot.filter_subset(["ZTF_r", "ZTF_g"], inplace=True)
 
     if len(phot.detections['filter'].unique()) < 2:
-        with open(skipped_names_fn, "a") as f:
-            f.write(f"{n}: Data in fewer than two filters.\n")
-        return
-    
+        return "Data in fewer than two filters."
+
     phot.phase(inplace=True)
     phot.truncate(min_t=-50., max_t=100.)
     phot.correct_extinction(coordinates=transient.coordinates, inplace=True)
     phot.normalize(inplace=True)
 
     if len(phot.detections['filter'].unique()) < 2:
-        with open(skipped_names_fn, "a") as f:
-            f.write(f"{n}: Data in fewer than two filters.\n")
-        return
+        return "Data in fewer than two filters."
 
     high_snr_detections = phot.detections.loc[
         phot.detections['mag_error'] <= (5 / 6. / np.log(10))
@@ -80,51 +51,275 @@ def single_name_import(
         high_snr_b = high_snr_detections.loc[high_snr_detections['filter'] == b]
         # number of high-SNR detections cut
         if len(high_snr_b) < 5:
-            with open(skipped_names_fn, "a") as f:
-                f.write(f"{n}: Not enough high-SNR detections\n")
-            return
+            return "Not enough high-SNR detections"
 
         # variability cut
         if np.ptp(high_snr_b['mag']) < 3 * high_snr_b['mag_error'].mean():
-            with open(skipped_names_fn, "a") as f:
-                f.write(f"{n}: Amplitude too small\n")
-            return
+            return "Amplitude too small"
 
         # second variability cut
         if high_snr_b['mag'].std() < high_snr_b['mag_error'].mean():
-            with open(skipped_names_fn, "a") as f:
-                f.write(f"{n}: Variability too small\n")
-            return
-    
+            return "Variability too small"
+
     transient.photometry = phot
-    return transient
-    
-    
+    return None
+
+
+class RateLimiter:
+    """Spaces out requests to one service to at most rate per second.
+
+    Parameters
+    ----------
+    rate : float or None
+        Maximum requests per second. None disables the limit.
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 0.0 if rate is None else 1.0 / rate
+        self._next_time = 0.0
+        self._lock = None
+
+    async def wait(self):
+        """Wait until the next request may be sent."""
+        if self.interval == 0.0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AsyncImporter:
+    """Concurrent import of transients from TNS and ALeRCE.
+
+    Name imports run as asyncio tasks, at most max_concurrency at a time.
+    Queries are network-bound, so blocking query functions run in a
+    thread pool of the same size, and all tasks share one query agent (and
+    so one HTTP session) per service. Requests to each service are rate
+    limited, and queries raising an exception are retried with
+    exponential backoff. Names whose import raises are skipped with the
+    exception as the reason. Skipped names are appended to skipped_names_fn
+    in batches.
+
+    Parameters
+    ----------
+    skipped_names_fn : str
+        File to which skipped names and the reason are appended.
+    max_concurrency : int, optional
+        Maximum number of names imported at once. Defaults to 8.
+    requests_per_second : dict, optional
+        Maximum request rate of "tns" and "alerce". Services not listed
+        are not rate limited.
+    max_retries : int, optional
+        Retries of a query raising an exception. Defaults to 3.
+    backoff : float, optional
+        Seconds before the first retry, doubled for each further retry.
+        Defaults to 1.
+    write_batch_size : int, optional
+        Number of skip records buffered before appending them to
+        skipped_names_fn. Defaults to 100.
+    tns_query, alerce_query : callable, optional
+        Functions (or coroutine functions) mapping a Transient to the
+        query results and a success flag. Default to the query_transient
+        methods of shared TNSQueryAgent and ALeRCEQueryAgent objects.
+    """
+
+    def __init__(
+        self, skipped_names_fn, max_concurrency=8, requests_per_second=None,
+        max_retries=3, backoff=1.0, write_batch_size=100,
+        tns_query=None, alerce_query=None,
+    ):
+        self.skipped_names_fn = skipped_names_fn
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.write_batch_size = write_batch_size
+
+        if tns_query is None:
+            tns_query = partial(TNSQueryAgent().query_transient, local=True) # we dont want spectra
+        if alerce_query is None:
+            alerce_query = ALeRCEQueryAgent().query_transient
+        self.queries = {"tns": tns_query, "alerce": alerce_query}
+
+        requests_per_second = requests_per_second or {}
+        self.limiters = {
+            service: RateLimiter(requests_per_second.get(service)) for service in self.queries
+        }
+        self.skipped = []
+        self._executor = None
+
+    async def query(self, service, transient):
+        """Query one service for a transient, rate limited and retried.
+
+        Parameters
+        ----------
+        service : str
+            "tns" or "alerce".
+        transient : Transient
+            The transient to query.
+
+        Returns
+        -------
+        tuple
+            The query results and the success flag.
+        """
+        query_fn = self.queries[service]
+        for attempt in range(self.max_retries + 1):
+            await self.limiters[service].wait()
+            try:
+                if asyncio.iscoroutinefunction(query_fn):
+                    return await query_fn(transient)
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._executor, query_fn, transient
+                )
+            except Exception: # pylint: disable=broad-except
+                if attempt == self.max_retries:
+                    return [], False
+                await asyncio.sleep(self.backoff * 2**attempt)
+
+    async def import_name(self, name):
+        """Query and quality-cut one transient.
+
+        Parameters
+        ----------
+        name : str
+            The transient name.
+
+        Returns
+        -------
+        Transient or None
+            The transient, or None if it was skipped.
+        """
+        transient = Transient(iid=name)
+        for service, label in (("tns", "TNS"), ("alerce", "ALeRCE")):
+            query_results, success = await self.query(service, transient)
+            if not success:
+                self.skip(name, f"{label} query failed")
+                return None
+            for result in query_results:
+                transient.ingest_query_info(result.to_dict())
+
+        reason = quality_cuts(transient)
+        if reason is not None:
+            self.skip(name, reason)
+            return None
+        return transient
+
+    def skip(self, name, reason):
+        """Buffer a skip record, writing the buffer once it is full."""
+        self.skipped.append(f"{name}: {reason}\n")
+        if len(self.skipped) >= self.write_batch_size:
+            self.flush_skipped()
+
+    def flush_skipped(self):
+        """Append the buffered skip records to skipped_names_fn."""
+        if not self.skipped:
+            return
+        with open(self.skipped_names_fn, "a") as f:
+            f.writelines(self.skipped)
+        self.skipped = []
+
+    async def run(self, names, checkpoint_freq=None, on_checkpoint=None):
+        """Import names concurrently.
+
+        Parameters
+        ----------
+        names : list of str
+            The transient names.
+        checkpoint_freq : int, optional
+            If set, on_checkpoint is called with each further
+            checkpoint_freq imported transients.
+        on_checkpoint : callable, optional
+            Called with a list of newly imported transients. Transients
+            not yet passed on are passed when the run ends, including when
+            it is interrupted by an exception or cancellation.
+
+        Returns
+        -------
+        list of Transient
+            The imported transients that passed the cuts.
+        """
+        self._executor = ThreadPoolExecutor(self.max_concurrency)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded_import(name):
+            async with semaphore:
+                try:
+                    return await self.import_name(name)
+                except Exception as exc: # pylint: disable=broad-except
+                    self.skip(name, repr(exc))
+                    return None
+
+        tasks = [asyncio.ensure_future(bounded_import(n)) for n in names]
+        transients, unsaved = [], []
+        try:
+            for task in asyncio.as_completed(tasks):
+                transient = await task
+                if transient is None:
+                    continue
+                transients.append(transient)
+                unsaved.append(transient)
+                if checkpoint_freq is not None and len(unsaved) >= checkpoint_freq:
+                    self.flush_skipped()
+                    batch, unsaved = unsaved, []
+                    on_checkpoint(batch)
+        finally:
+            # On an error or cancellation, stop the remaining imports and
+            # retrieve their results so none are reported as unretrieved.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.flush_skipped()
+            self._executor.shutdown(wait=False)
+            if on_checkpoint is not None and unsaved:
+                on_checkpoint(unsaved)
+
+        return transients
+
+
 def import_all_names(
     names,
     save_dir,
     max_n = 100_000,
     checkpoint_freq = None,
     n_cores: int = 1,
-    overwrite: bool = False
+    overwrite: bool = False,
+    **importer_kwargs,
 ): # pylint: disable=invalid-name
     """Extract all spectroscopic SNe II from TNS and save with SNAPI.
 
     Parameters
     ----------
+    names : list of str
+        Names of the transients to import.
     save_dir : str
         Directory to save extracted data.
+    max_n : int, optional
+        Maximum number of names to query. Defaults to 100,000.
+    checkpoint_freq : int, optional
+        If set, the transients are saved after every checkpoint_freq
+        imports. Otherwise, they are saved once at the end.
+    n_cores : int, optional
+        Maximum number of names imported concurrently. Defaults to 1.
+    overwrite : bool, optional
+        If False (default), previously skipped and saved names are not
+        queried again.
+    **importer_kwargs
+        Passed on to AsyncImporter, e.g. requests_per_second.
     """
-    pool = multiprocessing.Pool(n_cores)
-    
     # make file for skipped names
     skipped_names_fn ="skipped_names.txt"
     skipped_names = []
+    transients = []
     if (not overwrite) and (os.path.exists(skipped_names_fn)):
         with open(skipped_names_fn, "r") as f:
             for row in f:
                 skipped_names.append(row.split(":")[0])
-        
+
         if os.path.exists(save_dir):
             tg = TransientGroup.load(save_dir)
             print(f"{len(tg.metadata.index)} events already saved.")
@@ -133,42 +328,17 @@ def import_all_names(
     else:
         with open(skipped_names_fn, "w") as f:
             f.write("")
-        transients = []
-            
+
+    skipped_names = set(skipped_names)
     names_keep = [n for n in names if n not in skipped_names][:max_n]
-    
-    single_worker_import_static = partial(
-        single_worker_import,
-        skipped_names_fn=skipped_names_fn,
-    )
-    
-    print(f"{len(names_keep)} names to query across {n_cores} cores.")
-    
-    if checkpoint_freq is not None:
-        num_checkpoints = len(names_keep) // checkpoint_freq
-        checkpoint_batches = [names_keep[i::num_checkpoints] for i in range(num_checkpoints)]
-        tns_agents = [TNSQueryAgent() for _ in range(num_checkpoints)]
-        alerce_agents = [ALeRCEQueryAgent() for _ in range(num_checkpoints)]
-
-        for _, cb in enumerate(checkpoint_batches):
-            name_batches = [cb[i::n_cores] for i in range(n_cores)]
-            print(f"Processing {len(cb)} transients in batch")
-            result = pool.map(single_worker_import_static, zip(name_batches, tns_agents, alerce_agents))
-            transients_loop = list(itertools.chain(*result))
-            print("Finished processing, making transient group now")
-            transients.extend(filter(None, transients_loop))
-            transient_group = TransientGroup(transients)
-            transient_group.save(save_dir)
-            print(f"Total transients saved: {len(transient_group)}.")
-            
-    else:
-        names_batches = [names_keep[i::n_cores] for i in range(n_cores)]
-        tns_agents = [TNSQueryAgent() for _ in range(n_cores)]
-        alerce_agents = [ALeRCEQueryAgent() for _ in range(n_cores)]
-        transients.extend(
-            pool.map(single_worker_import_static, zip(names_batches, tns_agents, alerce_agents))
-        )
-        transient_group = TransientGroup(filter(None, transients))
+
+    print(f"{len(names_keep)} names to query, {n_cores} at a time.")
+
+    def save_checkpoint(new_transients):
+        transients.extend(new_transients)
+        transient_group = TransientGroup(transients)
         transient_group.save(save_dir)
-        
-        
\ No newline at end of file
+        print(f"Total transients saved: {len(transient_group)}.")
+
+    importer = AsyncImporter(skipped_names_fn, max_concurrency=n_cores, **importer_kwargs)
+    asyncio.run(importer.run(names_keep, checkpoint_freq, save_checkpoint))
@@ -0,0 +1,214 @@
+"""Content-addressed on-disk cache of prepared training features."""
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from .posterior_store import PosteriorStore
+
+# Config fields that change the prepared features.
+FINGERPRINT_FIELDS = (
+    "sampler",
+    "chisq_cutoff",
+    "use_redshift_features",
+    "allowed_types",
+    "target_label",
+)
+
+# Memoized content hashes of input files, kept in the cache directory.
+HASHES_FN = "input_hashes.json"
+
+
+def hash_path(path, hasher=None, chunk_size=1 << 20):
+    """Hash the contents of a file, or of every file under a directory.
+
+    Parameters
+    ----------
+    path : str
+        File or directory to hash.
+    hasher : hashlib hash object, optional
+        Hash to update. Defaults to a new sha256.
+    chunk_size : int, optional
+        Bytes read at a time.
+
+    Returns
+    -------
+    hashlib hash object
+    """
+    if hasher is None:
+        hasher = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for fn in sorted(files):
+                file_path = os.path.join(root, fn)
+                hasher.update(os.path.relpath(file_path, path).encode())
+                hash_path(file_path, hasher, chunk_size)
+        return hasher
+    with open(path, "rb") as file_handle:
+        for chunk in iter(lambda: file_handle.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher
+
+
+def memoized_hash_path(path, memo):
+    """Hash a file or directory, reusing the digests in memo of files
+    whose size and modification time are unchanged.
+
+    Directories are hashed from the relative paths and digests of their
+    files, so only new or modified files are read.
+
+    Parameters
+    ----------
+    path : str
+        File or directory to hash.
+    memo : dict
+        Maps absolute file paths to [size, mtime_ns, hex digest]. Updated
+        with the files read.
+
+    Returns
+    -------
+    str
+        Hex digest of the contents.
+    """
+    path = os.path.abspath(path)
+    if not os.path.isdir(path):
+        return _file_digest(path, os.stat(path), memo)
+    hasher = hashlib.sha256()
+    _hash_dir(path, "", hasher, memo)
+    return hasher.hexdigest()
+
+
+def _hash_dir(dir_path, prefix, hasher, memo):
+    """Add the relative paths and memoized digests of the files under
+    dir_path to hasher, in sorted order."""
+    for entry in sorted(os.scandir(dir_path), key=lambda e: e.name):
+        rel_path = prefix + entry.name
+        if entry.is_dir():
+            _hash_dir(entry.path, rel_path + "/", hasher, memo)
+        else:
+            hasher.update(rel_path.encode())
+            hasher.update(_file_digest(entry.path, entry.stat(), memo).encode())
+
+
+def _file_digest(file_path, stat, memo):
+    """Digest of a file, re-read only if its stat differs from memo."""
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    cached = memo.get(file_path)
+    if cached is None or cached[:2] != stamp:
+        memo[file_path] = cached = stamp + [hash_path(file_path).hexdigest()]
+    return cached[2]
+
+
+class FeatureCache:
+    """Size-bounded, least-recently-used cache of prepared features.
+
+    Each entry is a directory named by its key, holding the event metadata
+    and the filtered PosteriorStore of one set of inputs.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory holding the cache entries. Created if missing.
+    max_bytes : int
+        Total size above which the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, config, input_paths):
+        """Fingerprint the config fields and input file contents that
+        determine the prepared features. Input files are only read when
+        their size or modification time changed since they were last
+        hashed.
+
+        Parameters
+        ----------
+        config : SuperphotConfig
+            The training configuration.
+        input_paths : list of str
+            Input files or directories the features are prepared from.
+
+        Returns
+        -------
+        str
+            Hex digest identifying the cache entry.
+        """
+        fields = {f: getattr(config, f) for f in FINGERPRINT_FIELDS}
+        fields["allowed_types"] = sorted(fields["allowed_types"])
+        hasher = hashlib.sha256(json.dumps(fields, sort_keys=True).encode())
+
+        hashes_fn = os.path.join(self.cache_dir, HASHES_FN)
+        memo = {}
+        if os.path.exists(hashes_fn):
+            with open(hashes_fn, "r", encoding="utf-8") as file_handle:
+                memo = json.load(file_handle)
+        old_memo = dict(memo)
+        for path in input_paths:
+            hasher.update(memoized_hash_path(path, memo).encode())
+
+        if memo != old_memo:
+            tmp_fn = f"{hashes_fn}.tmp"
+            with open(tmp_fn, "w", encoding="utf-8") as file_handle:
+                json.dump(memo, file_handle)
+            os.replace(tmp_fn, hashes_fn)
+        return hasher.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """Return the cached (store, metadata) of key, or None on a miss.
+        The store is memory-mapped.
+        """
+        entry = self._entry(key)
+        if not os.path.isfile(os.path.join(entry, "metadata.pkl")):
+            return None
+        os.utime(entry) # mark as recently used
+        return (
+            PosteriorStore.load(os.path.join(entry, "posteriors")),
+            pd.read_pickle(os.path.join(entry, "metadata.pkl")),
+        )
+
+    def put(self, key, store: PosteriorStore, metadata: pd.DataFrame):
+        """Add an entry, then evict least recently used entries until the
+        cache fits in max_bytes."""
+        entry = self._entry(key)
+        store.save(os.path.join(entry, "posteriors"))
+        # written last, so only complete entries are ever read
+        metadata.to_pickle(os.path.join(entry, "metadata.pkl"))
+        os.utime(entry)
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Remove least recently used entries (other than keep) until the
+        cache fits in max_bytes."""
+        entries = []
+        for key in self._keys():
+            entry = self._entry(key)
+            size = sum(
+                os.path.getsize(os.path.join(root, fn))
+                for root, _, files in os.walk(entry) for fn in files
+            )
+            entries.append((os.path.getmtime(entry), key, size))
+
+        total = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry(key))
+            total -= size
+
+    def _keys(self):
+        """Keys of the stored entries."""
+        return [key for key in os.listdir(self.cache_dir) if os.path.isdir(self._entry(key))]
+
+    def __len__(self):
+        return len(self._keys())
@@ -0,0 +1,126 @@
+"""Manifest of fitted light curves, for re-fitting only what changed."""
+import hashlib
+import json
+import os
+from importlib.metadata import PackageNotFoundError, version
+
+import pandas as pd
+
+from .feature_cache import memoized_hash_path
+
+try:
+    SAMPLER_VERSION = version("superphot-plus")
+except PackageNotFoundError:
+    SAMPLER_VERSION = "unknown"
+
+
+def prior_hash(priors):
+    """Hash of a SamplerPrior's parameter table.
+
+    Parameters
+    ----------
+    priors : SamplerPrior
+        The fit priors.
+
+    Returns
+    -------
+    str
+        Hex digest of the priors.
+    """
+    hashed = pd.util.hash_pandas_object(priors.dataframe, index=False).to_numpy().tobytes()
+    return hashlib.sha256(hashed).hexdigest()
+
+
+def fit_fingerprint(
+    photometry_fn, sampler_name, priors_hash, sampler_version=SAMPLER_VERSION, memo=None
+):
+    """Everything that determines an event's fit.
+
+    Parameters
+    ----------
+    photometry_fn : str
+        File (or directory) holding the event's photometry.
+    sampler_name : str
+        Name of the sampler.
+    priors_hash : str
+        Hash of the priors, see prior_hash.
+    sampler_version : str, optional
+        Version of the fitting code. Defaults to the installed version.
+    memo : dict, optional
+        Memoized file digests, see memoized_hash_path. Photometry files
+        whose size and modification time are unchanged are not re-read.
+
+    Returns
+    -------
+    dict
+        The fingerprint, as stored in a FitManifest.
+    """
+    return {
+        "photometry": memoized_hash_path(photometry_fn, {} if memo is None else memo),
+        "sampler": sampler_name,
+        "version": sampler_version,
+        "priors": priors_hash,
+    }
+
+
+class FitManifest:
+    """Fingerprints of the fits behind every stored posterior, keyed by
+    event name and saved as JSON.
+
+    The memoized photometry digests passed to fit_fingerprint are kept in
+    a sidecar JSON file, so unchanged light curves are not re-read when
+    fingerprinting the next run.
+
+    Parameters
+    ----------
+    path : str
+        JSON file of the manifest. Loaded if it exists.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes_path = f"{os.path.splitext(path)[0]}_hashes.json"
+        self.entries = self._load(path)
+        self.hashes = self._load(self.hashes_path)
+
+    @staticmethod
+    def _load(path):
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as file_handle:
+            return json.load(file_handle)
+
+    @staticmethod
+    def _save(path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file_handle:
+            json.dump(data, file_handle)
+        os.replace(tmp_path, path)
+
+    def stale(self, fingerprints):
+        """Events that are new, or whose fingerprint changed.
+
+        Parameters
+        ----------
+        fingerprints : dict
+            Current fingerprint of each event, keyed by name.
+
+        Returns
+        -------
+        list of str
+            Names of the events to (re-)fit.
+        """
+        return [name for name, fp in fingerprints.items() if self.entries.get(name) != fp]
+
+    def update(self, name, fingerprint):
+        """Record the fingerprint of a completed fit."""
+        self.entries[name] = fingerprint
+
+    def save(self):
+        """Write the manifest and the memoized photometry digests,
+        replacing the previous files atomically."""
+        self._save(self.path, self.entries)
+        self._save(self.hashes_path, self.hashes)
+
+    def __len__(self):
+        return len(self.entries)
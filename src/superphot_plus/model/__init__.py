@@ -1,9 +1,31 @@
-from .lightgbm import SuperphotLightGBM
-from .mlp import SuperphotMLP
-from .metrics import ModelMetrics
+import importlib
+
+from .export import ExportedClassifier, export_classifier
+
+# Training classes are imported on first access, so that the exported
+# model loader does not require torch.
+_LAZY_EXPORTS = {
+    "ModelMetrics": ".metrics",
+    "SuperphotLightGBM": ".lightgbm",
+    "SuperphotMLP": ".mlp",
+}
 
 __all__ = [
+    "export_classifier",
+    "ExportedClassifier",
     "ModelMetrics",
     "SuperphotLightGBM",
     "SuperphotMLP"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
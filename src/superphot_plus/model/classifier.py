@@ -5,8 +5,9 @@ import pandas as pd
 import lightgbm
 from torch.utils.data import DataLoader
 
-from ..constants import EPOCHS
+from ..constants import EPOCHS, INFERENCE_CHUNK_SIZE
 from ..config import SuperphotConfig
+from .export import export_classifier, segment_mean_probs
 from .metrics import ModelMetrics
 
 class SuperphotClassifier:
@@ -69,35 +70,74 @@ class SuperphotClassifier:
         return ModelMetrics().get_values()
         
     
+    def predict_proba(self, features):
+        """Class probabilities of every row of a normalized
+        (num_rows, num_features) array."""
+        return self.best_model.predict_proba(features)
+
+    def _prob_columns(self):
+        """Column labels of the probabilities returned by evaluate."""
+        return None
+
+    def evaluate_array(self, features, offsets, normalized=False, chunk_size=INFERENCE_CHUNK_SIZE):
+        """Average class probabilities of the draws of each event.
+
+        Parameters
+        ----------
+        features : np.ndarray
+            (num_draws, num_features) features of all draws, with the draws
+            of each event stored back to back. May be memory-mapped.
+        offsets : np.ndarray of int
+            (num_events + 1,) row offsets of each event within features.
+        normalized : bool, optional
+            If True, features are already normalized. Defaults to False.
+        chunk_size : int, optional
+            Rows normalized and predicted at a time.
+
+        Returns
+        -------
+        np.ndarray
+            (num_events, num_classes) mean probabilities. NaN for events
+            without draws.
+        """
+        if normalized:
+            return segment_mean_probs(self.predict_proba, features, offsets, chunk_size=chunk_size)
+        return segment_mean_probs(
+            self.predict_proba, features, offsets,
+            self.normalization_means, self.normalization_stddevs, chunk_size,
+        )
+
     def evaluate(self, test_features, normalized=False):
         """Runs model over a group of test samples.
 
         Parameters
         ----------
-        test_data : TestData
-            The data to evaluate the model. Consists of test features,
-            test classes, test names and a list of grouped indices, respectively.
-        probs_csv_path : str, optional
-            Where to store the probability results.
+        test_features : pd.DataFrame
+            Features of every posterior draw, indexed by event name.
+        normalized : bool, optional
+            If True, test_features are already normalized. Defaults to False.
 
         Returns
         -------
-        tuple
-            A tuple containing the labels, names, predicted labels
-            and maximum probabilities.
-            
-        TODO: GIVE COLUMN NAMES FOR PROBS
+        pd.DataFrame
+            Mean class probabilities of each event, indexed by sorted
+            event name.
         """
-        if not normalized:
+        if not normalized and self.normalization_means is None:
             test_features = self.normalize(test_features)
-            
-        probabilities = pd.DataFrame(
-            self.best_model.predict_proba(test_features),
-            index=test_features.index
+            normalized = True
+
+        codes, names = pd.factorize(test_features.index, sort=True)
+        features = test_features.to_numpy(dtype=np.float32)
+        if np.any(np.diff(codes) < 0):
+            features = features[np.argsort(codes, kind='stable')]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(names)))])
+
+        return pd.DataFrame(
+            self.evaluate_array(features, offsets, normalized=normalized),
+            index=names,
+            columns=self._prob_columns(),
         )
-        probs_avg = probabilities.groupby(test_features.index).mean()
-        
-        return probs_avg
         
     def set_best_val_loss(self, best_val_loss):
         """Sets the best validation loss from training."""
@@ -114,6 +154,29 @@ class SuperphotClassifier:
         with open(f"{config_prefix}.pt", 'wb') as f:
             pickle.dump(self, f)
         
+    def export(self, path):
+        """Write an inference-only export of the classifier, loadable with
+        ExportedClassifier.load.
+
+        Parameters
+        ----------
+        path : str
+            File to write.
+        """
+        export_classifier(self, path)
+
+    def export_arrays(self):
+        """Arrays describing the trained model for export_classifier.
+
+        Returns
+        -------
+        dict of np.ndarray
+            The model "kind", the class "labels" of the probability
+            columns, and the weights that ExportedClassifier.load reads
+            for that kind.
+        """
+        raise NotImplementedError
+
     @classmethod
     def create(cls, config):
         """Creates a Model instance.
@@ -0,0 +1,172 @@
+"""Compact, inference-only export of trained classifiers.
+
+An export is a single .npz file holding the normalization statistics,
+class label order and model weights: the layer matrices of an MLP, or the
+native text model of LightGBM. Loading one only needs NumPy (and LightGBM
+for LightGBM models), not torch or the training code.
+"""
+import numpy as np
+
+from ..constants import INFERENCE_CHUNK_SIZE
+
+
+def segment_mean_probs(predict_proba, features, offsets, means=None, stddevs=None,
+                       chunk_size=INFERENCE_CHUNK_SIZE):
+    """Average predicted probabilities over the draws of each event.
+
+    Parameters
+    ----------
+    predict_proba : callable
+        Maps a normalized (num_rows, num_features) float32 array to
+        (num_rows, num_classes) probabilities.
+    features : np.ndarray
+        (num_draws, num_features) features of all draws, with the draws
+        of each event stored back to back. May be memory-mapped.
+    offsets : np.ndarray of int
+        (num_events + 1,) row offsets of each event within features.
+    means, stddevs : np.ndarray, optional
+        Normalization statistics. If None, features are already normalized.
+    chunk_size : int, optional
+        Rows normalized and predicted at a time.
+
+    Returns
+    -------
+    np.ndarray
+        (num_events, num_classes) mean probabilities. NaN for events
+        without draws.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    num_draws = np.diff(offsets)
+    event_idx = np.repeat(np.arange(len(num_draws)), num_draws)
+    if means is not None:
+        means = np.asarray(means, dtype=np.float32)
+        stddevs = np.asarray(stddevs, dtype=np.float32)
+
+    prob_sums = None
+    for start in range(0, offsets[-1], chunk_size):
+        chunk = np.asarray(features[start:start + chunk_size], dtype=np.float32)
+        if means is not None:
+            chunk = (chunk - means) / stddevs
+        probs = predict_proba(chunk)
+        if prob_sums is None:
+            prob_sums = np.zeros((len(num_draws), probs.shape[1]))
+
+        # sum each event's rows within the chunk
+        chunk_events = event_idx[start:start + chunk_size]
+        segment_starts = np.flatnonzero(np.diff(chunk_events, prepend=-1))
+        prob_sums[chunk_events[segment_starts]] += np.add.reduceat(probs, segment_starts, axis=0)
+
+    if prob_sums is None:
+        return np.full((len(num_draws), 0), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return prob_sums / num_draws[:, np.newaxis]
+
+
+def export_classifier(model, path):
+    """Write a trained classifier to one .npz file.
+
+    Parameters
+    ----------
+    model : SuperphotClassifier
+        The trained classifier. Its export_arrays provides the model kind,
+        class labels and weights.
+    path : str
+        File to write.
+    """
+    arrays = {
+        "means": np.asarray(model.normalization_means, dtype=np.float32),
+        "stddevs": np.asarray(model.normalization_stddevs, dtype=np.float32),
+    }
+    if hasattr(model.normalization_means, "index"):
+        arrays["feature_names"] = np.asarray(model.normalization_means.index, dtype=str)
+    arrays.update(model.export_arrays())
+
+    with open(path, "wb") as file_handle:
+        np.savez_compressed(file_handle, **arrays)
+
+
+class ExportedClassifier:
+    """Inference-only classifier loaded from an export_classifier file.
+
+    Parameters
+    ----------
+    means, stddevs : np.ndarray
+        Normalization statistics of the training features.
+    labels : np.ndarray of str
+        Class label of each probability column.
+    predict_proba : callable
+        Maps normalized features to class probabilities.
+    feature_names : np.ndarray of str, optional
+        Names of the training features, in order.
+    """
+
+    def __init__(self, means, stddevs, labels, predict_proba, feature_names=None):
+        self.means = means
+        self.stddevs = stddevs
+        self.labels = labels
+        self.predict_proba = predict_proba
+        self.feature_names = feature_names
+
+    @classmethod
+    def load(cls, path):
+        """Load an export written by export_classifier.
+
+        Parameters
+        ----------
+        path : str
+            The exported file.
+
+        Returns
+        -------
+        ExportedClassifier
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            kind = str(arrays["kind"])
+            if kind == "mlp":
+                num_layers = sum(name.startswith("weight_") for name in arrays.files)
+                layers = [(arrays[f"weight_{i}"], arrays[f"bias_{i}"]) for i in range(num_layers)]
+                predict_proba = _mlp_predictor(layers)
+            elif kind == "lightgbm":
+                predict_proba = _lightgbm_predictor(arrays["lightgbm_model"].tobytes().decode())
+            else:
+                raise ValueError(f"Unknown exported model kind {kind}.")
+            return cls(
+                arrays["means"], arrays["stddevs"], arrays["labels"], predict_proba,
+                arrays["feature_names"] if "feature_names" in arrays.files else None,
+            )
+
+    def evaluate_array(self, features, offsets, normalized=False, chunk_size=INFERENCE_CHUNK_SIZE):
+        """Average class probabilities of the draws of each event. See
+        segment_mean_probs."""
+        if normalized:
+            return segment_mean_probs(self.predict_proba, features, offsets, chunk_size=chunk_size)
+        return segment_mean_probs(
+            self.predict_proba, features, offsets, self.means, self.stddevs, chunk_size
+        )
+
+
+def _mlp_predictor(layers):
+    """NumPy forward pass of an MLP in eval mode, with softmax output."""
+    def predict_proba(features):
+        hidden = features
+        for weight, bias in layers[:-1]:
+            hidden = np.maximum(hidden @ weight.T + bias, 0.0)
+        logits = hidden @ layers[-1][0].T + layers[-1][1]
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+    return predict_proba
+
+
+def _lightgbm_predictor(model_str):
+    """Prediction with a LightGBM booster restored from its text model."""
+    import lightgbm # pylint: disable=import-outside-toplevel
+
+    booster = lightgbm.Booster(model_str=model_str)
+
+    def predict_proba(features):
+        probs = booster.predict(features)
+        if probs.ndim == 1: # binary objective
+            probs = np.stack([1.0 - probs, probs], axis=1)
+        return probs
+    return predict_proba
@@ -109,4 +109,13 @@ class SuperphotLightGBM(SuperphotClassifier):
         # Store best validation loss
         self.set_best_val_loss(float(best_val_loss))
 
-        return metrics
\ No newline at end of file
+        return metrics
+
+    def export_arrays(self):
+        """Class labels and the native text model, for export_classifier."""
+        model_str = self.best_model.booster_.model_to_string()
+        return {
+            "kind": np.array("lightgbm"),
+            "labels": np.asarray(self.best_model.classes_, dtype=str),
+            "lightgbm_model": np.frombuffer(model_str.encode(), dtype=np.uint8),
+        }
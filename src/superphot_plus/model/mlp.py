@@ -1,4 +1,5 @@
 """This module implements the Multi-Layer Perceptron (MLP) model for classification."""
+import copy
 import random
 import time
 
@@ -7,12 +8,12 @@ import pandas as pd
 import torch
 import torch.nn.functional as F
 from torch import nn, optim
-from torch.utils.data import DataLoader
+from torch.func import functional_call, stack_module_state, vmap
 
 from ..constants import EPOCHS, HIDDEN_DROPOUT_FRAC, INPUT_DROPOUT_FRAC
 from ..config import SuperphotConfig
 from ..utils import (
-    create_dataset,
+    TensorBatches,
     epoch_time,
     calculate_accuracy,
 )
@@ -20,6 +21,120 @@ from .metrics import ModelMetrics
 from .classifier import SuperphotClassifier
 
 
+def _seed_all(rng_seed):
+    """Seed every random generator used in training."""
+    random.seed(rng_seed)
+    np.random.seed(rng_seed)
+    torch.manual_seed(rng_seed)
+    torch.cuda.manual_seed(rng_seed)
+    torch.backends.cudnn.deterministic = True
+
+
+def _stack_epoch(iterators):
+    """Stack the next epoch of several TensorBatches, zero-padded to the
+    longest one.
+
+    Returns
+    -------
+    tuple
+        (num_models, num_rows, num_features) features, (num_models,
+        num_rows) labels and weights (1 for real rows, 0 for padding).
+    """
+    epochs = [iterator.epoch_tensors() for iterator in iterators]
+    num_rows = max(len(y) for _, y in epochs)
+    x_0, y_0 = epochs[0]
+    features = x_0.new_zeros((len(epochs), num_rows, x_0.shape[1]))
+    labels = y_0.new_zeros((len(epochs), num_rows))
+    weights = x_0.new_zeros((len(epochs), num_rows))
+    for k, (x, y) in enumerate(epochs):
+        features[k, :len(y)] = x
+        labels[k, :len(y)] = y
+        weights[k, :len(y)] = 1.0
+    return features, labels, weights
+
+
+class _MaskDropout(nn.Module):
+    """Dropout whose scaled keep-mask is passed in as the "mask" buffer,
+    so that each model of a vmapped ensemble can draw its own mask."""
+    def __init__(self):
+        super().__init__()
+        self.register_buffer('mask', torch.ones(()))
+
+    def forward(self, x):
+        """Apply the mask in training mode."""
+        return x * self.mask if self.training else x
+
+
+def _dropout_mask(num_rows, width, p, generator):
+    """Scaled keep-mask of nn.Dropout(p) for a (num_rows, width) input,
+    drawn from generator as nn.Dropout draws from the global generator."""
+    shape, device = (num_rows, width), generator.device
+    if p == 0.0:
+        return torch.ones(shape, device=device)
+    if p == 1.0:
+        return torch.zeros(shape, device=device)
+    return torch.empty(shape, device=device).bernoulli_(1 - p, generator=generator).div_(1 - p)
+
+
+class _MaskedAdam:
+    """Adam over weights stacked along a leading model axis, where each
+    step only updates the models in a mask.
+
+    Matches torch.optim.Adam (without weight decay or amsgrad) applied to
+    each model separately, with the hyperparameters of each model's own
+    optimizer.
+
+    Parameters
+    ----------
+    params : dict of torch.Tensor
+        Stacked weights, updated in place.
+    optimizers : list of torch.optim.Optimizer
+        The optimizer of each model, read for its hyperparameters.
+    """
+    def __init__(self, params, optimizers):
+        groups = [optimizer.param_groups[0] for optimizer in optimizers]
+        device = next(iter(params.values())).device
+        self.params = params
+        self.lr = torch.tensor([g['lr'] for g in groups], device=device)
+        self.beta1 = torch.tensor([g['betas'][0] for g in groups], device=device)
+        self.beta2 = torch.tensor([g['betas'][1] for g in groups], device=device)
+        self.eps = torch.tensor([g['eps'] for g in groups], device=device)
+        self.steps = torch.zeros(len(groups), device=device)
+        self.exp_avg = {name: torch.zeros_like(p) for name, p in params.items()}
+        self.exp_avg_sq = {name: torch.zeros_like(p) for name, p in params.items()}
+
+    @torch.no_grad()
+    def step(self, active):
+        """Update the weights of the active models from their gradients,
+        then clear all gradients.
+
+        Parameters
+        ----------
+        active : torch.Tensor of bool
+            (num_models,) models to update.
+        """
+        self.steps += active
+        steps = self.steps.clamp(min=1.0)
+        step_size = self.lr / (1 - self.beta1 ** steps)
+        bias_correction2_sqrt = (1 - self.beta2 ** steps).sqrt()
+
+        for name, p in self.params.items():
+            shape = (-1,) + (1,) * (p.dim() - 1)
+            mask = active.view(shape)
+            beta1, beta2 = self.beta1.view(shape), self.beta2.view(shape)
+            grad = p.grad
+
+            exp_avg = torch.where(mask, beta1 * self.exp_avg[name] + (1 - beta1) * grad, self.exp_avg[name])
+            exp_avg_sq = torch.where(
+                mask, beta2 * self.exp_avg_sq[name] + (1 - beta2) * grad * grad, self.exp_avg_sq[name]
+            )
+            self.exp_avg[name], self.exp_avg_sq[name] = exp_avg, exp_avg_sq
+
+            denom = exp_avg_sq.sqrt() / bias_correction2_sqrt.view(shape) + self.eps.view(shape)
+            p -= torch.where(mask, step_size.view(shape) * exp_avg / denom, 0.0)
+            p.grad = None
+
+
 class SuperphotMLP(SuperphotClassifier, nn.Module):
     """The Multi-Layer Perceptron.
 
@@ -63,6 +178,8 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
         # training loop params
         self.batch_size = config.batch_size
         self.device = config.device
+        self.patience = config.patience
+        self.min_delta = config.min_delta
 
         # Model state dictionary
         self.best_model = None
@@ -104,6 +221,7 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
         val_data,
         num_epochs=EPOCHS,
         rng_seed=None,
+        train_sampler=None,
         **kwargs
     ):
         """
@@ -112,6 +230,11 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
         Closely follows the demo
         https://colab.research.google.com/github/bentrevett/pytorch-image-classification/blob/master/1_mlp.ipynb
 
+        If config.patience is set, training stops once the validation loss
+        has not improved by more than config.min_delta for that many
+        epochs. The weights of the best epoch are kept in preallocated
+        tensors and loaded at the end.
+
         Parameters
         ----------
         train_data : TrainData
@@ -120,6 +243,9 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
             The number of epochs. Defaults to EPOCHS.
         rng_seed : int, optional
             Random state that is seeded. if none, use machine entropy.
+        train_sampler : torch.utils.data.Sampler, optional
+            Sampler of training rows, e.g. a BalancedSampler that re-draws
+            rows every epoch. Defaults to shuffling all rows.
 
         Returns
         -------
@@ -128,11 +254,7 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
             (training accuracies and losses, validation accuracies and losses).
         """
         if rng_seed is not None:
-            random.seed(rng_seed)
-            np.random.seed(rng_seed)
-            torch.manual_seed(rng_seed)
-            torch.cuda.manual_seed(rng_seed)
-            torch.backends.cudnn.deterministic = True
+            _seed_all(rng_seed)
             
         (train_feats, train_classes) = train_data
         (val_feats, val_classes) = val_data
@@ -143,24 +265,20 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
         self._unique_labels, train_classes = np.unique(train_classes, return_inverse=True)
         val_classes = np.unique(val_classes, return_inverse=True)[1]
             
-        train_dataset = create_dataset(train_feats.to_numpy(), train_classes)
-        val_dataset = create_dataset(val_feats.to_numpy(), val_classes)
-
-        train_iterator = DataLoader(
-            dataset=train_dataset, shuffle=True,
-            batch_size=self.batch_size,
-            pin_memory=True
+        train_iterator = TensorBatches(
+            train_feats.to_numpy(), train_classes, self.batch_size,
+            shuffle=True, sampler=train_sampler, device=self.device,
         )
-        valid_iterator = DataLoader(
-            dataset=val_dataset,
-            batch_size=self.batch_size,
-            pin_memory=True
+        valid_iterator = TensorBatches(
+            val_feats.to_numpy(), val_classes, self.batch_size, device=self.device,
         )
 
         metrics = ModelMetrics()
 
-        best_model = None
+        # Preallocated copy of the best weights, updated in place
+        best_model = {name: t.detach().clone() for name, t in self.state_dict().items()}
         best_val_loss = float("inf")
+        epochs_since_best = 0
 
         for epoch in np.arange(0, num_epochs):
             
@@ -169,9 +287,14 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
             train_loss, train_acc = self.train_epoch(train_iterator)
             val_loss, val_acc = self.evaluate_epoch(valid_iterator)
 
-            if val_loss < best_val_loss:
+            if val_loss < best_val_loss - self.min_delta:
                 best_val_loss = val_loss
-                best_model = self.state_dict()
+                epochs_since_best = 0
+                with torch.no_grad():
+                    for name, t in self.state_dict().items():
+                        best_model[name].copy_(t)
+            else:
+                epochs_since_best += 1
 
             end_time = time.monotonic()
 
@@ -185,6 +308,9 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
             if epoch % 25 == 0:
                 metrics.print_last()
 
+            if self.patience is not None and epochs_since_best >= self.patience:
+                break
+
         # Save best model state
         self.best_model = best_model
         self.load_state_dict(best_model)
@@ -199,7 +325,7 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
 
         Parameters
         ----------
-        iterator : torch.utils.DataLoader
+        iterator : TensorBatches
             The data iterator.
 
         Returns
@@ -207,8 +333,9 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
         tuple
             A tuple containing the epoch loss and epoch accuracy.
         """
-        epoch_loss = 0
-        epoch_acc = 0
+        # accumulated on device, and only read once per epoch
+        epoch_loss = torch.zeros((), device=self.device)
+        epoch_acc = torch.zeros((), device=self.device)
 
         self.train()
 
@@ -224,17 +351,17 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
 
             self.optimizer.step()
 
-            epoch_loss += loss.item()
-            epoch_acc += acc.item()
+            epoch_loss += loss.detach()
+            epoch_acc += acc
 
-        return epoch_loss / len(iterator), epoch_acc / len(iterator)
+        return epoch_loss.item() / len(iterator), epoch_acc.item() / len(iterator)
 
     def evaluate_epoch(self, iterator):
         """Evaluates the model for the validation set.
 
         Parameters
         ----------
-        iterator : torch.utils.DataLoader
+        iterator : TensorBatches
             The data iterator.
 
         Returns
@@ -242,63 +369,246 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
         tuple
             A tuple containing the epoch loss and epoch accuracy.
         """
-        epoch_loss = 0
-        epoch_acc = 0
+        epoch_loss = torch.zeros((), device=self.device)
+        epoch_acc = torch.zeros((), device=self.device)
 
         self.eval()
 
         with torch.no_grad():
             for x, y in iterator:
-                x = x.to(self.device)
-                y = y.to(self.device)
-
                 y_pred, _ = self(x)
                 loss = self.criterion(y_pred, y)
 
                 acc = calculate_accuracy(y_pred, y)
 
-                epoch_loss += loss.item()
-                epoch_acc += acc.item()
+                epoch_loss += loss
+                epoch_acc += acc
 
-        return epoch_loss / len(iterator), epoch_acc / len(iterator)
+        return epoch_loss.item() / len(iterator), epoch_acc.item() / len(iterator)
 
-    def evaluate(self, test_features, normalized=False):
-        """Runs model over a group of test samples.
+    @classmethod
+    def train_ensemble(
+        cls,
+        models,
+        train_data,
+        val_data,
+        num_epochs=EPOCHS,
+        rng_seed=None,
+        train_samplers=None,
+    ):
+        """Train several MLPs of the same architecture in lockstep, e.g.
+        the models of all K folds.
+
+        The models' weights are stacked along a leading model axis and
+        every step runs all models with one vmapped forward and backward
+        pass. Each model sees the batches it would see when trained alone
+        with train_and_validate; models with fewer batches than the
+        longest are masked out of the remaining steps of each epoch,
+        including their Adam moment and step-count updates. Models that
+        stop early (see train_and_validate) are masked out of all later
+        steps.
+
+        Each model draws its row shuffles and dropout masks from its own
+        generator seeded with rng_seed, in the order train_and_validate
+        draws them from the global generator. On CPU, the ensemble
+        therefore trains the same models as calling train_and_validate
+        on each model with the same rng_seed.
 
         Parameters
         ----------
-        test_data : TestData
-            The data to evaluate the model. Consists of test features,
-            test classes, test names and a list of grouped indices, respectively.
+        models : list of SuperphotMLP
+            Models to train, sharing architecture and batch size.
+        train_data : list of tuple
+            (features, labels) training data of each model.
+        val_data : list of tuple
+            (features, labels) validation data of each model.
+        num_epochs : int, optional
+            The number of epochs. Defaults to EPOCHS.
+        rng_seed : int, optional
+            Random state that is seeded. if none, use machine entropy.
+        train_samplers : list of torch.utils.data.Sampler, optional
+            Sampler of each model's training rows. Defaults to shuffling
+            all rows.
 
         Returns
         -------
-        tuple
-            A tuple containing the labels, names, predicted labels
-            and maximum probabilities.
+        list of ModelMetrics
+            The metrics of each model.
         """
-        if not normalized:
-            test_features = self.normalize(test_features)
-            
-        test_dataset = create_dataset(test_features.to_numpy(), np.zeros(len(test_features)))
-        test_iterator = DataLoader(dataset=test_dataset, batch_size=self.batch_size, shuffle=False)
-
-        probs = self.get_predictions(test_iterator)
-        probs_df = pd.DataFrame(
-            probs,
-            index=test_features.index,
-            columns=self._unique_labels,
-        )
-        probs_avg = probs_df.groupby(probs_df.index).mean()
-        return probs_avg
-        
+        if rng_seed is not None:
+            _seed_all(rng_seed)
+        generators = []
+        for model in models:
+            generator = torch.Generator(device=model.device)
+            if rng_seed is None:
+                generator.seed()
+            else:
+                generator.manual_seed(rng_seed)
+            generators.append(generator)
+        if train_samplers is None:
+            train_samplers = [None] * len(models)
+        batch_size = models[0].batch_size
+        if any(model.batch_size != batch_size for model in models):
+            raise ValueError("Ensemble models must share a batch size.")
+
+        train_iterators, val_iterators = [], []
+        for model, (train_feats, train_classes), (val_feats, val_classes), sampler, generator in zip(
+            models, train_data, val_data, train_samplers, generators
+        ):
+            train_feats = model.normalize(train_feats)
+            val_feats = model.normalize(val_feats)
+            model._unique_labels, train_classes = np.unique(train_classes, return_inverse=True)
+            val_classes = np.unique(val_classes, return_inverse=True)[1]
+            train_iterators.append(TensorBatches(
+                train_feats.to_numpy(), train_classes, batch_size,
+                shuffle=True, sampler=sampler, device=model.device, generator=generator,
+            ))
+            val_iterators.append(TensorBatches(
+                val_feats.to_numpy(), val_classes, batch_size, device=model.device,
+            ))
+
+        # stacked weights, with one copy of the module to call them with,
+        # whose dropouts apply masks drawn from each model's generator
+        params, buffers = stack_module_state(models)
+        device = next(iter(params.values())).device
+        base = copy.deepcopy(models[0])
+        base.dropouts = nn.ModuleList(_MaskDropout() for _ in base.dropouts)
+        mask_names = [f'dropouts.{i}.mask' for i in range(len(base.dropouts))]
+        mask_widths = [base.input_fc.in_features] + [base.input_fc.out_features] * (len(mask_names) - 1)
+
+        def forward(model_params, model_buffers, x):
+            return functional_call(base, (model_params, model_buffers), (x,))[0]
+
+        batched_forward = vmap(forward)
+
+        def dropout_masks(num_rows, active, batch_rows):
+            """Stacked dropout masks of one training step. Masks are only
+            drawn for the real rows of active models."""
+            masks = {}
+            for i, (name, width) in enumerate(zip(mask_names, mask_widths)):
+                mask = torch.ones((len(models), batch_rows, width), device=device)
+                for k in np.flatnonzero(active):
+                    mask[k, :num_rows[k]] = _dropout_mask(
+                        num_rows[k], width, models[k].dropouts[i].p, generators[k]
+                    )
+                masks[name] = mask
+            return masks
+
+        def run_epoch(iterators, train, running):
+            features, labels, weights = _stack_epoch(iterators)
+            epoch_loss = features.new_zeros(len(models))
+            epoch_acc = features.new_zeros(len(models))
+            num_batches = features.new_zeros(len(models))
+            base.train(train)
+            for start in range(0, features.shape[1], batch_size):
+                x = features[:, start:start + batch_size]
+                y = labels[:, start:start + batch_size]
+                w = weights[:, start:start + batch_size]
+                active = (w[:, 0] > 0) & running
+
+                step_buffers = buffers
+                if train:
+                    num_rows = w.sum(dim=1).int().tolist()
+                    step_buffers = {
+                        **buffers, **dropout_masks(num_rows, active.cpu().numpy(), x.shape[1])
+                    }
+                with torch.set_grad_enabled(train):
+                    y_pred = batched_forward(params, step_buffers, x)
+                    losses = F.cross_entropy(
+                        y_pred.flatten(0, 1), y.flatten(), reduction='none'
+                    ).view_as(w)
+                    counts = w.sum(dim=1).clamp(min=1.0)
+                    loss = (losses * w).sum(dim=1) / counts
+                if train:
+                    loss.sum().backward()
+                    adam.step(active)
+
+                acc = ((y_pred.argmax(dim=-1) == y) * w).sum(dim=1) / counts
+                epoch_loss += loss.detach() * active
+                epoch_acc += acc * active
+                num_batches += active
+            num_batches = num_batches.clamp(min=1.0)
+            return (epoch_loss / num_batches).tolist(), (epoch_acc / num_batches).tolist()
+
+        adam = _MaskedAdam(params, [model.optimizer for model in models])
+        all_metrics = [ModelMetrics() for _ in models]
+        best_params = {name: p.detach().clone() for name, p in params.items()}
+        best_val_losses = np.full(len(models), np.inf)
+        epochs_since_best = np.zeros(len(models), dtype=int)
+        patience = np.array([np.inf if m.patience is None else m.patience for m in models])
+        min_delta = np.array([m.min_delta for m in models])
+        running = np.ones(len(models), dtype=bool)
+
+        for epoch in np.arange(0, num_epochs):
+
+            start_time = time.monotonic()
+
+            running_mask = torch.as_tensor(running, device=device)
+            train_losses, train_accs = run_epoch(train_iterators, True, running_mask)
+            val_losses, val_accs = run_epoch(val_iterators, False, running_mask)
+
+            improved = running & (np.asarray(val_losses) < best_val_losses - min_delta)
+            best_val_losses[improved] = np.asarray(val_losses)[improved]
+            epochs_since_best = np.where(improved, 0, epochs_since_best + 1)
+            improved_mask = torch.as_tensor(improved, device=device)
+            for name, p in params.items():
+                best_params[name][improved_mask] = p.detach()[improved_mask]
+
+            end_time = time.monotonic()
+
+            for k in np.flatnonzero(running):
+                metrics = all_metrics[k]
+                metrics.append(
+                    train_metrics=(train_losses[k], train_accs[k]),
+                    val_metrics=(val_losses[k], val_accs[k]),
+                    epoch_time=epoch_time(start_time, end_time),
+                )
+                if epoch % 25 == 0:
+                    metrics.print_last()
+
+            running &= epochs_since_best < patience
+            if not running.any():
+                break
+
+        # Unstack the best state of each model
+        for k, model in enumerate(models):
+            best_model = {name: p[k].clone() for name, p in best_params.items()}
+            best_model.update({name: b[k].clone() for name, b in buffers.items()})
+            model.best_model = best_model
+            model.load_state_dict(best_model)
+            model.set_best_val_loss(best_val_losses[k])
+
+        return all_metrics
+
+    def predict_proba(self, features):
+        """Class probabilities of every row of a normalized
+        (num_rows, num_features) array."""
+        self.eval()
+        with torch.no_grad():
+            y_pred, _ = self(torch.tensor(features, dtype=torch.float, device=self.device))
+            return F.softmax(y_pred, dim=-1).cpu().numpy()
+
+    def _prob_columns(self):
+        return self._unique_labels
+
+    def export_arrays(self):
+        """Class labels and layer weights, for export_classifier."""
+        arrays = {
+            "kind": np.array("mlp"),
+            "labels": np.asarray(self._unique_labels, dtype=str),
+        }
+        layers = [self.input_fc, *self.hidden_layers, self.output_fc]
+        for i, layer in enumerate(layers):
+            arrays[f"weight_{i}"] = layer.weight.detach().cpu().numpy()
+            arrays[f"bias_{i}"] = layer.bias.detach().cpu().numpy()
+        return arrays
 
     def get_predictions(self, iterator):
         """Given a trained model, returns the prediction probabilities across all the inputs.
 
         Parameters
         ----------
-        iterator : torch.utils.DataLoader
+        iterator : TensorBatches
             The data iterator.
 
         Returns
@@ -312,7 +622,6 @@ class SuperphotMLP(SuperphotClassifier, nn.Module):
 
         with torch.no_grad():
             for x, _ in iterator:
-                x = x.to(self.device)
                 y_pred, _ = self(x)
                 y_prob = F.softmax(y_pred, dim=-1)
                 probs.append(y_prob.cpu())
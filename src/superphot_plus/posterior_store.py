@@ -0,0 +1,432 @@
+"""Columnar storage of posterior draws for many events."""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+SHARD_INDEX_FN = "shards.jsonl"
+
+
+class PosteriorStore:
+    """Posterior draws of many events in flat, memory-mappable columns.
+
+    All draws live in one contiguous float32 (num_draws, num_params)
+    matrix, with event i owning rows offsets[i]:offsets[i+1]. Scores are
+    stored per draw, and sampler names and event names per event.
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        (num_draws, num_params) posterior draws of all events.
+    scores : np.ndarray
+        (num_draws,) reduced chi-squared of every draw.
+    offsets : np.ndarray of int
+        (num_events + 1,) row offsets of each event within samples.
+    names : array-like of str
+        Event names.
+    samplers : array-like of str
+        Name of the sampler that produced each event's draws.
+    params : array-like of str
+        Parameter (column) names of samples.
+    """
+
+    _ARRAYS = ("samples", "scores", "offsets")
+
+    def __init__(self, samples, scores, offsets, names, samplers, params):
+        self.samples = samples
+        self.scores = scores
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.names = np.asarray(names, dtype=object)
+        self.samplers = np.asarray(samplers, dtype=object)
+        self.params = np.asarray(params, dtype=object)
+        if len(self.offsets) != len(self.names) + 1:
+            raise ValueError("offsets must have one more entry than names.")
+        if len(self.samples) != self.offsets[-1] or len(self.scores) != self.offsets[-1]:
+            raise ValueError("samples and scores must have one row per draw.")
+
+    @classmethod
+    def from_sampler_results(cls, sampler_results, params=None):
+        """Build a store from an iterable of SamplerResult objects.
+
+        Parameters
+        ----------
+        sampler_results : iterable of SamplerResult
+            Fit results, e.g. a SamplerResultGroup. Each result's id is
+            used as its event name.
+        params : array-like of str, optional
+            Parameter columns to store. Defaults to the columns of the
+            first result.
+
+        Returns
+        -------
+        PosteriorStore
+        """
+        sampler_results = list(sampler_results)
+        if params is None:
+            params = (
+                sampler_results[0].fit_parameters.columns if sampler_results else []
+            )
+        params = [p for p in params if p not in ("score", "sampler")]
+        num_draws = [len(sr.fit_parameters) for sr in sampler_results]
+        offsets = np.concatenate([[0], np.cumsum(num_draws, dtype=np.int64)])
+
+        samples = np.empty((offsets[-1], len(params)), dtype=np.float32)
+        scores = np.empty(offsets[-1], dtype=np.float32)
+        for sr, start, end in zip(sampler_results, offsets[:-1], offsets[1:]):
+            samples[start:end] = sr.fit_parameters.loc[:, params].to_numpy()
+            scores[start:end] = sr.score
+        return cls(
+            samples, scores, offsets,
+            [sr.id for sr in sampler_results],
+            [sr.sampler for sr in sampler_results],
+            params,
+        )
+
+    def save(self, path):
+        """Save the store to a directory of .npy arrays plus a JSON index.
+
+        Parameters
+        ----------
+        path : str
+            Directory to write. Created if missing.
+        """
+        os.makedirs(path, exist_ok=True)
+        for attr in self._ARRAYS:
+            np.save(os.path.join(path, f"{attr}.npy"), getattr(self, attr))
+        with open(os.path.join(path, "index.json"), "w", encoding="utf-8") as file_handle:
+            json.dump({
+                "names": self.names.tolist(),
+                "samplers": self.samplers.tolist(),
+                "params": self.params.tolist(),
+            }, file_handle)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a store saved with save.
+
+        Parameters
+        ----------
+        path : str
+            Directory written by save.
+        mmap : bool, optional
+            If True (default), memory-map the arrays instead of reading
+            them into memory.
+
+        Returns
+        -------
+        PosteriorStore
+        """
+        arrays = {
+            attr: np.load(os.path.join(path, f"{attr}.npy"), mmap_mode="r" if mmap else None)
+            for attr in cls._ARRAYS
+        }
+        with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as file_handle:
+            index = json.load(file_handle)
+        return cls(
+            arrays["samples"], arrays["scores"], arrays["offsets"],
+            index["names"], index["samplers"], index["params"],
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def num_draws(self):
+        """Number of draws per event."""
+        return np.diff(self.offsets)
+
+    @property
+    def event_idx(self):
+        """Index of the event owning each draw."""
+        return np.repeat(np.arange(len(self)), self.num_draws)
+
+    def draw_rows(self, event_idxs):
+        """Rows of samples belonging to the given events, in order."""
+        event_idxs = np.asarray(event_idxs, dtype=np.int64)
+        starts = self.offsets[event_idxs]
+        num_draws = self.num_draws[event_idxs]
+        new_offsets = np.concatenate([[0], np.cumsum(num_draws)])
+        return np.arange(new_offsets[-1]) - np.repeat(new_offsets[:-1] - starts, num_draws)
+
+    def select(self, event_idxs):
+        """Return a new store holding only the given events.
+
+        Parameters
+        ----------
+        event_idxs : array-like of int
+            Positions of the events to keep, in the desired order.
+
+        Returns
+        -------
+        PosteriorStore
+        """
+        event_idxs = np.asarray(event_idxs, dtype=np.int64)
+        rows = self.draw_rows(event_idxs)
+        return PosteriorStore(
+            self.samples[rows], self.scores[rows],
+            np.concatenate([[0], np.cumsum(self.num_draws[event_idxs])]),
+            self.names[event_idxs], self.samplers[event_idxs], self.params,
+        )
+
+    @classmethod
+    def concat(cls, stores):
+        """Concatenate stores with the same parameters, in order.
+
+        Parameters
+        ----------
+        stores : list of PosteriorStore
+            Stores to concatenate. Must not be empty.
+
+        Returns
+        -------
+        PosteriorStore
+        """
+        num_draws = np.concatenate([store.num_draws for store in stores])
+        return cls(
+            np.concatenate([store.samples for store in stores]),
+            np.concatenate([store.scores for store in stores]),
+            np.concatenate([[0], np.cumsum(num_draws)]),
+            np.concatenate([store.names for store in stores]),
+            np.concatenate([store.samplers for store in stores]),
+            stores[0].params,
+        )
+
+    def names_to_positions(self, names):
+        """Positions of the named events, -1 where a name is not stored."""
+        return pd.Index(self.names).get_indexer(np.asarray(names, dtype=object))
+
+    def filter(self, names):
+        """Return a new store holding the named events, in the order given.
+        Names without posteriors are skipped.
+
+        Parameters
+        ----------
+        names : array-like of str
+            Event names to keep.
+
+        Returns
+        -------
+        PosteriorStore
+        """
+        positions = self.names_to_positions(names)
+        return self.select(positions[positions >= 0])
+
+    def filter_draws(self, sampler, chisq_cutoff, event_idxs=None):
+        """Return a new store holding only the draws from the given sampler
+        within the chi-squared cutoff. Events without retained draws are
+        dropped.
+
+        Parameters
+        ----------
+        sampler : str
+            Name of the sampler whose draws are kept.
+        chisq_cutoff : float
+            Maximum reduced chi-squared of kept draws.
+        event_idxs : array-like of int, optional
+            Positions of the events to consider, in the desired order.
+            Defaults to all events.
+
+        Returns
+        -------
+        PosteriorStore
+            The retained draws, or self if every draw of every event is
+            retained.
+        """
+        if event_idxs is None:
+            event_idxs = np.arange(len(self))
+        event_idxs = np.asarray(event_idxs, dtype=np.int64)
+        rows = self.draw_rows(event_idxs)
+        local_idx = np.repeat(np.arange(len(event_idxs)), self.num_draws[event_idxs])
+
+        keep = self.samplers[event_idxs][local_idx] == sampler
+        keep &= np.asarray(self.scores[rows]) <= chisq_cutoff
+        if np.all(keep) and np.array_equal(event_idxs, np.arange(len(self))):
+            return self
+
+        kept_draws = np.bincount(local_idx[keep], minlength=len(event_idxs))
+        kept_events = kept_draws > 0
+        return PosteriorStore(
+            self.samples[rows[keep]], self.scores[rows[keep]],
+            np.concatenate([[0], np.cumsum(kept_draws[kept_events])]),
+            self.names[event_idxs[kept_events]], self.samplers[event_idxs[kept_events]],
+            self.params,
+        )
+
+    def to_frame(self, rows=None):
+        """Return draws as a DataFrame indexed by event name, with the
+        parameter columns followed by score and sampler columns.
+
+        Parameters
+        ----------
+        rows : array-like of int, optional
+            Rows of samples to include. Defaults to all draws, in which
+            case the parameter columns wrap samples without copying.
+
+        Returns
+        -------
+        pd.DataFrame
+        """
+        event_idx = self.event_idx
+        if rows is None:
+            samples, scores = self.samples, self.scores
+        else:
+            samples, scores, event_idx = self.samples[rows], self.scores[rows], event_idx[rows]
+        df = pd.DataFrame(
+            samples, columns=self.params,
+            index=pd.Index(self.names[event_idx]), copy=False,
+        )
+        df["score"] = np.asarray(scores)
+        df["sampler"] = self.samplers[event_idx]
+        return df
+
+
+class PosteriorShardWriter:
+    """Append-only writer of posteriors into a directory of shards.
+
+    Sampler results are buffered and written as one PosteriorStore shard
+    per shard_events events, instead of one file per event. Each flush
+    appends the shard and position of its events to an index file, so
+    ShardedPosteriorStore can look up events without reading the shards.
+    Events written again later supersede their earlier entries.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the shards. Created if missing; existing shards are
+        kept and appended to.
+    shard_events : int, optional
+        Number of events per shard. Defaults to 1000.
+    """
+
+    def __init__(self, path, shard_events=1000):
+        self.path = path
+        self.shard_events = shard_events
+        self.buffer = []
+        os.makedirs(path, exist_ok=True)
+        self.num_shards = sum(name.startswith("shard_") for name in os.listdir(path))
+
+    def add(self, sampler_results):
+        """Buffer sampler results, writing a shard once enough are buffered.
+
+        Parameters
+        ----------
+        sampler_results : iterable of SamplerResult
+            Fit results to store.
+
+        Returns
+        -------
+        bool
+            Whether the buffer was flushed.
+        """
+        self.buffer.extend(sampler_results)
+        if len(self.buffer) < self.shard_events:
+            return False
+        self.flush()
+        return True
+
+    def flush(self):
+        """Write all buffered results as a new shard and index them."""
+        if not self.buffer:
+            return
+        store = PosteriorStore.from_sampler_results(self.buffer)
+        shard = f"shard_{self.num_shards:05d}"
+        store.save(os.path.join(self.path, shard))
+
+        # indexed only once the shard is complete
+        with open(os.path.join(self.path, SHARD_INDEX_FN), "a", encoding="utf-8") as file_handle:
+            for position, name in enumerate(store.names):
+                file_handle.write(json.dumps([name, shard, position]) + "\n")
+        self.num_shards += 1
+        self.buffer = []
+
+
+class ShardedPosteriorStore:
+    """Reader of the shards written by PosteriorShardWriter.
+
+    Only the index is read on construction. Shards are memory-mapped
+    when first accessed.
+
+    Parameters
+    ----------
+    path : str
+        Directory written by PosteriorShardWriter.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        with open(os.path.join(path, SHARD_INDEX_FN), "r", encoding="utf-8") as file_handle:
+            for line in file_handle:
+                name, shard, position = json.loads(line)
+                self.index[name] = (shard, position)
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def _shard(self, shard):
+        """Memory-mapped store of one shard."""
+        if shard not in self._shards:
+            self._shards[shard] = PosteriorStore.load(os.path.join(self.path, shard))
+        return self._shards[shard]
+
+    def get(self, name):
+        """Return the latest posteriors of one event.
+
+        Parameters
+        ----------
+        name : str
+            The event name.
+
+        Returns
+        -------
+        PosteriorStore
+            Store holding only the named event.
+        """
+        shard, position = self.index[name]
+        return self._shard(shard).select([position])
+
+    def to_store(self):
+        """Gather the latest posteriors of all events into one store,
+        ordered by shard.
+
+        Returns
+        -------
+        PosteriorStore
+        """
+        positions = {}
+        for shard, position in self.index.values():
+            positions.setdefault(shard, []).append(position)
+        if not positions:
+            return PosteriorStore(
+                np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.float32),
+                [0], [], [], [],
+            )
+        return PosteriorStore.concat([
+            self._shard(shard).select(np.sort(positions[shard]))
+            for shard in sorted(positions)
+        ])
+
+
+def load_posteriors(path, mmap=True):
+    """Load a posterior store saved by PosteriorStore.save or written by
+    PosteriorShardWriter.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store.
+    mmap : bool, optional
+        See PosteriorStore.load. Sharded stores are always read into memory.
+
+    Returns
+    -------
+    PosteriorStore
+    """
+    if os.path.exists(os.path.join(path, SHARD_INDEX_FN)):
+        return ShardedPosteriorStore(path).to_store()
+    return PosteriorStore.load(path, mmap=mmap)
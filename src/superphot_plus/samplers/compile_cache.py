@@ -0,0 +1,102 @@
+"""Shape bucketing and caching of compiled JAX functions.
+
+Compiled XLA programs are specialized to array shapes, so every new
+light-curve length triggers a fresh trace. Rounding lengths up to a
+small set of buckets lets similarly sized light curves share one
+compiled function.
+"""
+import os
+
+from jax import config
+from jax.experimental.compilation_cache import compilation_cache
+
+from superphot_plus.constants import MIN_BUCKET_LENGTH
+
+
+def bucket_length(length, min_length=MIN_BUCKET_LENGTH, buckets=None):
+    """Round a light-curve length up to the next bucket.
+
+    Parameters
+    ----------
+    length : int
+        The number of data points.
+    min_length : int, optional
+        The smallest power-of-two bucket. Defaults to MIN_BUCKET_LENGTH.
+    buckets : sequence of int, optional
+        Explicit bucket lengths. Lengths beyond the largest bucket fall
+        back to powers of two. Defaults to None (powers of two only).
+
+    Returns
+    -------
+    int
+        The padded length.
+    """
+    if buckets is not None:
+        for bucket in sorted(buckets):
+            if bucket >= length:
+                return bucket
+    bucket = min_length
+    while bucket < length:
+        bucket *= 2
+    return bucket
+
+
+def enable_persistent_cache(cache_dir):
+    """Persist compiled XLA programs to disk, so that new processes reuse
+    them instead of recompiling. This is a process-wide JAX setting.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory holding the compiled programs. Created if missing.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    compilation_cache.set_cache_dir(str(cache_dir))
+    # cache every program, however quick to compile
+    config.update("jax_persistent_cache_min_compile_time_secs", 0)
+    # JAX only looks up the cache directory on its first compilation
+    compilation_cache.reset_cache()
+
+
+class CompileCache:
+    """Store of compiled functions keyed by shape bucket."""
+
+    def __init__(self):
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build_fn):
+        """Return the function cached under key, building it on first use.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies the shape bucket (and anything else the compiled
+            program is specialized to).
+        build_fn : callable
+            Zero-argument function returning the compiled function.
+        """
+        if key in self._cache:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._cache[key] = build_fn()
+        return self._cache[key]
+
+    def stats(self):
+        """Return the number of cache hits, misses and stored functions."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache)}
+
+    def clear(self):
+        """Drop all cached functions and reset the statistics."""
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+
+# Process-wide cache for compiled functions that capture no per-instance state.
+COMPILE_CACHE = CompileCache()
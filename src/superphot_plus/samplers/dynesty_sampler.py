@@ -4,15 +4,45 @@ from typing import List, Optional
 from functools import partial
 
 import numpy as np
+import jax.numpy as jnp
+from jax import jit, vmap
 from dynesty import DynamicNestedSampler, NestedSampler
 from snapi.analysis import SamplerResult, SamplerPrior
 import pandas as pd
 
 from superphot_plus.constants import DLOGZ, MAX_ITER, NLIVE
-from superphot_plus.utils import flux_model, params_valid
+from superphot_plus.utils import (
+    flux_model, jax_flux_model, params_valid_batch, villar_fit_constraint
+)
+from superphot_plus.samplers.compile_cache import COMPILE_CACHE, bucket_length
 from superphot_plus.samplers.superphot_sampler import SuperphotSampler
 
 
+def _jax_logL(cube, t, obsflux, uncertainties, parameter_map, mask):
+    """JAX log-likelihood of one parameter vector over a padded light curve.
+
+    Padded entries (mask == False) are excluded from both the constraint
+    check and the likelihood sum.
+    """
+    new_cube = cube[parameter_map]
+    invalid = jnp.any(jnp.isnan(new_cube) & mask)
+    invalid |= jnp.max(jnp.where(mask, villar_fit_constraint(new_cube), 0.)) > 0.
+
+    flux = jax_flux_model(new_cube, t)
+    sigma_sq = uncertainties**2 + new_cube[-1]**2
+    logL = jnp.sum(jnp.where(
+        mask,
+        -0.5 * jnp.log(2.0 * jnp.pi * sigma_sq) - 0.5 * (flux - obsflux) ** 2 / sigma_sq,
+        0.
+    ))
+    return jnp.where(invalid, -jnp.inf, logL)
+
+
+def _build_jax_logL():
+    """Compile the single-point and batched JAX log-likelihoods."""
+    return jit(_jax_logL), jit(vmap(_jax_logL, in_axes=(0, None, None, None, None, None)))
+
+
 class DynestySampler(SuperphotSampler):
     """ "MCMC sampling using dynesty."""
 
@@ -26,7 +56,8 @@ class DynestySampler(SuperphotSampler):
             sample_strategy: str='rwalk',
             nlive: int=NLIVE,
             dynamic: bool=False,
-            verbose: bool=False
+            verbose: bool=False,
+            backend: str='numpy',
         ):
         """Initialize the DynestySampler object.
 
@@ -50,6 +81,11 @@ class DynestySampler(SuperphotSampler):
             Whether to use dynamic sampling. Defaults to false.
         verbose : bool, optional
             Whether to print progress.
+        backend : str, optional
+            Likelihood backend, either 'numpy' or 'jax'. The 'jax' backend
+            evaluates each likelihood call as one compiled XLA kernel, with
+            light curves padded to shape buckets so similarly sized fits
+            reuse the same compiled function. Defaults to 'numpy'.
         """
         super().__init__(priors)
 
@@ -59,6 +95,8 @@ class DynestySampler(SuperphotSampler):
             raise ValueError("max_iter must be greater than 0.")
         if dlogz <= 0:
             raise ValueError("dlogz must be greater than 0.")
+        if backend not in ('numpy', 'jax'):
+            raise ValueError("backend must be one of 'numpy' or 'jax'.")
         self._max_iter = max_iter
         self._dlogz = dlogz
         self._verbose = verbose
@@ -66,6 +104,10 @@ class DynestySampler(SuperphotSampler):
         self._prior_func = partial(self._priors.sample, use_numpyro=False)
         self._param_map = None
         self._dynamic = dynamic
+        self._backend = backend
+        self._jax_logL = None
+        self._jax_logL_batch = None
+        self._jax_args = None
 
         if dynamic:
             self._nested_sampler = DynamicNestedSampler(
@@ -96,24 +138,66 @@ class DynestySampler(SuperphotSampler):
         float
             Log-likelihood value.
         """
+        if self._jax_logL is not None:
+            return float(self._jax_logL(cube, *self._jax_args))
+        return self._logL_batch(cube[np.newaxis,:])[0]
+
+    def _logL_batch(self, cubes):
+        """Vectorized log-likelihood over a block of parameter vectors.
+
+        Parameters
+        ----------
+        cubes : np.ndarray
+            (n_points, n_params) array of parameters.
+
+        Returns
+        -------
+        np.ndarray
+            (n_points,) log-likelihood values, -inf where parameters are invalid.
+        """
         if self._param_map is None:
-            return -1.0 # placeholder
-        
-        new_cube = self._reformat_cube(cube)
+            return -1.0 * np.ones(len(cubes)) # placeholder
 
-        if not params_valid(new_cube):
-            return -np.inf
-        
-        f_model = flux_model(new_cube, self._t, self._X[:,1])
-        extra_sigma_arr = new_cube[-1]
+        if self._jax_logL_batch is not None:
+            return np.asarray(self._jax_logL_batch(cubes, *self._jax_args), dtype=np.float64)
+
+        new_cube = cubes[:, self._param_map].transpose(1, 2, 0) # (num_params, num_times, n_points)
+        valid = params_valid_batch(new_cube)
+        logL = np.full(len(cubes), -np.inf)
+        if not np.any(valid):
+            return logL
+
+        new_cube = new_cube[:, :, valid]
+        f_model = flux_model(new_cube, self._t, self._X[:,1]) # (n_valid, num_times)
+        extra_sigma_arr = new_cube[-1].T
         sigma_sq = self._err**2 + extra_sigma_arr**2
 
-        logL = np.sum(
+        logL[valid] = np.sum(
             np.log(1.0 / np.sqrt(2.0 * np.pi * sigma_sq))
-            - 0.5 * (f_model - self._y) ** 2 / sigma_sq
+            - 0.5 * (f_model - self._y) ** 2 / sigma_sq,
+            axis=1
         )
         return logL
     
+    def _setup_jax_logL(self):
+        """Pad the light curve to its shape bucket and fetch the compiled
+        likelihoods for that bucket."""
+        num_times = len(self._t)
+        padded_length = bucket_length(num_times)
+        num_pad = padded_length - num_times
+
+        # padded steps reuse the last step's parameters so they stay finite
+        self._jax_args = (
+            jnp.asarray(np.pad(self._t, (0, num_pad))),
+            jnp.asarray(np.pad(self._y.astype(np.float32), (0, num_pad))),
+            jnp.asarray(np.pad(self._err, (0, num_pad), constant_values=1.)),
+            jnp.asarray(np.pad(self._param_map, ((0, 0), (0, num_pad)), mode='edge')),
+            jnp.arange(padded_length) < num_times,
+        )
+        self._jax_logL, self._jax_logL_batch = COMPILE_CACHE.get(
+            ('dynesty_logL', padded_length, len(self._params)), _build_jax_logL
+        )
+
     def reset(self):
         """Reset the nested sampler."""
         self._nested_sampler.loglikelihood.pool = None # post-pickling fix
@@ -141,18 +225,15 @@ class DynestySampler(SuperphotSampler):
         self._err = self._X[:,2].astype(np.float32)
         
         # map time steps to param values
-        self._param_map = np.zeros((self._nparams+3, len(self._X)), dtype=int)
-        for i, param in enumerate(self._base_params):
-            for b in self._unique_bands:
-                b_idxs = self._X[:,1] == b
-                self._param_map[i,b_idxs] = np.where(self._params == f'{param}_{b}')[0][0]
-        
-        self._param_map = np.array(self._param_map)
+        self._param_map = self._build_param_map(self._X[:,1])
 
         # Require data in all bands
         for band in self._unique_bands:
             if band not in self._X[:, 1]:
                 return None
+
+        if self._backend == 'jax':
+            self._setup_jax_logL()
     
         self.reset()
 
@@ -26,8 +26,11 @@ from numpyro.handlers import replay, seed, substitute, trace
 from snapi.analysis import SamplerPrior, SamplerResult
 from sklearn.utils import check_random_state
 
+from superphot_plus.samplers.compile_cache import (
+    CompileCache, bucket_length, enable_persistent_cache
+)
 from superphot_plus.samplers.superphot_sampler import SuperphotSampler
-from superphot_plus.utils import villar_fit_constraint
+from superphot_plus.utils import jax_flux_model, villar_fit_constraint
 
 #numpyro.set_host_device_count(1)
 #config.update("jax_enable_x64", True)
@@ -45,6 +48,67 @@ def lax_helper_function(svi, svi_state, num_iters, *args, **kwargs):
     u, losses = lax.scan(update_svi, svi_state, jnp.arange(num_iters), length=num_iters)
     return u, losses
 
+def lax_batch_helper_function(svi, svi_states, num_iters, **kwargs):
+    """Helper function running independent SVI updates for a batch of events
+    in lockstep. Every leaf of svi_states and kwargs has a leading event axis.
+    """
+    batch_update = vmap(lambda s, kw: svi.stable_update(s, **kw))
+
+    def update_svi(s, i):
+        u, l = batch_update(s, kwargs)
+        return (u,l)
+
+    u, losses = lax.scan(update_svi, svi_states, jnp.arange(num_iters), length=num_iters)
+    return u, losses
+
+class OrderedTraceELBO(ELBO):
+    """Single-particle Trace_ELBO that adds up the sites in trace order.
+
+    numpyro's Trace_ELBO combines the sites by iterating over a set of
+    site names, so the traced program, and with it the persistent
+    compilation cache key, depends on the process's string hash seed.
+    Summing each trace with log_density follows the order in which the
+    sites were sampled instead.
+    """
+
+    def loss_with_mutable_state(self, rng_key, param_map, model, guide, *args, **kwargs):
+        model_seed, guide_seed = random.split(rng_key)
+        guide_log_density, guide_trace = log_density(
+            seed(guide, guide_seed), args, kwargs, param_map
+        )
+        model_log_density, _ = log_density(
+            replay(seed(model, model_seed), guide_trace), args, kwargs, param_map
+        )
+        return {"loss": guide_log_density - model_log_density, "mutable_state": None}
+
+
+def elbo_converged(prev_losses, losses, rel_tol):
+    """Whether the ELBO has plateaued between two consecutive windows.
+
+    The single-particle ELBO is noisy, so the mean loss may also move by up
+    to its standard error without counting as progress.
+
+    Parameters
+    ----------
+    prev_losses : array-like
+        ELBO losses of the earlier window, with iterations along axis 0.
+    losses : array-like
+        ELBO losses of the later window.
+    rel_tol : float
+        Maximum change of the mean loss, relative to the earlier window.
+
+    Returns
+    -------
+    bool
+        True if every loss trajectory has converged.
+    """
+    prev_mean = np.mean(prev_losses, axis=0)
+    change = np.abs(np.mean(losses, axis=0) - prev_mean)
+    std_err = np.sqrt(
+        (np.var(prev_losses, axis=0) + np.var(losses, axis=0)) / len(losses)
+    )
+    return bool(np.all(change <= rel_tol * np.abs(prev_mean) + std_err))
+
 class NumpyroSampler(SuperphotSampler):
     """Samplers which use numpyro."""
 
@@ -52,7 +116,7 @@ class NumpyroSampler(SuperphotSampler):
         self, event_idx, t, obsflux, uncertainties, parameter_map,
         start_idx, end_idx, cube
     ):
-        max_length = 300
+        max_length = self._max_length
         # parameter_map.shape = (7, len(t)), cube.shape = (28,)
         new_cube_all = jnp.take(cube, parameter_map)
         
@@ -78,16 +142,8 @@ class NumpyroSampler(SuperphotSampler):
 
         fit_constraint = jnp.max(villar_fit_constraint(new_cube))
 
-        amp, beta, gamma, t_0, tau_rise, tau_fall, extra_sigma = new_cube
-        phase = jnp.clip(t_event - t_0, min=-50.*tau_rise, max=None)
-        phase = jnp.clip(phase, min=-50.*tau_fall + gamma, max=None)
-        flux_const = amp / (1.0 + jnp.exp(-phase / tau_rise))
-
-        flux = flux_const * jnp.where(
-            gamma - phase >= 0,
-            (1 - beta * phase),
-            (1 - beta * gamma) * jnp.exp(-(phase - gamma) / tau_fall)
-        )
+        flux = jax_flux_model(new_cube, t_event)
+        extra_sigma = new_cube[-1]
 
         sigma_tot = jnp.sqrt(uncertainties_event**2 + extra_sigma**2)
 
@@ -134,6 +190,7 @@ class NumpyroSampler(SuperphotSampler):
         obsflux=None,
         uncertainties=None,
         parameter_map=None,
+        mask=None,
     ):  # pylint: disable=too-many-locals
         """Create a JAX model for MCMC.
 
@@ -149,6 +206,9 @@ class NumpyroSampler(SuperphotSampler):
             Maximum flux value. Defaults to None.
         priors : MultibandPriors
             priors for all bands in lightcurves
+        mask : array-like of bool, optional
+            False for padded entries, which are left out of the constraint
+            and the likelihood. Defaults to None (no padding).
         """
         cube = self._prior_func()
         
@@ -159,30 +219,23 @@ class NumpyroSampler(SuperphotSampler):
         new_cube = cube[parameter_map]
         
         constraint = villar_fit_constraint(new_cube)
+        if mask is not None:
+            constraint = jnp.where(mask, constraint, 0.)
         
         numpyro.factor(
             "vf_constraint",
             -1000. * jnp.max(constraint)
         )
 
-        (
-            amp, beta, gamma, t_0,
-            tau_rise, tau_fall, extra_sigma
-        ) = new_cube
-
-        phase = jnp.clip(t - t_0, min=-50.*tau_rise, max=None)
-        phase = jnp.clip(phase, min=-50.*tau_fall + gamma, max=None)
-        flux_const = amp / (1.0 + jnp.exp(-phase / tau_rise))
-
-        flux = flux_const * jnp.where(
-            gamma - phase >= 0,
-            (1 - beta * phase),
-            (1 - beta * gamma) * jnp.exp(-(phase - gamma) / tau_fall)
-        )
+        flux = jax_flux_model(new_cube, t)
+        extra_sigma = new_cube[-1]
         
         sigma_tot = jnp.sqrt(uncertainties**2 + extra_sigma**2)
         
-        numpyro.sample("obs", dist.Normal(flux, sigma_tot), obs=obsflux)
+        obs_dist = dist.Normal(flux, sigma_tot)
+        if mask is not None:
+            obs_dist = obs_dist.mask(mask)
+        numpyro.sample("obs", obs_dist, obs=obsflux)
         
     def create_jax_guide(
             self,
@@ -192,7 +245,8 @@ class NumpyroSampler(SuperphotSampler):
             uncertainties=None,
             parameter_map=None,
             start_idxs=None,
-            end_idxs=None
+            end_idxs=None,
+            mask=None,
         ):
         """JAX guide function for MCMC.
         """
@@ -203,10 +257,14 @@ class NumpyroSampler(SuperphotSampler):
             priors: SamplerPrior,
             random_state: int,
             num_events=None,
+            buckets=None,
+            compilation_cache_dir=None,
             *args,
             **kwargs,
         ):
         super().__init__(priors)
+        if compilation_cache_dir is not None:
+            enable_persistent_cache(compilation_cache_dir)
         self._rng = random.key(random_state)
         self._prior_func = partial(self._priors.sample, cube=None, use_numpyro=True, num_events=num_events)
         if num_events:
@@ -214,6 +272,9 @@ class NumpyroSampler(SuperphotSampler):
         else:
             self._jax_model = self.create_jax_model
         self._jax_guide = partial(self.create_jax_guide, num_events=num_events)
+        self._num_events = num_events
+        self._buckets = buckets
+        self._max_length: Optional[int] = None
         self._orig_num_times: Optional[int] = None
         self._X = jnp.array([])
         self._y = jnp.array([])
@@ -253,14 +314,41 @@ class NumpyroSampler(SuperphotSampler):
         
         self._y = jnp.array(self._y, dtype=jnp.float32)
         
-        self._param_map = jnp.zeros((self._nparams+3, len(self._X)), dtype=int)
-        for i, param in enumerate(self._base_params):
-            for b in self._unique_bands:
-                b_idxs = self._X[:,1] == b
-                self._param_map = self._param_map.at[i,b_idxs].set(
-                    jnp.where(self._params == f'{param}_{b}')[0][0]
-                )
+        self._param_map = jnp.asarray(self._build_param_map(self._X[:,1]))
                 
+    def _padded_inputs(self):
+        """Pad the fitted light curve up to its length bucket, so light
+        curves of similar length share one compiled program. Padded entries
+        repeat the last point and are masked out of the likelihood.
+        """
+        num_times = len(self._X)
+        padded_length = bucket_length(num_times, buckets=self._buckets)
+        rows = np.minimum(np.arange(padded_length), num_times - 1)
+        return {
+            'obsflux': self._y[rows],
+            't': jnp.array(self._X[rows,0], dtype=jnp.float32),
+            'uncertainties': jnp.array(self._X[rows,2], dtype=jnp.float32),
+            'parameter_map': self._param_map[:,rows],
+            'mask': jnp.arange(padded_length) < num_times,
+        }
+
+    def _warmup_inputs(self, length):
+        """Inputs of a dummy light curve filling a length bucket, shaped
+        like those of _padded_inputs. The sampler's fitted data is left
+        untouched."""
+        bands = np.resize(np.asarray(self._unique_bands, dtype=object), length)
+        return {
+            'obsflux': jnp.zeros(length, dtype=jnp.float32),
+            't': jnp.linspace(-20., 80., length, dtype=jnp.float32),
+            'uncertainties': jnp.ones(length, dtype=jnp.float32),
+            'parameter_map': jnp.asarray(self._build_param_map(bands)),
+            'mask': jnp.ones(length, dtype=bool),
+        }
+
+    def _warmup_lengths(self, lengths):
+        """Sorted unique buckets of the given light-curve lengths."""
+        return sorted({bucket_length(l, buckets=self._buckets) for l in lengths})
+
     def _process_samples(self, samples_df):
         """Convert parameter dict from numpyro to SamplerResult."""
         # transform log-Gaussian and relative params
@@ -310,36 +398,7 @@ class NumpyroSampler(SuperphotSampler):
             )
             self.result_arr.append(self.result)
 
-        self.result = self.result_arr        
-        
-
-    def _reduced_chi_squared(self, X, y, y_pred, orig_num_times: Optional[int]=None):
-        """Returns the reduced chi-squared value of the model.
-
-        Parameters
-        ----------
-        X : np.ndarray
-            The x data to score.
-        y : np.ndarray
-            The y data to score.
-        y_pred : np.ndarray
-            The predicted y data.
-        orig_num_times: int, optional
-            length of y before padding. If None,
-            defaults to len(y)
-
-        Returns
-        -------
-        float
-            The reduced chi-squared value.
-        """
-        if orig_num_times is None:
-            orig_num_times = len(y)
-            
-        return jnp.sum(
-            (y[jnp.newaxis,:] - y_pred) ** 2 / self._eff_variance(X) / (orig_num_times - self._nparams),
-            axis=1,
-        )
+        self.result = self.result_arr
 
 class NUTSSampler(NumpyroSampler):
     """NUTS sampling using numpyro."""
@@ -351,8 +410,13 @@ class NUTSSampler(NumpyroSampler):
             num_samples: int=10_000,
             num_chains: int=4,
             random_state: int=42,
+            buckets=None,
+            compilation_cache_dir=None,
         ):
-        super().__init__(priors, random_state)
+        super().__init__(
+            priors, random_state, buckets=buckets,
+            compilation_cache_dir=compilation_cache_dir
+        )
         self._sampler_name = 'superphot_nuts'
 
         kernel = NUTS(self._jax_model, init_strategy=init_to_uniform)
@@ -386,21 +450,52 @@ class NUTSSampler(NumpyroSampler):
         """
         super().fit(X,y,orig_num_times)
         
-        self._mcmc.run(
-            self._rng,
-            obsflux=self._y,
-            t=jnp.array(self._X[:,0], dtype=jnp.float32), # type: ignore
-            uncertainties=jnp.array(self._X[:,2], dtype=jnp.float32), # type: ignore
-            parameter_map=self._param_map,
-        )
+        # MCMC caches its compiled sampler per input shape, so bucketed
+        # padding is enough to reuse it across light curves.
+        self._mcmc.run(self._rng, **self._padded_inputs())
         params = self._mcmc.get_samples()
         params_concat = np.append(params['base_samples'], params['relative_samples'], axis=1)
 
         self._process_samples(pd.DataFrame(params_concat, columns=self._params))
 
+    def warmup(self, lengths):
+        """Compile the sampler for the buckets of the given light-curve lengths.
+
+        MCMC only compiles inside run, so this runs a throwaway MCMC with
+        the same kernel and chains, but a single warmup and sample step,
+        on a dummy light curve per bucket. Combine with
+        compilation_cache_dir to make the compiled programs available to
+        other processes.
+
+        Parameters
+        ----------
+        lengths : iterable of int
+            Light-curve lengths expected in later fits.
+        """
+        mcmc = MCMC(
+            self._mcmc.sampler,
+            num_warmup=1,
+            num_samples=1,
+            num_chains=self._mcmc.num_chains,
+            chain_method=self._mcmc.chain_method,
+            jit_model_args=True,
+            progress_bar=False,
+        )
+        for length in self._warmup_lengths(lengths):
+            mcmc.run(self._rng, **self._warmup_inputs(length))
+
 
 class SVISampler(NumpyroSampler):
-    """SVI sampling using numpyro."""
+    """SVI sampling using numpyro.
+
+    Attributes
+    ----------
+    convergence : pd.DataFrame or None
+        Set by fit and fit_batch: the number of SVI iterations run and the
+        final loss, averaged over the last chunk, of each fitted event. The
+        index is the event's position in the fit's results. It is not
+        stored with the SamplerResult objects.
+    """
 
     def __init__(
             self,
@@ -409,22 +504,94 @@ class SVISampler(NumpyroSampler):
             step_size=0.001,
             random_state: int = 42,
             num_events=None,
+            buckets=None,
+            compilation_cache_dir=None,
+            early_stopping=False,
+            chunk_size=500,
+            rel_tol=1e-4,
         ):
-        super().__init__(priors, random_state, num_events)
+        super().__init__(priors, random_state, num_events, buckets, compilation_cache_dir)
         self._sampler_name = 'superphot_svi'
         self.step_size = step_size
         self.num_iter = num_iter
+        # With early stopping, num_iter is the maximum budget, rounded up
+        # to whole chunks.
+        self.early_stopping = early_stopping
+        self.chunk_size = chunk_size
+        self.rel_tol = rel_tol
         
         optimizer = numpyro.optim.Adam(self.step_size)
-        self._svi = SVI(self._jax_model, self._jax_guide, optimizer, loss=Trace_ELBO())
+        self._svi = SVI(self._jax_model, self._jax_guide, optimizer, loss=OrderedTraceELBO())
         
-        self._lax_jit = jit(lax_helper_function, static_argnums=(0, 2))
         self._svi_state = None
-        
+        # Compiled update loops close over this instance's SVI object, so
+        # they are cached per instance. Other instances and processes
+        # reuse the compiled programs through the persistent XLA cache
+        # (see compilation_cache_dir).
+        self._compile_cache = CompileCache()
+        self.convergence = None
+
+    def _compiled_update(self, *shape_key, batch=False):
+        """Return the jitted SVI update loop for a padded input shape,
+        built once per shape through the sampler's compile cache.
+        """
+        helper = lax_batch_helper_function if batch else lax_helper_function
+        num_iters = self.chunk_size if self.early_stopping else self.num_iter
+        return self._compile_cache.get(
+            (helper.__name__, num_iters) + shape_key,
+            lambda: jit(partial(helper, self._svi, num_iters=num_iters)),
+        )
+
+    def _run_updates(self, svi_state, *shape_key, batch=False, **inputs):
+        """Run SVI updates from svi_state, returning the final state and the
+        ELBO losses of every iteration.
+
+        With early stopping, updates run in chunks of chunk_size until the
+        mean loss of a chunk changes by at most rel_tol relative to the
+        previous chunk, or until num_iter is reached.
+        """
+        update = self._compiled_update(*shape_key, batch=batch)
+        if not self.early_stopping:
+            return update(svi_state, **inputs)
+
+        elbo_losses = []
+        for _ in range(-(-self.num_iter // self.chunk_size)):
+            svi_state, chunk_losses = update(svi_state, **inputs)
+            elbo_losses.append(np.asarray(chunk_losses))
+            if len(elbo_losses) > 1 and elbo_converged(*elbo_losses[-2:], self.rel_tol):
+                break
+        return svi_state, np.concatenate(elbo_losses)
+
+    def _record_convergence(self, elbo_losses, index):
+        """Set convergence from the ELBO losses of the events at index."""
+        final_loss = np.broadcast_to(
+            np.mean(elbo_losses[-self.chunk_size:], axis=0), (len(index),)
+        )
+        self.convergence = pd.DataFrame({
+            'num_iterations': len(elbo_losses),
+            'final_loss': final_loss.astype(float),
+        }, index=index)
 
     def reset(self):
         """Reset sampler, in the case it gets stuck in poor local minima."""
         self._svi_state = self._svi.init(self._rng)
+
+    def warmup(self, lengths):
+        """Compile the SVI update loop for the buckets of the given
+        light-curve lengths ahead of time, without running it. Combine with
+        compilation_cache_dir to make the compiled programs available to
+        other processes.
+
+        Parameters
+        ----------
+        lengths : iterable of int
+            Light-curve lengths expected in later calls to fit.
+        """
+        if self._num_events:
+            raise ValueError("warmup only supports non-hierarchical SVI.")
+        for length in self._warmup_lengths(lengths):
+            update = self._compiled_update(length)
+            update.lower(self._svi.init(self._rng), **self._warmup_inputs(length)).compile()
         
     def fit(
             self, X: NDArray[jnp.object_], # pylint: disable=invalid-name
@@ -447,10 +614,13 @@ class SVISampler(NumpyroSampler):
         """
         
         if event_indices is not None:
-            # pad end of arrays for masking later
-            X_padding = np.repeat([[999_999, self._unique_bands[0], 1.0],], 1000, axis=0)
+            # pad end of arrays so every event can be sliced to max_length
+            event_lengths = np.diff(np.asarray(event_indices), axis=1)
+            self._max_length = bucket_length(event_lengths.max(), buckets=self._buckets)
+            num_padding = bucket_length(len(X) + self._max_length, buckets=self._buckets) - len(X)
+            X_padding = np.repeat([[999_999, self._unique_bands[0], 1.0],], num_padding, axis=0)
             X_pad = np.concatenate([X, X_padding], axis=0)
-            y_padding = np.zeros(1000)
+            y_padding = np.zeros(num_padding)
             y_pad = np.append(y, y_padding)
         else:
             X_pad = X
@@ -467,10 +637,10 @@ class SVISampler(NumpyroSampler):
             self.reset()
 
         if event_indices is not None: #hierarchical
-            self._svi_state, elbo_losses = self._lax_jit(
-                self._svi,
+            self._svi_state, elbo_losses = self._run_updates(
                 self._svi_state,
-                self.num_iter,
+                len(self._X),
+                self._max_length,
                 obsflux=self._y,
                 t=jnp.array(self._X[:,0], dtype=jnp.float32),
                 uncertainties=jnp.array(self._X[:,2], dtype=jnp.float32),
@@ -480,14 +650,9 @@ class SVISampler(NumpyroSampler):
             )
 
         else:
-            self._svi_state, elbo_losses = self._lax_jit(
-                self._svi,
-                self._svi_state,
-                self.num_iter,
-                obsflux=self._y,
-                t=jnp.array(self._X[:,0], dtype=jnp.float32),
-                uncertainties=jnp.array(self._X[:,2], dtype=jnp.float32),
-                parameter_map=self._param_map,
+            inputs = self._padded_inputs()
+            self._svi_state, elbo_losses = self._run_updates(
+                self._svi_state, len(inputs['t']), **inputs
             )
 
         params = self._svi.get_params(self._svi_state)
@@ -532,6 +697,7 @@ class SVISampler(NumpyroSampler):
             )[:,:,jnp.newaxis] * params_scale[:,jnp.newaxis,:]
 
             self._process_samples_hierarchical(global_mu_arr, global_scale_arr, indiv_param_arr)
+            self._record_convergence(elbo_losses, np.arange(len(self.result)))
 
         else:
             params_loc = jnp.concatenate([
@@ -548,4 +714,109 @@ class SVISampler(NumpyroSampler):
             )[:,jnp.newaxis] * params_scale
 
             posterior_samples = pd.DataFrame(np.array(param_arr), columns=self._params)
-            self._process_samples(posterior_samples)
\ No newline at end of file
+            self._process_samples(posterior_samples)
+            self._record_convergence(elbo_losses, np.arange(1))
+
+    def fit_batch(
+            self, X: NDArray[jnp.object_], # pylint: disable=invalid-name
+            y: NDArray[jnp.float32],
+            event_indices,
+        ) -> list:
+        """Fit many independent light curves at once.
+
+        Unlike the hierarchical mode, events share no global priors: each
+        event gets its own SVI state, and one compiled program updates all of
+        them in lockstep. Events are padded to a common bucketed length, and
+        padded entries are masked out of the likelihood.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Concatenated times, bands and flux errors of all events.
+        y : np.ndarray
+            Concatenated fluxes of all events.
+        event_indices : list of tuples
+            (start, end) row range of each event within X.
+
+        Returns
+        -------
+        list of SamplerResult
+            One result per event, in the order of event_indices. Events with
+            no data in the prior bands are None. The iterations run and final
+            loss of the fitted events are in convergence.
+        """
+        if self._num_events:
+            raise ValueError("fit_batch fits independent events; use fit for hierarchical SVI.")
+        mask, event_offsets = self._event_offsets(X, event_indices)
+        val_x = X[mask]
+        val_y = np.asarray(y)[mask].astype(np.float32)
+
+        num_times = np.diff(event_offsets)
+        fitted = np.flatnonzero(num_times > 0)
+        num_fitted = len(fitted)
+        results = [None] * len(num_times)
+        if num_fitted == 0:
+            self.result = results
+            self.convergence = None
+            return results
+
+        # Pad each event by repeating its last point; the repeats are masked.
+        starts, lengths = event_offsets[fitted], num_times[fitted]
+        positions = np.arange(bucket_length(lengths.max(), buckets=self._buckets))
+        pad_mask = positions < lengths[:,np.newaxis]
+        rows = starts[:,np.newaxis] + np.minimum(positions, lengths[:,np.newaxis] - 1)
+        param_map = self._build_param_map(val_x[:,1])
+
+        data = {
+            't': jnp.array(val_x[rows,0], dtype=jnp.float32),
+            'obsflux': jnp.array(val_y[rows]),
+            'uncertainties': jnp.array(val_x[rows,2], dtype=jnp.float32),
+            'parameter_map': jnp.array(param_map[:,rows].transpose(1,0,2)),
+            'mask': jnp.array(pad_mask),
+        }
+
+        init_key, sample_key = random.split(self._rng)
+        svi_states = vmap(lambda k, kw: self._svi.init(k, **kw))(
+            random.split(init_key, num_fitted), data
+        )
+        svi_states, elbo_losses = self._run_updates(
+            svi_states, num_fitted, len(positions), batch=True, **data
+        )
+        params = vmap(self._svi.get_params)(svi_states)
+
+        params_loc = jnp.concatenate([
+            params['loc_base'],
+            params['loc_relative']
+        ], axis=1)
+        params_scale = jnp.concatenate([
+            params['scale_base'],
+            params['scale_relative']
+        ], axis=1)
+
+        indiv_param_arr = params_loc[:,jnp.newaxis,:] + random.normal(
+            key=sample_key, shape=(num_fitted, 1000)
+        )[:,:,jnp.newaxis] * params_scale[:,jnp.newaxis,:]
+
+        # transform is row-wise, so all events are transformed in one frame
+        samples_df = self._priors.transform(pd.DataFrame(
+            np.array(indiv_param_arr).reshape(-1, len(self._params)), columns=self._params
+        ))
+        num_draws = indiv_param_arr.shape[1]
+        for j, i in enumerate(fitted):
+            results[i] = SamplerResult(
+                samples_df.iloc[j*num_draws:(j+1)*num_draws].reset_index(drop=True),
+                sampler_name=self._sampler_name
+            )
+
+        fitted_results = [results[i] for i in fitted]
+        scores = self.score_batch(
+            val_x, val_y, fitted_results,
+            list(zip(starts, starts + lengths)),
+        )
+        for result, score in zip(fitted_results, scores):
+            result.score = score
+        self._record_convergence(elbo_losses, fitted)
+
+        self._is_fitted = True
+        self.result = results
+        return results
@@ -3,7 +3,8 @@ from typing import Optional
 import numpy as np
 
 from snapi.analysis import Sampler, SamplerPrior
-from superphot_plus.utils import flux_model
+from superphot_plus.constants import SCORE_BLOCK_SIZE
+from superphot_plus.utils import flux_model, flux_model_batch
 
 class SuperphotSampler(Sampler):
     """Subclass of SNAPI Sampler for Superphot+."""
@@ -14,6 +15,8 @@ class SuperphotSampler(Sampler):
         **kwargs
     ):
         super().__init__()
+        # draws scored at once; lower it to bound memory for long light curves
+        self.score_block_size = SCORE_BLOCK_SIZE
         self._nparams = 4 # effective DOF using first piecewise part
         self._priors = priors
         self._params = self._priors.dataframe['param'].to_numpy()
@@ -25,6 +28,13 @@ class SuperphotSampler(Sampler):
         for c in self._params:
             if self._unique_bands[0] in c:
                 self._base_params.append(c.replace("_" +self._unique_bands[0], ""))
+        # (num_base_params, num_bands) column of each base parameter per band
+        param_columns = {p: i for i, p in enumerate(self._params)}
+        self._band_columns = np.array([
+            [param_columns[f'{param}_{b}'] for b in self._unique_bands]
+            for param in self._base_params
+        ])
+        self._band_index = {b: i for i, b in enumerate(self._unique_bands)}
         self.result = None
 
     def fit(self, X, y, event_indices=None):
@@ -62,18 +72,19 @@ class SuperphotSampler(Sampler):
         extra_sigma_arr = self._reformat_cube(fit_param_numpy)[-1] # (num_times, num_fits)
         return X[:,2:3].T.astype(np.float32)**2 + (extra_sigma_arr.T)**2
 
+    def _build_param_map(self, bands):
+        """Map each time step to the parameter columns of its band."""
+        unique_bands, band_inverse = np.unique(bands, return_inverse=True)
+        band_idxs = np.array([self._band_index[b] for b in unique_bands], dtype=int)
+        return self._band_columns[:, band_idxs[band_inverse.ravel()]]
+
     def predict(self, X, num_fits=None):
         """Predicts the flux of a light curve using the model."""
         mask = np.isin(X[:,1], self._unique_bands)
         if np.all(~mask):
             return np.array([]), np.array([])
         _, val_x = super().predict(X[mask])
-        self._param_map = np.zeros((self._nparams+3, len(val_x)), dtype=int)
-        
-        for i, param in enumerate(self._base_params):
-            for b in self._unique_bands:
-                b_idxs = val_x[:,1] == b
-                self._param_map[i,b_idxs] = np.where(self._params == f'{param}_{b}')[0][0]
+        self._param_map = self._build_param_map(val_x[:,1])
                 
         fit_param_numpy = self.result.fit_parameters[self._params].to_numpy().T # each entry is a parameter
         cube = self._reformat_cube(fit_param_numpy) # (num_params, num_times, num_fits)
@@ -87,4 +98,150 @@ class SuperphotSampler(Sampler):
         return flux_model(
             cube,
             val_x[:, 0].astype(np.float32), val_x[:, 1]
-        ), val_x
\ No newline at end of file
+        ), val_x
+
+    def _event_offsets(self, X, event_indices):
+        """Band mask of concatenated light curves, and the (num_events + 1,)
+        offsets of each event within X[mask].
+        """
+        starts, ends = np.asarray(event_indices, dtype=int).T
+        if not np.array_equal(starts[1:], ends[:-1]):
+            raise ValueError("event_indices must cover contiguous, back-to-back events.")
+        if starts[0] != 0 or ends[-1] != len(X):
+            raise ValueError("event_indices must start at 0 and end at len(X).")
+        mask = np.isin(X[:,1], self._unique_bands)
+        retained = np.concatenate([[0], np.cumsum(mask)])
+        event_offsets = np.append(retained[starts], retained[ends[-1]])
+        return mask, event_offsets
+
+    def score(self, X, y, orig_num_times: Optional[int] = None):
+        """Returns the reduced chi-squared of every posterior draw.
+
+        Draws are scored in blocks of score_block_size, so peak memory is
+        bounded by the block size rather than the number of draws.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Times, bands and flux errors of the light curve.
+        y : np.ndarray
+            Fluxes of the light curve.
+        orig_num_times : int, optional
+            Number of data points before any padding. Defaults to the
+            number of retained points.
+
+        Returns
+        -------
+        np.ndarray
+            (num_fits,) reduced chi-squared values.
+        """
+        mask = np.isin(X[:,1], self._unique_bands)
+        val_x = X[mask]
+        val_y = np.asarray(y)[mask].astype(np.float32)
+        if orig_num_times is None:
+            orig_num_times = len(val_y)
+
+        param_map = self._build_param_map(val_x[:,1])
+        t = val_x[:,0].astype(np.float32)
+        err_sq = val_x[:,2].astype(np.float32)**2
+        fit_params = self.result.fit_parameters[self._params].to_numpy()
+
+        num_fits = len(fit_params)
+        block_size = max(1, min(self.score_block_size, num_fits))
+        chi_sq = np.empty(num_fits)
+        buffer = np.empty((block_size, len(t)), dtype=np.result_type(fit_params, t))
+        for start in range(0, num_fits, block_size):
+            block = fit_params[start:start+block_size]
+            cube = block.T[param_map] # (num_params, num_times, block_size)
+            residual = flux_model(cube, t, val_x[:,1], out=buffer[:len(block)])
+            residual -= val_y
+            residual **= 2
+            residual /= err_sq + cube[-1].T**2
+            chi_sq[start:start+block_size] = residual.sum(axis=1)
+        return chi_sq / (orig_num_times - self._nparams)
+
+    def _stack_events(self, X, results, event_indices, num_fits=None):
+        """Drop unsupported bands from concatenated light curves and stack
+        the posteriors of each event into a (num_events, num_fits, num_params) cube.
+        """
+        mask, event_offsets = self._event_offsets(X, event_indices)
+
+        if num_fits is None:
+            num_fits = min(len(r.fit_parameters) for r in results)
+        params = np.stack([
+            r.fit_parameters[self._params].to_numpy()[-1*num_fits:] for r in results
+        ])
+        return X[mask], mask, params, event_offsets
+
+    def predict_batch(self, X, results, event_indices, num_fits=None):
+        """Predicts the fluxes of many light curves at once.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Concatenated times, bands and flux errors of all events.
+        results : list of SamplerResult
+            One fit result per event, in the same order as event_indices.
+        event_indices : list of tuples
+            (start, end) row range of each event within X.
+        num_fits : int, optional
+            Number of posterior draws to use per event (the last num_fits).
+            Defaults to the smallest number of draws across results.
+
+        Returns
+        -------
+        f_model : np.ndarray
+            (num_fits, num_times) flux model of all retained time steps.
+        val_x : np.ndarray
+            The retained rows of X.
+        event_offsets : np.ndarray
+            (num_events + 1,) offsets of each event within val_x.
+        """
+        val_x, _, params, event_offsets = self._stack_events(X, results, event_indices, num_fits)
+        param_map = self._build_param_map(val_x[:,1])
+        f_model = flux_model_batch(
+            params, val_x[:, 0].astype(np.float32), param_map, event_offsets
+        )
+        return f_model, val_x, event_offsets
+
+    def score_batch(self, X, y, results, event_indices, num_fits=None):
+        """Returns the reduced chi-squared of every posterior draw of many
+        light curves, evaluated in one broadcast pass.
+
+        Parameters
+        ----------
+        X : np.ndarray
+            Concatenated times, bands and flux errors of all events.
+        y : np.ndarray
+            Concatenated fluxes of all events.
+        results : list of SamplerResult
+            One fit result per event, in the same order as event_indices.
+        event_indices : list of tuples
+            (start, end) row range of each event within X.
+        num_fits : int, optional
+            Number of posterior draws to use per event.
+
+        Returns
+        -------
+        np.ndarray
+            (num_events, num_fits) reduced chi-squared values. Events with no
+            retained data points are NaN.
+        """
+        val_x, mask, params, event_offsets = self._stack_events(X, results, event_indices, num_fits)
+        param_map = self._build_param_map(val_x[:,1])
+        f_model = flux_model_batch(
+            params, val_x[:, 0].astype(np.float32), param_map, event_offsets
+        )
+
+        event_idx = np.repeat(np.arange(len(results)), np.diff(event_offsets))
+        extra_sigma = params[event_idx[np.newaxis,:], :, param_map[-1:]][0].T # (num_fits, num_times)
+        chi_sq = (np.asarray(y)[mask].astype(np.float32) - f_model)**2
+        chi_sq /= val_x[:,2].astype(np.float32)**2 + extra_sigma**2
+
+        num_times = np.diff(event_offsets)
+        nonempty = num_times > 0
+        red_chi_sq = np.full((len(results), chi_sq.shape[0]), np.nan)
+        red_chi_sq[nonempty] = np.add.reduceat(
+            chi_sq, event_offsets[:-1][nonempty], axis=1
+        ).T / (num_times[nonempty, np.newaxis] - self._nparams)
+        return red_chi_sq
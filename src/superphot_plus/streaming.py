@@ -0,0 +1,243 @@
+"""Long-running classification of streamed sampler results."""
+import asyncio
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from .model.export import ExportedClassifier
+from .posterior_store import PosteriorStore
+
+if TYPE_CHECKING:
+    from .config import SuperphotConfig
+
+
+class StreamingClassifier:
+    """Classifies a stream of events with every fold's model, loaded once.
+
+    Incoming sampler results are grouped into micro-batches, whose draws
+    are gathered into one contiguous array and passed through all fold
+    models together. As in training, only draws from the configured
+    sampler within the chi-squared cutoff are used, and events without
+    such draws are left out. Each batch yields the fold-averaged
+    probabilities of its remaining events.
+
+    Parameters
+    ----------
+    models : list
+        Fold models providing evaluate_array, e.g. ExportedClassifier or
+        trained SuperphotClassifier objects.
+    labels : array-like of str
+        Class label of each probability column.
+    input_features : list of str
+        Columns of each sampler result's fit_parameters used as features.
+    sampler : str, optional
+        Name of the sampler whose draws are classified. Defaults to
+        "dynesty".
+    chisq_cutoff : float, optional
+        Maximum reduced chi-squared of classified draws. Defaults to 1.2.
+    target_label : str, optional
+        If set, events are classified as target_label when its probability
+        exceeds prob_threshhold, and as "other" otherwise.
+    prob_threshhold : float, optional
+        Threshold used with target_label. Defaults to 0.5.
+    batch_size : int, optional
+        Maximum number of events per micro-batch. Defaults to 256.
+    max_latency : float, optional
+        Seconds after the first event of a batch arrives at which the
+        batch is classified, even if not full. Defaults to 0.5.
+    """
+
+    def __init__(
+        self, models, labels, input_features, sampler="dynesty", chisq_cutoff=1.2,
+        target_label=None, prob_threshhold=0.5, batch_size=256, max_latency=0.5,
+    ):
+        self.models = models
+        self.labels = np.asarray(labels)
+        self.input_features = list(input_features)
+        self.sampler = sampler
+        self.chisq_cutoff = chisq_cutoff
+        self.target_label = target_label
+        self.prob_threshhold = prob_threshhold
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+
+        self.num_events = 0
+        self.num_draws = 0
+        self.num_batches = 0
+        self.busy_seconds = 0.0
+        self.total_latency = 0.0
+        self.max_observed_latency = 0.0
+
+    @classmethod
+    def from_config(cls, config: "SuperphotConfig", **kwargs):
+        """Load the exported fold models written by SuperphotTrainer.
+
+        Models trained with redshift features are not supported, since
+        streamed sampler results carry no redshift or peak absolute
+        magnitude.
+
+        Parameters
+        ----------
+        config : SuperphotConfig
+            The training configuration.
+        **kwargs
+            Passed on to StreamingClassifier.
+
+        Returns
+        -------
+        StreamingClassifier
+        """
+        if config.use_redshift_features:
+            raise ValueError("Streaming classification does not support redshift features.")
+        models = [
+            ExportedClassifier.load(f"{config.model_prefix}_{i}.npz")
+            for i in range(config.n_folds)
+        ]
+        return cls(
+            models, models[0].labels, models[0].feature_names,
+            sampler=config.sampler,
+            chisq_cutoff=config.chisq_cutoff,
+            target_label=config.target_label,
+            prob_threshhold=config.prob_threshhold,
+            **kwargs,
+        )
+
+    def classify(self, sampler_results):
+        """Classify a batch of events.
+
+        Parameters
+        ----------
+        sampler_results : list of SamplerResult
+            Posterior draws of each event.
+
+        Returns
+        -------
+        pd.DataFrame
+            Fold-averaged class probabilities and the predicted class of
+            each event with retained draws, indexed by event name.
+        """
+        store = PosteriorStore.from_sampler_results(sampler_results, params=self.input_features)
+        store = store.filter_draws(self.sampler, self.chisq_cutoff)
+        if len(store):
+            probs = self.models[0].evaluate_array(store.samples, store.offsets)
+            for model in self.models[1:]:
+                probs += model.evaluate_array(store.samples, store.offsets)
+            probs /= len(self.models)
+        else:
+            probs = np.empty((0, len(self.labels)))
+
+        probs_df = pd.DataFrame(probs, index=pd.Index(store.names), columns=self.labels)
+        if self.target_label is None:
+            probs_df['pred_class'] = self.labels[np.argmax(probs, axis=1)]
+        else:
+            pred_target = probs_df[self.target_label] > self.prob_threshhold
+            probs_df['pred_class'] = np.where(pred_target, self.target_label, "other")
+
+        self.num_draws += len(store.samples)
+        return probs_df
+
+    def _classify_batch(self, batch, arrival_times):
+        """Classify one micro-batch and update the counters."""
+        start_time = time.monotonic()
+        probs_df = self.classify(batch)
+        end_time = time.monotonic()
+
+        latencies = end_time - np.asarray(arrival_times)
+        self.num_events += len(batch)
+        self.num_batches += 1
+        self.busy_seconds += end_time - start_time
+        self.total_latency += latencies.sum()
+        self.max_observed_latency = max(self.max_observed_latency, latencies.max())
+        return probs_df
+
+    def stream(self, sampler_results):
+        """Classify events from an iterator in micro-batches.
+
+        A batch is classified once it holds batch_size events, or when an
+        event arrives more than max_latency seconds after the first event
+        of the batch. Remaining events are classified when the iterator
+        is exhausted.
+
+        Parameters
+        ----------
+        sampler_results : iterable of SamplerResult
+            The event stream.
+
+        Yields
+        ------
+        pd.DataFrame
+            Classifications of each micro-batch, see classify.
+        """
+        batch, arrival_times = [], []
+        for sampler_result in sampler_results:
+            batch.append(sampler_result)
+            arrival_times.append(time.monotonic())
+            if (
+                len(batch) >= self.batch_size
+                or arrival_times[-1] - arrival_times[0] >= self.max_latency
+            ):
+                yield self._classify_batch(batch, arrival_times)
+                batch, arrival_times = [], []
+        if batch:
+            yield self._classify_batch(batch, arrival_times)
+
+    async def astream(self, queue: asyncio.Queue):
+        """Classify events from an asyncio queue in micro-batches.
+
+        Batches are classified once they hold batch_size events, or
+        max_latency seconds after their first event arrived. A None item
+        ends the stream.
+
+        Parameters
+        ----------
+        queue : asyncio.Queue
+            Queue of SamplerResult objects, terminated by None.
+
+        Yields
+        ------
+        pd.DataFrame
+            Classifications of each micro-batch, see classify.
+        """
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            sampler_result = await queue.get()
+            if sampler_result is None:
+                break
+            batch, arrival_times = [sampler_result], [time.monotonic()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.batch_size:
+                try:
+                    sampler_result = await asyncio.wait_for(
+                        queue.get(), max(deadline - loop.time(), 0.0)
+                    )
+                except asyncio.TimeoutError:
+                    break
+                if sampler_result is None:
+                    done = True
+                    break
+                batch.append(sampler_result)
+                arrival_times.append(time.monotonic())
+            yield self._classify_batch(batch, arrival_times)
+
+    def stats(self):
+        """Throughput and latency counters.
+
+        Returns
+        -------
+        dict
+            Events, draws and batches classified, the seconds spent
+            classifying, events per busy second, and the mean and maximum
+            seconds from an event's arrival to its classification.
+        """
+        return {
+            "events": self.num_events,
+            "draws": self.num_draws,
+            "batches": self.num_batches,
+            "busy_seconds": self.busy_seconds,
+            "events_per_second": self.num_events / self.busy_seconds if self.busy_seconds else 0.0,
+            "mean_latency": self.total_latency / self.num_events if self.num_events else 0.0,
+            "max_latency": self.max_observed_latency,
+        }
@@ -1,4 +1,6 @@
-from typing import Optional
+import os
+import tempfile
+from typing import Optional, Union
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -9,8 +11,27 @@ from snapi import TransientGroup, SamplerResultGroup
 from .model.mlp import SuperphotMLP
 from .model.lightgbm import SuperphotLightGBM
 from .plotting.confusion_matrices import plot_matrices
+from .balancing import BalancedSampler
+from .posterior_store import PosteriorStore
 from .trainer_base import TrainerBase
 
+# Fold data published by SuperphotTrainer.run, loaded once per worker process.
+_SHARED_FOLD_DATA = {}
+
+def _publish_fold_data(shared_dir, store: PosteriorStore, meta_df: pd.DataFrame):
+    """Write the posterior store and metadata where fold workers can map them."""
+    store.save(os.path.join(shared_dir, "posteriors"))
+    meta_df.to_pickle(os.path.join(shared_dir, "metadata.pkl"))
+
+def _load_fold_data(shared_dir):
+    """Memory-map the data published by _publish_fold_data, once per process."""
+    if shared_dir not in _SHARED_FOLD_DATA:
+        _SHARED_FOLD_DATA[shared_dir] = (
+            PosteriorStore.load(os.path.join(shared_dir, "posteriors")),
+            pd.read_pickle(os.path.join(shared_dir, "metadata.pkl")),
+        )
+    return _SHARED_FOLD_DATA[shared_dir]
+
 class SuperphotTrainer(TrainerBase):
     """
     Trains and evaluates models using K-Fold cross validation.
@@ -66,11 +87,25 @@ class SuperphotTrainer(TrainerBase):
         self.train(i, train_data, val_data)
         probs_df = self.evaluate(i, test_data)
         return probs_df
+
+    def run_shared_fold(self, fold):
+        """Run single fold training + evaluation on published fold data.
+
+        Parameters
+        ----------
+        fold : tuple
+            The fold index, the directory written by _publish_fold_data,
+            and the (train, val, test) metadata row indices.
+        """
+        i, shared_dir, fold_idxs = fold
+        store, meta_df = _load_fold_data(shared_dir)
+        # retrieve_sampler_results only reads the events in each split's metadata
+        return self.run_single_fold((i, tuple((meta_df.iloc[idx], store) for idx in fold_idxs)))
         
     def run(
         self,
         transient_data: Optional[TransientGroup] = None,
-        sampler_results: Optional[SamplerResultGroup] = None,
+        sampler_results: Optional[Union[SamplerResultGroup, PosteriorStore]] = None,
     ):
         """Runs the machine learning workflow.
 
@@ -92,19 +127,25 @@ class SuperphotTrainer(TrainerBase):
         # Loads model and config
         self.setup_model()
         
-        if sampler_results is None:
-            sampler_results = SamplerResultGroup.load(self.config.sampler_results_fn)
-        if transient_data is None:
-            transient_data = TransientGroup.load(self.config.transient_data_fn)
-        
-        if self.config.n_folds <= 1:
-            k_folded_data = [self.split_train_test(transient_data, sampler_results),]
+        store, meta_df = self.load_features(transient_data, sampler_results)
+        folds = self.fold_indices(meta_df)
+
+        if self.config.ensemble_folds and self.config.model_type == 'MLP':
+            # The networks are small, so all folds train in lockstep in this process.
+            fold_data = [tuple((meta_df.iloc[idx], store) for idx in fold_idxs) for fold_idxs in folds]
+            self.train_ensemble([data[:2] for data in fold_data])
+            probs_df = [self.evaluate(i, data[2]) for i, data in enumerate(fold_data)]
         else:
-            k_folded_data = self.k_fold_split_train_test(transient_data, sampler_results)
-            
-        ctx = mp.get_context('spawn')
-        pool = ctx.Pool(self.config.n_parallel)
-        probs_df = pool.map(self.run_single_fold, zip(np.arange(self.config.n_folds), k_folded_data))
+            # Workers map one published copy of the data and only receive
+            # their fold's row indices.
+            with tempfile.TemporaryDirectory() as shared_dir:
+                _publish_fold_data(shared_dir, store, meta_df)
+                ctx = mp.get_context('spawn')
+                with ctx.Pool(self.config.n_parallel) as pool:
+                    probs_df = pool.map(
+                        self.run_shared_fold,
+                        [(i, shared_dir, fold_idxs) for i, fold_idxs in enumerate(folds)]
+                    )
         concat_df = pd.concat(probs_df)
         concat_df.to_csv(self.config.probs_fn)
         
@@ -118,30 +159,27 @@ class SuperphotTrainer(TrainerBase):
         save_fn: str
     ):
         """Return classifications for new set of events.
+
+        For continuous classification, see streaming.StreamingClassifier,
+        which keeps the fold models loaded between batches.
         """
-        transient_group = TransientGroup.load(self.config.transient_data_fn)
         meta_df = self.retrieve_transient_metadata(transient_group)
-        
-        concat_df = None
-        
-        for i in range(self.config.n_folds):
-            probs_df = self.evaluate(i, (meta_df, sr_group))
-            
-            # save to probability csv
-            if concat_df is None:
-                concat_df = probs_df
-            else:
-                concat_df = pd.concat([concat_df, probs_df], axis=0)
-            
-        concat_probs = concat_df.drop('pred_class', axis=1)
-        probs_avg = concat_probs.groupby(concat_probs.index).mean()
-        probs_avg['true_class'] = concat_probs.groupby(concat_probs.index)['true_class'].first()
-        
+        # filtered once, and shared by every fold
+        store = self.filter_posteriors(sr_group, meta_df)
+        concat_df = pd.concat(
+            [self.evaluate(i, (meta_df, store)) for i in range(self.config.n_folds)], axis=0
+        )
+
         if self.config.target_label is None:
-            probs_avg.columns = np.sort(self.config.allowed_types)
-            probs_avg['pred_class'] = probs_avg.idxmax(axis=1)
+            class_cols = np.sort(self.config.allowed_types)
+        else:
+            class_cols = np.sort([self.config.target_label, "other"])
+        probs_avg = concat_df.loc[:, class_cols].groupby(level=0).mean()
+        probs_avg['true_class'] = concat_df['true_class'].groupby(level=0).first()
+
+        if self.config.target_label is None:
+            probs_avg['pred_class'] = probs_avg.loc[:, class_cols].idxmax(axis=1)
         else:
-            probs_avg.columns = np.sort([self.config.target_label, "other"])
             pred_target = probs_avg[self.config.target_label] > self.config.prob_threshhold
             probs_avg['pred_class'] = np.where(pred_target, self.config.target_label, "other")
         
@@ -159,29 +197,78 @@ class SuperphotTrainer(TrainerBase):
         train_data : PosteriorSamplesGroup
             Contains the ZTF object names, classes and redshifts for training.
         """
-        train_df = self.retrieve_sampler_results(train_data[1], train_data[0], balance_classes=True)
-        val_df = self.retrieve_sampler_results(val_data[1], val_data[0], balance_classes=True)
-                
-        if self.config.input_features is None:
-            self.config.input_features = train_df.columns[~train_df.columns.isin(['label', 'score', 'sampler'])]
-
-        # extract features
-        train_features = train_df.loc[:, self.config.input_features]
-        val_features = val_df.loc[:, self.config.input_features]
+        train_xy, val_xy, train_kwargs = self._training_data(train_data, val_data)
         
         if not self.config.load_checkpoint:
             self.models[i] = self._create_model_instance()
 
         # Train and validate multi-layer perceptron
         metrics = self.models[i].train_and_validate(
-            train_data=(train_features, train_df['label']),
-            val_data=(val_features, val_df['label']),
+            train_data=train_xy,
+            val_data=val_xy,
             rng_seed=self.config.random_seed,
             num_epochs=self.config.num_epochs,
+            **train_kwargs,
         )
+        self._save_fold(i, metrics)
+
+    def train_ensemble(self, fold_data):
+        """Trains the MLPs of all folds in lockstep within this process.
+
+        Parameters
+        ----------
+        fold_data : list of tuple
+            The (train_data, val_data) of each fold, as passed to train.
+        """
+        train_xys, val_xys, samplers = [], [], []
+        for train_data, val_data in fold_data:
+            train_xy, val_xy, train_kwargs = self._training_data(train_data, val_data)
+            train_xys.append(train_xy)
+            val_xys.append(val_xy)
+            samplers.append(train_kwargs.get('train_sampler'))
+
+        if not self.config.load_checkpoint:
+            self.models = [self._create_model_instance() for _ in fold_data]
+
+        all_metrics = SuperphotMLP.train_ensemble(
+            self.models, train_xys, val_xys,
+            num_epochs=self.config.num_epochs,
+            rng_seed=self.config.random_seed,
+            train_samplers=samplers,
+        )
+        for i, metrics in enumerate(all_metrics):
+            self._save_fold(i, metrics)
+
+    def _training_data(self, train_data, val_data):
+        """Training and validation (features, labels), plus keyword
+        arguments for train_and_validate."""
+        # MLPs can re-draw the balanced draws every epoch instead
+        resample = self.config.resample_each_epoch and self.config.model_type == 'MLP'
+        train_df = self.retrieve_sampler_results(train_data[1], train_data[0], balance_classes=not resample)
+        val_df = self.retrieve_sampler_results(val_data[1], val_data[0], balance_classes=True)
+                
+        if self.config.input_features is None:
+            self.config.input_features = train_df.columns[~train_df.columns.isin(['label', 'score', 'sampler'])]
+
+        # extract features
+        train_features = train_df.loc[:, self.config.input_features]
+        val_features = val_df.loc[:, self.config.input_features]
+
+        train_kwargs = {}
+        if resample:
+            # draws are stored event by event
+            event_labels = train_df['label'].groupby(level=0, sort=False)
+            train_kwargs['train_sampler'] = BalancedSampler(
+                event_labels.size().to_numpy(), event_labels.first().to_numpy(),
+                self.config.fits_per_majority, seed=self.config.random_seed,
+            )
+        return (train_features, train_df['label']), (val_features, val_df['label']), train_kwargs
 
-        # Save model checkpoint
+    def _save_fold(self, i, metrics):
+        """Saves the model of fold i, and plots its training metrics."""
+        # Save model checkpoint, and its inference-only export
         self.models[i].save(self.config.model_prefix + f"_{i}")
+        self.models[i].export(self.config.model_prefix + f"_{i}.npz")
                 
         if self.config.plot:
             # Plot training and validation metrics
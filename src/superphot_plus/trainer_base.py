@@ -4,9 +4,59 @@ from sklearn.model_selection import StratifiedKFold, train_test_split
 from astropy.cosmology import Planck13 as cosmo
 from snapi import TransientGroup, SamplerResultGroup
 
+from .balancing import balanced_rows, class_quotas
 from .config import SuperphotConfig
+from .feature_cache import FeatureCache
+from .posterior_store import PosteriorStore, load_posteriors
 from .supernova_class import SupernovaClass as SnClass
 
+
+def peak_abs_mags(transient_group: TransientGroup):
+    """Peak (minimum) absolute magnitude of every transient in the group.
+
+    Equivalent to taking the minimum detected magnitude of
+    photometry.absolute(redshift) per transient, but only the apparent
+    magnitudes are gathered per transient. The per-event minimum is one
+    grouped reduction, and the distance moduli of all redshifts are
+    computed in one vectorized call, since the absolute correction is
+    constant within an event.
+
+    Parameters
+    ----------
+    transient_group : TransientGroup
+        Transients with photometry and redshifts.
+
+    Returns
+    -------
+    pd.Series
+        Peak absolute magnitude indexed by transient id. NaN where a
+        transient has no detections or no valid redshift.
+    """
+    ids, redshifts, mags = [], [], []
+    for transient in transient_group:
+        ids.append(transient.id)
+        redshifts.append(np.nan if transient.redshift is None else transient.redshift)
+        if transient.photometry is None:
+            mags.append(np.empty(0))
+        else:
+            mags.append(transient.photometry.detections['mag'].to_numpy(dtype=float))
+
+    event_idx = np.repeat(np.arange(len(ids)), [len(m) for m in mags])
+    peak_mags = pd.Series(
+        np.concatenate(mags) if mags else np.empty(0)
+    ).groupby(event_idx).min().reindex(np.arange(len(ids))).to_numpy()
+
+    redshifts = np.asarray(redshifts, dtype=float)
+    valid = redshifts > 0
+    abs_mags = np.full(len(ids), np.nan)
+    abs_mags[valid] = (
+        peak_mags[valid]
+        - cosmo.distmod(redshifts[valid]).value
+        + 2.5 * np.log10(1.0 + redshifts[valid])
+    )
+    return pd.Series(abs_mags, index=pd.Index(ids))
+
+
 class TrainerBase:
     """Trainer base class."""
 
@@ -37,7 +87,8 @@ class TrainerBase:
             label_name = 'canonical_class'
         
         if self.config.use_redshift_features:
-            transient_group.add_col('abs_mag', lambda x: x.photometry.absolute(x.redshift).detections['mag'].dropna().min())
+            abs_mags = peak_abs_mags(transient_group)
+            transient_group.add_col('abs_mag', lambda x: abs_mags[x.id])
 
         metadata = transient_group.metadata
         if not keep_original_labels:
@@ -59,47 +110,174 @@ class TrainerBase:
 
         return metadata
             
-    def retrieve_sampler_results(self, srg: SamplerResultGroup, metadata: pd.DataFrame, balance_classes=False):
+    def retrieve_sampler_results(
+        self, srg: SamplerResultGroup, metadata: pd.DataFrame,
+        balance_classes=False, fits_per_majority=None,
+    ):
         """From transient group info, retrieve dataframe
         containing all sampling posterior info.
+
+        The sampler, chi-squared and class-balancing cuts select rows of
+        one flat table of all draws, and the inputs are left unmodified.
+
+        Parameters
+        ----------
+        srg : SamplerResultGroup or PosteriorStore
+            Posterior draws of all events.
+        metadata : pd.DataFrame
+            Event metadata from retrieve_transient_metadata.
+        balance_classes : bool, optional
+            If True, randomly pick a quota of draws per event (seeded by
+            config.random_seed) so that all classes contribute equally.
+            Events with fewer draws than their quota repeat draws.
+            Defaults to False.
+        fits_per_majority : int, optional
+            Draws per majority-class event when balancing. Defaults to
+            config.fits_per_majority.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per retained draw, indexed by event name.
         """
-        new_sr = []
-        for sr in srg:
-            if sr.sampler != self.config.sampler:
-                continue
-            sr.fit_parameters = sr.fit_parameters.loc[np.array(sr.score <= self.config.chisq_cutoff),:]
-
-            if len(sr.fit_parameters) == 0:
-                continue
-            
-            sr.score = np.array(sr.score[sr.score <= self.config.chisq_cutoff])
-            new_sr.append(sr)
+        store = self.filter_posteriors(srg, metadata)
+        meta_rows = metadata.index.get_indexer(store.names)
+        event_idx = store.event_idx
 
-        filt_srg = SamplerResultGroup(new_sr)
+        rows = None
         if balance_classes:
-            class_dict = {x.Index: x.label for x in metadata.itertuples()}
-            filt_srg.balance_classes(class_dict, self.config.fits_per_majority)
-            
-        filt_samples = filt_srg.all_samples
-        
-        if self.config.use_redshift_features:
-            df = pd.merge(
-                filt_samples,
-                metadata.loc[:,['label', 'redshift', 'abs_mag']],
-                how='inner',
-                left_index=True,
-                right_index=True
+            if fits_per_majority is None:
+                fits_per_majority = self.config.fits_per_majority
+            quotas = class_quotas(
+                metadata['label'].to_numpy()[meta_rows], fits_per_majority, store.num_draws
             )
-        else:
-            df = pd.merge(
-                filt_samples,
-                metadata.loc[:,['label',]],
-                how='inner',
-                left_index=True,
-                right_index=True
+            rows = balanced_rows(
+                store.num_draws, quotas, np.random.default_rng(self.config.random_seed),
+                oversample=True,
             )
+            event_idx = event_idx[rows]
+
+        df = store.to_frame(rows)
+        meta_cols = self._metadata_cols()
+        meta_values = metadata.loc[:, meta_cols].to_numpy()[meta_rows[event_idx]]
+        for i, col in enumerate(meta_cols):
+            df[col] = meta_values[:, i]
         return df
-                                     
+
+    def filter_posteriors(self, srg: SamplerResultGroup, metadata: pd.DataFrame):
+        """Restrict posteriors to the events in metadata, and to the draws
+        from the configured sampler within the chi-squared cutoff.
+
+        Parameters
+        ----------
+        srg : SamplerResultGroup or PosteriorStore
+            Posterior draws of all events.
+        metadata : pd.DataFrame
+            Event metadata from retrieve_transient_metadata.
+
+        Returns
+        -------
+        PosteriorStore
+            The retained draws, with events in metadata order. Events
+            without retained draws are dropped.
+        """
+        if isinstance(srg, PosteriorStore):
+            store = srg
+        else:
+            store = PosteriorStore.from_sampler_results(srg)
+
+        # events in metadata order
+        event_pos = store.names_to_positions(metadata.index)
+        return store.filter_draws(
+            self.config.sampler, self.config.chisq_cutoff, event_pos[event_pos >= 0]
+        )
+
+    def load_features(self, transient_data=None, sampler_results=None):
+        """Load event metadata and the posteriors passing filter_posteriors.
+
+        When config.feature_cache_dir is set and the inputs are read from
+        the configured files, the result is cached under a fingerprint of
+        the relevant config fields and the input file contents.
+
+        Parameters
+        ----------
+        transient_data : TransientGroup, optional
+            Defaults to loading config.transient_data_fn.
+        sampler_results : SamplerResultGroup or PosteriorStore, optional
+            Defaults to loading config.posterior_store_fn if set, and
+            config.sampler_results_fn otherwise.
+
+        Returns
+        -------
+        store : PosteriorStore
+            The filtered posteriors.
+        meta_df : pd.DataFrame
+            Metadata from retrieve_transient_metadata.
+        """
+        posteriors_fn = self.config.posterior_store_fn or self.config.sampler_results_fn
+        cache = key = None
+        if self.config.feature_cache_dir is not None and transient_data is None and sampler_results is None:
+            cache = FeatureCache(self.config.feature_cache_dir, self.config.feature_cache_max_bytes)
+            key = cache.key(self.config, [self.config.transient_data_fn, posteriors_fn])
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        if sampler_results is None and self.config.posterior_store_fn is not None:
+            sampler_results = load_posteriors(self.config.posterior_store_fn)
+        if sampler_results is None:
+            sampler_results = SamplerResultGroup.load(self.config.sampler_results_fn)
+        if transient_data is None:
+            transient_data = TransientGroup.load(self.config.transient_data_fn)
+
+        meta_df = self.retrieve_transient_metadata(transient_data)
+        store = self.filter_posteriors(sampler_results, meta_df)
+        if cache is not None:
+            cache.put(key, store, meta_df)
+        return store, meta_df
+
+    def _metadata_cols(self):
+        """Metadata columns merged into the posterior feature frame."""
+        if self.config.use_redshift_features:
+            return ['label', 'redshift', 'abs_mag']
+        return ['label',]
+
+    def fold_indices(self, meta_df: pd.DataFrame):
+        """Split metadata rows into train, validation and test sets,
+        once per K-fold (or once if not using K-folds).
+
+        Parameters
+        ----------
+        meta_df : pd.DataFrame
+            Metadata from retrieve_transient_metadata.
+
+        Returns
+        -------
+        list of 3-tuples
+            Positional (train, val, test) row indices of meta_df per fold.
+        """
+        labels = meta_df['label'].to_numpy()
+        if self.kf is None:
+            splits = [self._holdout(np.arange(len(meta_df)), labels)]
+        else:
+            splits = self.kf.split(meta_df.index, labels)
+
+        folds = []
+        for train_idx, test_idx in splits:
+            train_idx, val_idx = self._holdout(train_idx, labels)
+            folds.append((train_idx, val_idx, test_idx))
+        return folds
+
+    def _holdout(self, positions, labels, split_frac=0.1):
+        """Stratified split of positions into kept and held-out positions."""
+        idx1, idx2 = train_test_split(
+            np.arange(len(positions)),
+            stratify=labels[positions],
+            test_size=split_frac,
+            random_state=self.config.random_seed
+        )
+        return positions[idx1], positions[idx2]
+
     def k_fold_split_train_test(self, transient_group, srg):
         """Reads data and splits into n K-folds. Outputs n sets
         of train/test sets.
@@ -114,23 +292,11 @@ class TrainerBase:
         list of 2-tuples
             N sets of the train data and the test data.
         """
-        k_fold_datasets = []
-
-        # Load train and test data (holdout of 10%)
         meta_df = self.retrieve_transient_metadata(transient_group)
-        for groups in self.kf.split(meta_df.index, meta_df['label']):
-            train_df, test_df = self.split(meta_df, split_indices=groups)
-            train_df, val_df = self.split(train_df, split_frac=0.1)
-            train_srg = srg.filter(train_df.index)
-            val_srg = srg.filter(val_df.index)
-            test_srg = srg.filter(test_df.index)
-            k_fold_datasets.append((
-                (train_df, train_srg),
-                (val_df, val_srg),
-                (test_df, test_srg)
-            ))
-            
-        return k_fold_datasets
+        return [
+            tuple((meta_df.iloc[idx], srg.filter(meta_df.index[idx])) for idx in fold)
+            for fold in self.fold_indices(meta_df)
+        ]
     
     def split(self, all_data, split_frac=0.1, split_indices=None):
         
@@ -160,14 +326,9 @@ class TrainerBase:
             The train data and the test data.
         """
         meta_df = self.retrieve_transient_metadata(transient_group)
-        train_df, test_df = self.split(meta_df, split_frac=0.1)
-        train_df, val_df = self.split(train_df, split_frac=0.1)
-        train_srg = srg.filter(train_df.index)
-        val_srg = srg.filter(val_df.index)
-        test_srg = srg.filter(test_df.index)
-        
-        return (
-            (train_df, train_srg),
-            (val_df, val_srg),
-            (test_df, test_srg)
+        train_idx, test_idx = self._holdout(np.arange(len(meta_df)), meta_df['label'].to_numpy())
+        train_idx, val_idx = self._holdout(train_idx, meta_df['label'].to_numpy())
+        return tuple(
+            (meta_df.iloc[idx], srg.filter(meta_df.index[idx]))
+            for idx in (train_idx, val_idx, test_idx)
         )
@@ -72,12 +72,11 @@ class SuperphotTuner(TrainerBase):
             The number of hyperparameters sets to sample from (for model tuning).
             Defaults to 10.
         """
-        if sampler_results is None:
-            sampler_results = SamplerResultGroup.load(self.config.sampler_results_fn)
-        if transient_data is None:
-            transient_data = TransientGroup.load(self.config.transient_data_fn)
-            
-        train_data, _, _ = self.split_train_test(transient_data, sampler_results) # 1st K-fold
+        store, meta_df = self.load_features(transient_data, sampler_results)
+        labels = meta_df['label'].to_numpy()
+        train_idx, _ = self._holdout(np.arange(len(meta_df)), labels)
+        train_idx, _ = self._holdout(train_idx, labels) # 1st K-fold
+        train_data = (meta_df.iloc[train_idx], store)
         
         best_config = self.tune_model(train_data, num_hp_samples)
         best_config.write_to_file(
@@ -159,17 +158,15 @@ class SuperphotTuner(TrainerBase):
         config = SuperphotConfig(**config)
 
         def run_single_fold(fold):
-            train_df, val_df = self.split(train_data[0], split_indices=groups)
-            train_srg = train_data[1].filter(train_df.index)
-            val_srg = train_data[1].filter(val_df.index)
-            
-            class_dict = {x.Index: x.label for x in train_df.itertuples()}
-            train_srg.balance_classes(class_dict, config.fits_per_majority) # custom config's fits per majority
-            class_dict = {x.Index: x.label for x in val_df.itertuples()}
-            val_srg.balance_classes(class_dict, config.fits_per_majority)
-            
-            train_df = self.retrieve_sampler_results(self, train_srg, train_df, balance_classes=False)
-            val_df = self.retrieve_sampler_results(self, val_srg, val_df, balance_classes=False)
+            train_idx, val_idx = fold
+            train_df = self.retrieve_sampler_results(
+                train_data[1], train_data[0].iloc[train_idx],
+                balance_classes=True, fits_per_majority=config.fits_per_majority, # custom config's fits per majority
+            )
+            val_df = self.retrieve_sampler_results(
+                train_data[1], train_data[0].iloc[val_idx],
+                balance_classes=True, fits_per_majority=config.fits_per_majority,
+            )
             
             if self.config.input_features is None:
                 input_features = train_df.columns[~train_df.columns.isin(['label', 'score', 'sampler'])]
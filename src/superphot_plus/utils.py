@@ -98,7 +98,7 @@ def f1_score(pred_classes, true_classes, class_average=False):
     return f1_sum / len(true_classes)
 
 
-def flux_model(cube, t_data, b_data):
+def flux_model(cube, t_data, b_data, out=None):
     """Given "cube" of fit parameters, returns the flux measurements for
     a given set of time and band data.
 
@@ -110,10 +110,8 @@ def flux_model(cube, t_data, b_data):
         The time data.
     b_data : array-like
         The band data.
-    ordered_bands : array-like
-        The band names in the cube's parameter order.
-    ref_band : str
-        The base/reference band which all other values are multiples of.
+    out : np.ndarray, optional
+        Preallocated (num_fits, num_times) buffer to write the model into.
 
     Returns
     -------
@@ -124,18 +122,75 @@ def flux_model(cube, t_data, b_data):
         cube = np.atleast_3d(cube) # (num_params, num_times, num_fits)
     # flip last two dimensions
     amp, beta, gamma, t0, tau_rise, tau_fall, _ = cube.transpose(0,2,1)
-    
-    t_data = np.repeat(t_data[np.newaxis,:], cube.shape[2], axis=0)
-    b_data = np.repeat(b_data[np.newaxis,:], cube.shape[2], axis=0)
-    phase = np.clip(t_data - t0, a_min = -50. * tau_rise, a_max = None)
-    phase = np.clip(phase, a_min = gamma - 50. * tau_fall, a_max = None)
-    f_model = amp / (1.0 + np.exp(-phase / tau_rise))
-    f_model = np.where(
-        phase >= gamma,
-        f_model * (1.0 - beta * gamma) * np.exp((gamma - phase) / tau_fall),
-        f_model * (1.0 - beta * phase)
-    )
-    return f_model
+    if out is None:
+        out = np.empty(amp.shape, dtype=np.result_type(amp, t_data))
+    # times broadcast against every fit, no per-fit copies needed
+    return _piecewise_flux(amp, beta, gamma, t0, tau_rise, tau_fall, t_data[np.newaxis,:], out)
+
+
+def flux_model_batch(params, t_data, param_map, event_offsets, out=None):
+    """Evaluates the flux model for a ragged batch of light curves in a
+    single broadcast pass.
+
+    Parameters
+    ----------
+    params : np.ndarray
+        Stacked fit parameters of shape (num_events, num_fits, num_params),
+        with the last axis in prior parameter order.
+    t_data : np.ndarray
+        Concatenated times of all events, shape (num_times,).
+    param_map : np.ndarray of int
+        (7, num_times) map from each time step to the parameter column
+        of its band.
+    event_offsets : np.ndarray of int
+        (num_events + 1,) offsets of each event within t_data.
+    out : np.ndarray, optional
+        Preallocated (num_fits, num_times) buffer to write the model into.
+
+    Returns
+    -------
+    f_model : np.ndarray
+        The (num_fits, num_times) flux model.
+    """
+    event_offsets = np.asarray(event_offsets)
+    event_idx = np.repeat(np.arange(len(event_offsets) - 1), np.diff(event_offsets))
+    # gather every time step's parameters from its own event: (num_params, num_fits, num_times)
+    cube = params[event_idx[np.newaxis,:], :, param_map].transpose(0,2,1)
+    amp, beta, gamma, t0, tau_rise, tau_fall, _ = cube
+    if out is None:
+        out = np.empty(amp.shape, dtype=np.result_type(params, t_data))
+    return _piecewise_flux(amp, beta, gamma, t0, tau_rise, tau_fall, t_data, out)
+
+
+def _piecewise_flux(amp, beta, gamma, t0, tau_rise, tau_fall, t_data, out):
+    """Evaluates the piecewise rise/plateau/decline model in place.
+
+    All parameter arrays must broadcast against t_data to the shape of out.
+    Only the phase and one decay-factor buffer are allocated per call.
+    """
+    phase = np.subtract(t_data, t0, dtype=out.dtype)
+    np.maximum(phase, -50. * tau_rise, out=phase)
+    np.maximum(phase, gamma - 50. * tau_fall, out=phase)
+    decay = phase >= gamma
+
+    # sigmoid rise
+    np.divide(phase, tau_rise, out=out)
+    np.negative(out, out=out)
+    np.exp(out, out=out)
+    out += 1.0
+    np.divide(amp, out, out=out)
+
+    # linear plateau before gamma, exponential decline after
+    factor = np.multiply(beta, phase, dtype=out.dtype)
+    np.subtract(1.0, factor, out=factor)
+    np.subtract(gamma, phase, out=phase)
+    phase /= tau_fall
+    np.exp(phase, out=phase)
+    phase *= 1.0 - beta * gamma
+    np.copyto(factor, phase, where=decay)
+
+    out *= factor
+    return out
 
 
 def params_valid(cube):
@@ -182,6 +237,29 @@ def params_valid(cube):
 
     return True
 
+def params_valid_batch(cube):
+    """Vectorized version of params_valid, checking every fit at once.
+
+    All constraints are combined elementwise before a single reduction,
+    instead of one np.any pass per constraint.
+
+    Parameters
+    ----------
+    cube : np.ndarray
+        (num_params, num_times, num_fits) cube of fit parameters.
+
+    Returns
+    -------
+    np.ndarray of bool
+        (num_fits,) mask, True where the fit's parameters are valid.
+    """
+    _, beta, gamma, _, tau_rise, tau_fall, _ = cube
+    invalid = np.isnan(cube).any(axis=0)
+    invalid |= beta > 1. / gamma
+    invalid |= np.exp(-gamma / tau_rise) * (tau_fall / tau_rise - 1.) > 1.0
+    invalid |= beta * tau_fall > 1. - beta * gamma
+    return ~invalid.any(axis=0)
+
 def villar_fit_constraint(x):
 
     return (
@@ -191,6 +269,34 @@ def villar_fit_constraint(x):
         #jnp.maximum(jnp.exp(-x[2] / x[4]) * (1.0 / x[1] - x[4] - x[2]) - x[4], 0.)
     )
 
+def jax_flux_model(cube, t_data):
+    """JAX version of flux_model for a single (num_params, num_times)
+    cube, shared by the numpyro models and compiled likelihoods.
+
+    Parameters
+    ----------
+    cube : jnp.ndarray
+        The (num_params, num_times) cube of fit parameters.
+    t_data : jnp.ndarray
+        The time data.
+
+    Returns
+    -------
+    jnp.ndarray
+        The flux model at each time.
+    """
+    amp, beta, gamma, t_0, tau_rise, tau_fall, _ = cube
+
+    phase = jnp.clip(t_data - t_0, min=-50.*tau_rise, max=None)
+    phase = jnp.clip(phase, min=-50.*tau_fall + gamma, max=None)
+    flux_const = amp / (1.0 + jnp.exp(-phase / tau_rise))
+
+    return flux_const * jnp.where(
+        gamma - phase >= 0,
+        (1 - beta * phase),
+        (1 - beta * gamma) * jnp.exp(-(phase - gamma) / tau_fall)
+    )
+
 def create_dataset(features, labels, device='cpu'):
     """Creates a PyTorch dataset object from numpy arrays.
 
@@ -212,6 +318,67 @@ def create_dataset(features, labels, device='cpu'):
     tensor_y = torch.tensor(labels, dtype=torch.int64, device=device)
     return TensorDataset(tensor_x, tensor_y)
 
+class TensorBatches:
+    """Minibatches of (features, labels) sliced from in-memory tensors.
+
+    Rows are reordered with one gather per epoch, after which every batch
+    is a view of the gathered tensors, avoiding the per-sample indexing
+    and collation of a DataLoader.
+
+    Parameters
+    ----------
+    features : np.ndarray
+        The features array.
+    labels : np.ndarray
+        The labels array.
+    batch_size : int
+        Rows per batch.
+    shuffle : bool, optional
+        If True, rows are shuffled every epoch. Defaults to False.
+    sampler : torch.utils.data.Sampler, optional
+        Draws the rows of each epoch instead, e.g. a BalancedSampler.
+    device : str, optional
+        Device holding the tensors. Defaults to 'cpu'.
+    generator : torch.Generator, optional
+        Generator of the shuffled row order. Defaults to torch's global
+        generator.
+    """
+    def __init__(
+        self, features, labels, batch_size, shuffle=False, sampler=None, device='cpu', generator=None
+    ):
+        self.features = torch.tensor(features, dtype=torch.float, device=device)
+        self.labels = torch.tensor(labels, dtype=torch.int64, device=device)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.sampler = sampler
+        self.generator = generator
+
+    def _epoch_rows(self):
+        """Rows of the next epoch, or None to keep the stored order."""
+        if self.sampler is not None:
+            return torch.as_tensor(list(self.sampler), dtype=torch.int64, device=self.features.device)
+        if self.shuffle:
+            return torch.randperm(
+                len(self.features), generator=self.generator, device=self.features.device
+            )
+        return None
+
+    def epoch_tensors(self):
+        """Features and labels of the next epoch, in batch order."""
+        rows = self._epoch_rows()
+        if rows is None:
+            return self.features, self.labels
+        return self.features[rows], self.labels[rows]
+
+    def __iter__(self):
+        features, labels = self.epoch_tensors()
+        for start in range(0, len(features), self.batch_size):
+            yield features[start:start + self.batch_size], labels[start:start + self.batch_size]
+
+    def __len__(self):
+        num_rows = len(self.features) if self.sampler is None else len(self.sampler)
+        return -(-num_rows // self.batch_size)
+
 def calculate_accuracy(y_pred, y):
     """Calculate the prediction accuracy.
 
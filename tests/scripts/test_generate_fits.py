@@ -1,7 +1,9 @@
 import os
 import tempfile
 
-from generate_fits import PosteriorsGenerator
+import numpy as np
+
+from generate_fits import PosteriorsGenerator, make_chunks, report_timings, run_sampler
 
 def test_generate_fits():
     """Tests posteriors generation for a variety of
@@ -29,3 +31,62 @@ def test_generate_fits():
 
             assert os.path.exists(fits_dir)
             assert len(os.listdir(fits_dir)) == len(os.listdir(lightcurves_dir))
+
+
+def test_make_chunks():
+    """Tests that chunks cover every light curve once, have similar costs
+    and are ordered from most to least expensive."""
+    lightcurves = [f"lc_{i}.csv" for i in range(10)]
+    costs = np.array([5.0, 1.0, 1.0, 4.0, 1.0, 1.0, 3.0, 1.0, 1.0, 2.0])
+    chunks = make_chunks(lightcurves, costs, 4)
+
+    assert sorted(sum(chunks, [])) == sorted(lightcurves)
+    assert chunks[0] == ["lc_0.csv"]
+    lc_costs = dict(zip(lightcurves, costs))
+    chunk_costs = [sum(lc_costs[f] for f in chunk) for chunk in chunks]
+    assert all(cost >= np.sum(costs) / 4 for cost in chunk_costs[:-1])
+
+    assert [len(chunk) for chunk in make_chunks(lightcurves, costs, 0)] == [10]
+    assert not make_chunks([], np.array([]), 4)
+
+
+def test_report_timings(capsys):
+    """Tests that throughput is reported and slow chunks are flagged
+    relative to their estimated cost."""
+    chunks = [["a", "b"], ["c"], ["d"], ["e"]]
+    chunk_costs = [2.0, 1.0, 1.0, 1.0]
+    report_timings(chunks, chunk_costs, {0: 2.0, 1: 1.0, 2: 10.0}, 4, 8.0)
+
+    output = capsys.readouterr().out
+    assert "Fitted 4 light curves in 8.0 s (0.50 light curves/s)." in output
+    assert "Straggler: chunk 2 took 10.0 s for ['d']" in output
+    assert "chunk 0" not in output and "chunk 1" not in output
+
+    report_timings(chunks, chunk_costs, {}, 0, 0.0)
+    assert "Fitted 0 light curves" in capsys.readouterr().out
+
+
+def test_run_sampler_failures():
+    """Tests that a failing light curve is reported without stopping the
+    others."""
+
+    class FailingSampler: # pylint: disable=too-few-public-methods
+        """Fails on the first light curve it fits."""
+
+        def __init__(self):
+            self.num_calls = 0
+
+        def run_single_curve(self, lightcurve, **kwargs): # pylint: disable=unused-argument
+            self.num_calls += 1
+            if self.num_calls == 1:
+                raise ValueError("Fit failed")
+            return kwargs["result"]
+
+    lightcurves_dir = "tests/data/ztf_lcs"
+    lightcurves = sorted(os.listdir(lightcurves_dir)) + ["missing.csv"]
+    fits, errors, seconds = run_sampler(FailingSampler(), {"result": 1}, lightcurves_dir, lightcurves)
+
+    assert list(errors) == [lightcurves[0], "missing.csv"]
+    assert "Fit failed" in errors[lightcurves[0]]
+    assert fits == [(lc_name, 1) for lc_name in lightcurves[1:-1]]
+    assert seconds >= 0.0
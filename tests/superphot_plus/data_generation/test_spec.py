@@ -0,0 +1,131 @@
+import asyncio
+import gc
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from superphot_plus.data_generation import spec
+from superphot_plus.data_generation.spec import AsyncImporter, RateLimiter
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Local stand-in for TNS and ALeRCE. TNS knows every name, but fails
+    the first two requests for "flaky". ALeRCE knows no names."""
+
+    def do_GET(self): # pylint: disable=invalid-name
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            hits = server.hits[self.path]
+        time.sleep(0.02)
+        with server.lock:
+            server.in_flight -= 1
+
+        if self.path.startswith("/alerce/") or (self.path == "/tns/flaky" and hits <= 2):
+            self.send_response(404 if self.path.startswith("/alerce/") else 503)
+        else:
+            self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args): # pylint: disable=arguments-differ
+        pass
+
+
+def test_async_importer(tmp_path):
+    """Test concurrency bound, retries and batched skip records against a
+    local HTTP server."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.lock = threading.Lock()
+    server.hits, server.in_flight, server.max_in_flight = {}, 0, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def make_query(service):
+        def query(transient):
+            try:
+                urllib.request.urlopen(f"{url}/{service}/{transient.id}")
+            except urllib.error.HTTPError as err:
+                if err.code >= 500:
+                    raise
+                return [], False
+            return [], True
+        return query
+
+    skipped_names_fn = tmp_path / "skipped_names.txt"
+    importer = AsyncImporter(
+        skipped_names_fn, max_concurrency=4, backoff=0.01, write_batch_size=5,
+        tns_query=make_query("tns"), alerce_query=make_query("alerce"),
+    )
+    names = [f"event_{i}" for i in range(11)] + ["flaky"]
+    try:
+        transients = asyncio.run(importer.run(names))
+    finally:
+        server.shutdown()
+
+    assert transients == []
+    assert 1 < server.max_in_flight <= 4
+    assert server.hits["/tns/flaky"] == 3
+    with open(skipped_names_fn, "r", encoding="utf-8") as f:
+        skipped = f.read().splitlines()
+    assert sorted(skipped) == sorted(f"{n}: ALeRCE query failed" for n in names)
+
+
+class BrokenResult:
+    """Query result that cannot be ingested."""
+
+    def to_dict(self):
+        raise ValueError("malformed")
+
+
+def test_async_importer_interrupted(tmp_path, monkeypatch, caplog):
+    """Test that a failing import only skips its name, and that an
+    interrupted run checkpoints the imported transients and cancels the
+    remaining imports."""
+    monkeypatch.setattr(spec, "quality_cuts", lambda transient: None)
+
+    async def tns_query(transient):
+        if transient.id == "broken":
+            return [BrokenResult()], True
+        return [], True
+
+    async def alerce_query(transient):
+        if transient.id.startswith("slow"):
+            await asyncio.sleep(60)
+        return [], True
+
+    skipped_names_fn = tmp_path / "skipped_names.txt"
+    importer = AsyncImporter(
+        skipped_names_fn, max_concurrency=4, tns_query=tns_query, alerce_query=alerce_query,
+    )
+    names = [f"event_{i}" for i in range(5)] + ["broken", "slow_0", "slow_1"]
+    checkpoints = []
+
+    async def run_interrupted():
+        await asyncio.wait_for(importer.run(names, 2, checkpoints.append), timeout=0.5)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run_interrupted())
+    gc.collect()
+
+    assert [len(batch) for batch in checkpoints] == [2, 2, 1]
+    assert sorted(t.id for batch in checkpoints for t in batch) == names[:5]
+    with open(skipped_names_fn, "r", encoding="utf-8") as f:
+        assert f.read() == "broken: ValueError('malformed')\n"
+    assert "never retrieved" not in caplog.text
+
+
+def test_rate_limiter():
+    """Test that requests are spaced out to the configured rate."""
+    async def wait_all(limiter):
+        start = time.monotonic()
+        await asyncio.gather(*[limiter.wait() for _ in range(5)])
+        return time.monotonic() - start
+
+    assert asyncio.run(wait_all(RateLimiter(20.0))) >= 0.19
+    assert asyncio.run(wait_all(RateLimiter())) < 0.05
@@ -0,0 +1,73 @@
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from superphot_plus.config import SuperphotConfig
+from superphot_plus.model.export import ExportedClassifier
+from superphot_plus.model.lightgbm import SuperphotLightGBM
+from superphot_plus.model.mlp import SuperphotMLP
+
+
+@pytest.mark.parametrize("model_class, target_label", [
+    (SuperphotMLP, None), (SuperphotLightGBM, None), (SuperphotLightGBM, "A"),
+])
+def test_export_round_trip(tmp_path, model_class, target_label):
+    """Test that exported classifiers predict like the originals."""
+    config = SuperphotConfig(
+        create_dirs=False, input_features=['a', 'b', 'c'], allowed_types=['A', 'B', 'C'],
+        target_label=target_label, neurons_per_layer=8, num_hidden_layers=2,
+        batch_size=16, learning_rate=1e-2,
+    )
+    rng = np.random.default_rng(9876)
+    names = np.repeat([f"event_{i}" for i in range(20)], 10)
+    features = pd.DataFrame(rng.normal(size=(200, 3)), columns=['a', 'b', 'c'], index=names)
+    labels = np.repeat(rng.choice(['A', 'B', 'C'], 20), 10)
+    if target_label is not None:
+        labels = np.where(labels == target_label, target_label, "other")
+
+    model = model_class(config)
+    model.train_and_validate((features, labels), (features, labels), num_epochs=5)
+    model.export(tmp_path / "model.npz")
+    exported = ExportedClassifier.load(tmp_path / "model.npz")
+
+    assert list(exported.labels) == sorted(np.unique(labels))
+    assert list(exported.feature_names) == ['a', 'b', 'c']
+    offsets = np.arange(0, 201, 10)
+    expected = model.evaluate_array(features.to_numpy(dtype=np.float32), offsets)
+    assert np.allclose(exported.evaluate_array(features.to_numpy(dtype=np.float32), offsets), expected, atol=1e-5)
+
+
+def test_export_loads_without_torch(tmp_path):
+    """Test that exported models load and predict with torch unavailable."""
+    config = SuperphotConfig(
+        create_dirs=False, input_features=['a', 'b'], allowed_types=['A', 'B'],
+        neurons_per_layer=4, num_hidden_layers=1, batch_size=16, learning_rate=1e-2,
+    )
+    rng = np.random.default_rng(9876)
+    features = pd.DataFrame(rng.normal(size=(40, 2)), columns=['a', 'b'])
+    labels = np.repeat(['A', 'B'], 20)
+    model = SuperphotMLP(config)
+    model.train_and_validate((features, labels), (features, labels), num_epochs=2)
+    model.export(tmp_path / "model.npz")
+
+    offsets = np.arange(0, 41, 10)
+    features = features.to_numpy(dtype=np.float32)
+    np.save(tmp_path / "features.npy", features)
+    script = (
+        "import sys\n"
+        "sys.modules['torch'] = None # imports of torch now fail\n"
+        "import numpy as np\n"
+        "from superphot_plus import StreamingClassifier\n"
+        "from superphot_plus.model import ExportedClassifier\n"
+        f"model = ExportedClassifier.load({str(tmp_path / 'model.npz')!r})\n"
+        f"features = np.load({str(tmp_path / 'features.npy')!r})\n"
+        f"probs = model.evaluate_array(features, np.arange(0, 41, 10))\n"
+        f"np.save({str(tmp_path / 'probs.npy')!r}, probs)\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+    expected = model.evaluate_array(features, offsets)
+    assert np.allclose(np.load(tmp_path / "probs.npy"), expected, atol=1e-5)
@@ -0,0 +1,136 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import SequentialSampler
+
+from superphot_plus.config import SuperphotConfig
+from superphot_plus.model.mlp import SuperphotMLP
+from superphot_plus.utils import TensorBatches
+
+
+def test_train_ensemble():
+    """Test that training folds in lockstep matches training them separately."""
+    config = SuperphotConfig(
+        create_dirs=False, model_type='MLP', input_features=['a', 'b', 'c'],
+        allowed_types=['A', 'B', 'C'], neurons_per_layer=16, num_hidden_layers=2,
+        batch_size=8, learning_rate=1e-2,
+    )
+    rng = np.random.default_rng(9876)
+    train_data, val_data = [], []
+    for num_samples in (45, 70, 30):
+        for data in (train_data, val_data):
+            data.append((
+                pd.DataFrame(rng.normal(size=(num_samples, 3)), columns=['a', 'b', 'c']),
+                rng.choice(['A', 'B', 'C'], num_samples),
+            ))
+
+    torch.manual_seed(9876)
+    models = [SuperphotMLP(config) for _ in train_data]
+    for model in models:
+        for dropout in model.dropouts: # deterministic forward passes
+            dropout.p = 0.0
+    samplers = [SequentialSampler(range(len(labels))) for _, labels in train_data]
+
+    separate_metrics = [
+        model.train_and_validate(train, val, num_epochs=5, train_sampler=sampler)
+        for model, train, val, sampler in zip(copy.deepcopy(models), train_data, val_data, samplers)
+    ]
+    ensemble_metrics = SuperphotMLP.train_ensemble(
+        models, train_data, val_data, num_epochs=5, train_samplers=samplers
+    )
+    for separate, ensemble in zip(separate_metrics, ensemble_metrics):
+        assert np.allclose(separate.train_loss, ensemble.train_loss, atol=1e-5)
+        assert np.allclose(separate.val_loss, ensemble.val_loss, atol=1e-5)
+        assert np.allclose(separate.val_acc, ensemble.val_acc)
+    assert models[0].best_val_loss == min(ensemble_metrics[0].val_loss)
+
+
+def test_train_ensemble_shuffled():
+    """Test that the ensemble matches separately trained folds with the
+    default row shuffling and dropout, given the same seed."""
+    config = SuperphotConfig(
+        create_dirs=False, model_type='MLP', input_features=['a', 'b', 'c'],
+        allowed_types=['A', 'B', 'C'], neurons_per_layer=16, num_hidden_layers=2,
+        batch_size=8, learning_rate=1e-2,
+    )
+    rng = np.random.default_rng(9876)
+    train_data, val_data = [], []
+    for num_samples in (45, 70, 30):
+        for data in (train_data, val_data):
+            data.append((
+                pd.DataFrame(rng.normal(size=(num_samples, 3)), columns=['a', 'b', 'c']),
+                rng.choice(['A', 'B', 'C'], num_samples),
+            ))
+
+    torch.manual_seed(9876)
+    models = [SuperphotMLP(config) for _ in train_data]
+    separate_models = copy.deepcopy(models)
+    separate_metrics = [
+        model.train_and_validate(train, val, num_epochs=5, rng_seed=42)
+        for model, train, val in zip(separate_models, train_data, val_data)
+    ]
+    ensemble_metrics = SuperphotMLP.train_ensemble(
+        models, train_data, val_data, num_epochs=5, rng_seed=42
+    )
+    for separate, ensemble in zip(separate_metrics, ensemble_metrics):
+        assert np.allclose(separate.train_loss, ensemble.train_loss, atol=1e-5)
+        assert np.allclose(separate.val_loss, ensemble.val_loss, atol=1e-5)
+    for separate, ensemble in zip(separate_models, models):
+        for name, t in separate.state_dict().items():
+            assert torch.allclose(t, ensemble.state_dict()[name], atol=1e-5)
+
+
+def test_early_stopping():
+    """Test that training stops after patience epochs without improvement,
+    and restores the best weights."""
+    config = SuperphotConfig(
+        create_dirs=False, model_type='MLP', input_features=['a', 'b'],
+        allowed_types=['A', 'B'], neurons_per_layer=8, num_hidden_layers=1,
+        batch_size=16, learning_rate=0.5, patience=3,
+    )
+    rng = np.random.default_rng(9876)
+    features = pd.DataFrame(rng.normal(size=(64, 2)), columns=['a', 'b'])
+    labels = rng.choice(['A', 'B'], 64)
+
+    model = SuperphotMLP(config)
+    metrics = model.train_and_validate((features, labels), (features, labels), num_epochs=200)
+    best_epoch = int(np.argmin(metrics.val_loss))
+    assert len(metrics.val_loss) == best_epoch + 4
+    assert model.best_val_loss == metrics.val_loss[best_epoch]
+    assert all(t.data_ptr() != p.data_ptr() for t, p in zip(model.best_model.values(), model.state_dict().values()))
+    assert np.isclose(model.evaluate_epoch(TensorBatches(
+        model.normalize(features).to_numpy(), np.unique(labels, return_inverse=True)[1], 16
+    ))[0], metrics.val_loss[best_epoch])
+
+
+def test_evaluate_array():
+    """Test that chunked per-event averaging matches a pandas groupby."""
+    config = SuperphotConfig(
+        create_dirs=False, model_type='MLP', input_features=['a', 'b'],
+        allowed_types=['A', 'B', 'C'], neurons_per_layer=8, num_hidden_layers=1,
+        batch_size=16, learning_rate=1e-3,
+    )
+    rng = np.random.default_rng(9876)
+    model = SuperphotMLP(config)
+    model._unique_labels = np.array(['A', 'B', 'C'])
+    model.normalization_means = np.array([1.0, -1.0])
+    model.normalization_stddevs = np.array([2.0, 0.5])
+
+    names = rng.choice([f"event_{i}" for i in range(10)], 200)
+    features = pd.DataFrame(rng.normal(size=(200, 2)), columns=['a', 'b'], index=names)
+    probs = model.predict_proba(((features - [1.0, -1.0]) / [2.0, 0.5]).to_numpy())
+    expected = pd.DataFrame(probs, index=names, columns=model._unique_labels).groupby(level=0).mean()
+
+    probs_avg = model.evaluate(features)
+    assert probs_avg.index.equals(expected.index)
+    assert np.allclose(probs_avg, expected, atol=1e-6)
+
+    # events stored back to back, including one without draws
+    sorted_features = features.sort_index().to_numpy(dtype=np.float32)
+    num_draws = np.insert(features.index.value_counts().sort_index().to_numpy(), 3, 0)
+    offsets = np.concatenate([[0], np.cumsum(num_draws)])
+    probs_avg = model.evaluate_array(sorted_features, offsets, chunk_size=7)
+    assert np.all(np.isnan(probs_avg[3]))
+    assert np.allclose(np.delete(probs_avg, 3, axis=0), expected, atol=1e-6)
@@ -0,0 +1,58 @@
+import os
+
+from jax import config
+from jax.experimental.compilation_cache import compilation_cache
+
+from superphot_plus.samplers.compile_cache import (
+    CompileCache, bucket_length, enable_persistent_cache
+)
+
+
+def test_bucket_length():
+    """Test that lengths are rounded up to power-of-two buckets."""
+    assert bucket_length(1) == 16
+    assert bucket_length(16) == 16
+    assert bucket_length(17) == 32
+    assert bucket_length(100) == 128
+    assert bucket_length(5, min_length=4) == 8
+
+
+def test_bucket_length_configured():
+    """Test that explicit buckets are used, falling back to powers of two."""
+    buckets = [20, 50, 200]
+    assert bucket_length(1, buckets=buckets) == 20
+    assert bucket_length(21, buckets=buckets) == 50
+    assert bucket_length(200, buckets=buckets) == 200
+    assert bucket_length(201, buckets=buckets) == 256
+
+
+def test_compile_cache_builds_once():
+    """Test that functions are only built on the first lookup of a key."""
+    cache = CompileCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return len(builds)
+
+    assert cache.get(("logL", 32), build) == 1
+    assert cache.get(("logL", 32), build) == 1
+    assert cache.get(("logL", 64), build) == 2
+    assert len(cache) == 2
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 2}
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats() == {"hits": 0, "misses": 0, "size": 0}
+
+
+def test_enable_persistent_cache(tmp_path):
+    """Test that the persistent cache directory is created and registered."""
+    cache_dir = os.path.join(tmp_path, "xla_cache")
+    try:
+        enable_persistent_cache(cache_dir)
+        assert os.path.isdir(cache_dir)
+        assert config.jax_compilation_cache_dir == cache_dir
+    finally:
+        config.update("jax_compilation_cache_dir", None)
+        compilation_cache.reset_cache()
@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 
 from superphot_plus.samplers.dynesty_sampler import DynestySampler
 
@@ -25,3 +26,48 @@ def test_dynesty_single_file(
 
     ## could be between ~600 and ~800, and can vary based on hardware.
     assert 600 <= len(sampler.result.fit_parameters) <= 1000
+
+
+def test_dynesty_jax_backend_matches_numpy(ztf_priors):
+    """Test that the compiled JAX likelihood agrees with the NumPy one."""
+    rng = np.random.default_rng(9876)
+    num_times = 20
+    X = np.empty((num_times, 3), dtype=object)
+    X[:, 0] = np.sort(rng.uniform(-20.0, 80.0, num_times))
+    X[:, 1] = ["ZTF_r", "ZTF_g"] * (num_times // 2)
+    X[:, 2] = 0.05
+    y = rng.uniform(0.0, 1.0, num_times)
+
+    sampler = DynestySampler(priors=ztf_priors, max_iter=10, backend="jax")
+    sampler.fit(X, y)
+    cubes = np.array([ztf_priors.sample(None) for _ in range(50)])
+    logl_jax = sampler._logL_batch(cubes)
+
+    sampler._jax_logL = sampler._jax_logL_batch = None
+    logl_numpy = sampler._logL_batch(cubes)
+
+    finite = np.isfinite(logl_numpy)
+    assert np.all(np.isfinite(logl_jax) == finite)
+    assert np.allclose(logl_jax[finite], logl_numpy[finite], rtol=1e-4)
+
+    with pytest.raises(ValueError):
+        DynestySampler(priors=ztf_priors, backend="torch")
+
+
+def test_dynesty_score_blocks(ztf_priors):
+    """Test that scoring in blocks of draws matches scoring all at once."""
+    rng = np.random.default_rng(9876)
+    num_times = 20
+    X = np.empty((num_times, 3), dtype=object)
+    X[:, 0] = np.sort(rng.uniform(-20.0, 80.0, num_times))
+    X[:, 1] = ["ZTF_r", "ZTF_g"] * (num_times // 2)
+    X[:, 2] = 0.05
+    y = rng.uniform(0.0, 1.0, num_times)
+
+    sampler = DynestySampler(priors=ztf_priors, max_iter=10)
+    sampler.fit(X, y)
+    full_score = sampler.score(X, y)
+    assert full_score.shape == (len(sampler.result.fit_parameters),)
+
+    sampler.score_block_size = 3
+    assert np.allclose(sampler.score(X, y), full_score)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from snapi.analysis import SamplerResult
+
+from superphot_plus.priors import generate_priors
+from superphot_plus.samplers.superphot_sampler import SuperphotSampler
+
+
+@pytest.fixture
+def priors():
+    return generate_priors(["ZTF_r", "ZTF_g"])
+
+
+def test_event_offsets(priors):
+    """Test that event offsets skip unsupported bands, and that event_indices
+    must tile X exactly."""
+    sampler = SuperphotSampler(priors)
+    X = np.empty((6, 3), dtype=object)
+    X[:, 1] = ["ZTF_r", "ZTF_i", "ZTF_g", "ZTF_r", "ZTF_i", "ZTF_g"]
+
+    mask, event_offsets = sampler._event_offsets(X, [(0, 2), (2, 6)])
+    assert list(mask) == [True, False, True, True, False, True]
+    assert list(event_offsets) == [0, 1, 4]
+
+    for event_indices in ([(0, 2), (3, 6)], [(1, 2), (2, 6)], [(0, 2), (2, 5)]):
+        with pytest.raises(ValueError):
+            sampler._event_offsets(X, event_indices)
+
+
+def test_score_blocks(priors):
+    """Test that scoring in blocks of draws matches scoring all at once, and
+    that a result without draws scores to an empty array."""
+    rng = np.random.default_rng(9876)
+    num_times = 20
+    X = np.empty((num_times, 3), dtype=object)
+    X[:, 0] = np.sort(rng.uniform(-20.0, 80.0, num_times))
+    X[:, 1] = ["ZTF_r", "ZTF_g"] * (num_times // 2)
+    X[:, 2] = 0.05
+    y = rng.uniform(0.0, 1.0, num_times)
+
+    sampler = SuperphotSampler(priors)
+    draws = np.array([priors.sample(None) for _ in range(10)])
+    sampler.result = SamplerResult(pd.DataFrame(draws, columns=sampler._params))
+    full_score = sampler.score(X, y)
+    assert full_score.shape == (10,)
+
+    sampler.score_block_size = 3
+    assert np.allclose(sampler.score(X, y), full_score)
+
+    sampler.result = SamplerResult(pd.DataFrame(draws[:0], columns=sampler._params))
+    assert sampler.score(X, y).shape == (0,)
@@ -0,0 +1,127 @@
+import jax.numpy as jnp
+import numpy as np
+import numpyro
+import numpyro.distributions as dist
+import pytest
+from jax import make_jaxpr, random
+from numpyro.infer import SVI, Trace_ELBO
+from numpyro.infer.autoguide import AutoNormal
+
+from superphot_plus.priors import generate_priors
+from superphot_plus.samplers.numpyro_sampler import (
+    OrderedTraceELBO, SVISampler, elbo_converged
+)
+
+
+@pytest.fixture
+def priors():
+    return generate_priors(["ZTF_r", "ZTF_g"])
+
+
+def make_lightcurves(lengths, seed=9876):
+    """Random concatenated ZTF r and g light curves of the given lengths."""
+    rng = np.random.default_rng(seed)
+    X = np.empty((sum(lengths), 3), dtype=object)
+    X[:, 0] = rng.uniform(-20.0, 80.0, sum(lengths))
+    X[:, 1] = ["ZTF_r", "ZTF_g"] * (sum(lengths) // 2)
+    X[:, 2] = 0.05
+    y = rng.uniform(0.0, 1.0, sum(lengths))
+    return X, y
+
+
+def test_svi_sampler_fit_batch(priors):
+    """Test that independent events fit in one batch each get a result,
+    and that events without data in the prior bands are skipped."""
+    lengths = [20, 4, 14]
+    X, y = make_lightcurves(lengths)
+    X[20:24, 1] = "ZTF_i"
+    event_indices = [(0, 20), (20, 24), (24, 38)]
+
+    sampler = SVISampler(priors=priors, num_iter=100, random_state=9876)
+    results = sampler.fit_batch(X, y, event_indices)
+
+    assert len(results) == 3
+    assert results[1] is None
+    for result in (results[0], results[2]):
+        assert result.fit_parameters.shape == (1000, 14)
+        assert result.score.shape == (1000,)
+        assert np.all(np.isfinite(result.score))
+
+    assert list(sampler.convergence.index) == [0, 2]
+    assert np.all(sampler.convergence['num_iterations'] == 100)
+    assert np.all(np.isfinite(sampler.convergence['final_loss']))
+
+
+def test_svi_sampler_early_stopping(priors):
+    """Test that early stopping runs whole chunks, stops before the budget
+    once the loss plateaus, and reuses one compiled update per instance."""
+    X, y = make_lightcurves([20])
+
+    sampler = SVISampler(
+        priors=priors, num_iter=20_000, random_state=9876,
+        early_stopping=True, chunk_size=200, rel_tol=1e-2,
+    )
+    sampler.fit(X, y)
+    num_iterations = sampler.convergence['num_iterations'].item()
+    assert num_iterations % 200 == 0
+    assert 400 <= num_iterations < 20_000
+    assert np.isfinite(sampler.convergence['final_loss'].item())
+    assert sampler.result.fit_parameters.shape == (1000, 14)
+
+    # one compiled update per shape, per instance
+    assert sampler._compiled_update(32) is sampler._compiled_update(32)
+    other = SVISampler(priors=priors, random_state=9876, early_stopping=True, chunk_size=200)
+    assert other._compiled_update(32) is not sampler._compiled_update(32)
+
+
+def test_elbo_converged():
+    """Test the plateau criterion on decreasing, flat and noisy ELBO traces."""
+    rng = np.random.default_rng(9876)
+    decreasing = np.linspace(100.0, 10.0, 1000)
+    assert not elbo_converged(decreasing[:500], decreasing[500:], 1e-3)
+
+    flat = np.full(1000, -20.0)
+    assert elbo_converged(flat[:500], flat[500:], 1e-3)
+
+    noisy = -20.0 + rng.normal(0.0, 5.0, 1000)
+    assert elbo_converged(noisy[:500], noisy[500:], 1e-3)
+
+    # batched traces converge only once every event has
+    batch = np.stack([flat, decreasing], axis=1)
+    assert not elbo_converged(batch[:500], batch[500:], 1e-3)
+
+
+def make_toy_model(names):
+    """Linear regression model whose sample sites are called names."""
+    def toy_model(x=None, y=None):
+        a = numpyro.sample(names[0], dist.Normal(0.0, 1.0))
+        b = numpyro.sample(names[1], dist.Normal(0.0, 1.0))
+        sigma = numpyro.sample(names[2], dist.HalfNormal(1.0))
+        numpyro.factor(names[3], -jnp.abs(a - b))
+        numpyro.sample(names[4], dist.Normal(a * x + b, sigma), obs=y)
+    return toy_model
+
+
+def test_ordered_trace_elbo():
+    """Test that OrderedTraceELBO matches Trace_ELBO, and that its traced
+    program depends on the order of the sites but not on their names (and
+    so not on the string hash seed)."""
+    x = jnp.linspace(0.0, 1.0, 16)
+    y = 2.0 * x + 1.0
+    key = random.key(1)
+
+    programs = set()
+    for prefix in "abcdefgh":
+        toy_model = make_toy_model([f"{prefix}{i}" for i in range(5)])
+        guide = AutoNormal(toy_model)
+        svi = SVI(toy_model, guide, numpyro.optim.Adam(0.01), loss=Trace_ELBO())
+        params = svi.get_params(svi.init(random.key(0), x=x, y=y))
+
+        loss = OrderedTraceELBO().loss(key, params, toy_model, guide, x=x, y=y)
+        assert np.isclose(loss, Trace_ELBO().loss(key, params, toy_model, guide, x=x, y=y))
+
+        # parameter names keep their sorted order, so only site names differ
+        programs.add(str(make_jaxpr(
+            lambda p, m=toy_model, g=guide: OrderedTraceELBO().loss(key, p, m, g, x=x, y=y)
+        )(params)))
+    assert len(programs) == 1
@@ -0,0 +1,44 @@
+import numpy as np
+
+from superphot_plus.balancing import BalancedSampler, balanced_rows, class_quotas
+
+
+def test_class_quotas():
+    """Test that minority classes get proportionally larger quotas."""
+    labels = np.array(["SN Ia", "SN Ia", "SN Ia", "SN II", "SLSN-I"])
+    quotas = class_quotas(labels, 2, num_draws=np.array([5, 5, 5, 5, 0]))
+    assert np.array_equal(quotas, [2, 2, 2, 6, 0])
+
+
+def test_balanced_rows():
+    """Test that picks stay within their events and are reproducible."""
+    num_draws = np.array([4, 0, 10])
+    quotas = np.array([6, 3, 3])
+    rows = balanced_rows(num_draws, quotas, np.random.default_rng(9876))
+    assert len(rows) == 7
+    assert np.array_equal(np.sort(rows[:4]), np.arange(4))
+    assert np.all((rows[4:] >= 4) & (rows[4:] < 14))
+    assert len(np.unique(rows[4:])) == 3
+
+    same_rows = balanced_rows(num_draws, quotas, np.random.default_rng(9876))
+    assert np.array_equal(rows, same_rows)
+
+    oversampled = balanced_rows(num_draws, quotas, np.random.default_rng(9876), oversample=True)
+    assert len(oversampled) == 9
+    # every draw of the small event is used before any repeats
+    assert np.array_equal(np.sort(oversampled[:4]), np.arange(4))
+    assert np.all(oversampled[4:6] < 4)
+
+
+def test_balanced_sampler():
+    """Test that the sampler re-draws a balanced subset every epoch."""
+    num_draws = np.array([50, 50, 50])
+    labels = np.array(["SN Ia", "SN Ia", "SN II"])
+    sampler = BalancedSampler(num_draws, labels, 5, seed=9876)
+    assert len(sampler) == 20
+
+    first, second = list(sampler), list(sampler)
+    assert len(first) == 20
+    assert sorted(first) != sorted(second)
+    event_idx = np.repeat(np.arange(3), num_draws)
+    assert np.array_equal(np.bincount(event_idx[first], minlength=3), [5, 5, 10])
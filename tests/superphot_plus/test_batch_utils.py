@@ -0,0 +1,70 @@
+import numpy as np
+
+from superphot_plus.utils import (
+    TensorBatches,
+    flux_model,
+    flux_model_batch,
+    params_valid,
+    params_valid_batch,
+)
+
+
+def test_flux_model_batch():
+    """Test that the batched flux model matches per-event evaluation."""
+    rng = np.random.default_rng(42)
+    num_fits = 10
+    event_lengths = [5, 0, 12]
+    event_offsets = np.concatenate([[0], np.cumsum(event_lengths)])
+
+    params = rng.uniform(0.5, 1.5, size=(len(event_lengths), num_fits, 14))
+    params[..., [1, 8]] = rng.uniform(0.0, 0.02, size=(len(event_lengths), num_fits, 2)) # beta
+    params[..., [3, 10]] = rng.uniform(-10.0, 10.0, size=(len(event_lengths), num_fits, 2)) # t0
+    params[..., [2, 4, 5, 9, 11, 12]] *= 20.0
+
+    t_data = rng.uniform(-30.0, 80.0, event_offsets[-1])
+    bands = rng.integers(0, 2, event_offsets[-1])
+    param_map = np.arange(7)[:, np.newaxis] + 7 * bands[np.newaxis, :]
+
+    f_batch = flux_model_batch(params, t_data, param_map, event_offsets)
+    assert f_batch.shape == (num_fits, event_offsets[-1])
+
+    for i in range(len(event_lengths)):
+        sl = slice(event_offsets[i], event_offsets[i+1])
+        cube = params[i][:, param_map[:, sl]].transpose(1, 2, 0)
+        assert np.allclose(f_batch[:, sl], flux_model(cube, t_data[sl], bands[sl]))
+
+    # preallocated output buffer is filled in place
+    out = np.empty_like(f_batch)
+    assert flux_model_batch(params, t_data, param_map, event_offsets, out=out) is out
+    assert np.allclose(out, f_batch)
+
+
+def test_params_valid_batch():
+    """Test that the fused validity mask agrees with params_valid."""
+    rng = np.random.default_rng(42)
+    cube = rng.uniform(0.1, 2.0, size=(7, 6, 50))
+    cube[1] = rng.uniform(-0.01, 0.6, size=(6, 50)) # beta
+    cube[0, 0, 3] = np.nan
+
+    valid = params_valid_batch(cube)
+    assert valid.shape == (50,)
+    assert not valid[3]
+    for i in range(50):
+        assert valid[i] == params_valid(cube[:, :, i])
+
+
+def test_tensor_batches():
+    """Test that batches cover every row once, in order unless shuffled."""
+    features = np.arange(20, dtype=float).reshape(10, 2)
+    labels = np.arange(10)
+
+    batches = TensorBatches(features, labels, 4)
+    assert len(batches) == 3
+    assert [len(y) for _, y in batches] == [4, 4, 2]
+    assert np.array_equal(np.concatenate([x.numpy() for x, _ in batches]), features)
+
+    batches = TensorBatches(features, labels, 4, shuffle=True)
+    rows = np.concatenate([y.numpy() for _, y in batches])
+    assert np.array_equal(np.sort(rows), labels)
+    for x, y in batches:
+        assert np.array_equal(x.numpy(), features[y.numpy()])
@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from superphot_plus.config import SuperphotConfig
+from superphot_plus.feature_cache import FeatureCache
+from superphot_plus.posterior_store import PosteriorStore
+
+
+def make_store(num_events=3, seed=9876):
+    """A small store with ten draws per event."""
+    rng = np.random.default_rng(seed)
+    return PosteriorStore(
+        rng.normal(size=(10 * num_events, 3)).astype(np.float32),
+        rng.uniform(size=10 * num_events).astype(np.float32),
+        np.arange(0, 10 * num_events + 1, 10),
+        [f"event_{i}" for i in range(num_events)],
+        ["dynesty"] * num_events,
+        ["a", "b", "c"],
+    )
+
+
+def test_feature_cache_key(tmp_path):
+    """Test that keys depend on fingerprinted config fields and input contents only."""
+    input_fn = os.path.join(tmp_path, "input.txt")
+    with open(input_fn, "w", encoding="utf-8") as file_handle:
+        file_handle.write("photometry")
+
+    cache = FeatureCache(os.path.join(tmp_path, "cache"), max_bytes=2**30)
+    config = SuperphotConfig(create_dirs=False)
+    key = cache.key(config, [input_fn])
+    assert cache.key(SuperphotConfig(create_dirs=False, num_epochs=1), [input_fn]) == key
+    assert cache.key(SuperphotConfig(create_dirs=False, chisq_cutoff=2.0), [input_fn]) != key
+
+    with open(input_fn, "a", encoding="utf-8") as file_handle:
+        file_handle.write(" changed")
+    assert cache.key(config, [input_fn]) != key
+
+
+def test_feature_cache_key_memoized(tmp_path):
+    """Test that input files are only re-hashed when their stat changes."""
+    input_dir = os.path.join(tmp_path, "transients")
+    os.makedirs(input_dir)
+    input_fns = [os.path.join(input_dir, f"event_{i}.csv") for i in range(3)]
+    for input_fn in input_fns:
+        with open(input_fn, "w", encoding="utf-8") as file_handle:
+            file_handle.write("photometry")
+
+    config = SuperphotConfig(create_dirs=False)
+    key = FeatureCache(os.path.join(tmp_path, "cache"), max_bytes=2**30).key(config, [input_dir])
+    cache = FeatureCache(os.path.join(tmp_path, "cache"), max_bytes=2**30)
+    assert len(cache) == 0
+
+    # same size and modification time: the memoized digest is reused
+    stat = os.stat(input_fns[0])
+    with open(input_fns[0], "w", encoding="utf-8") as file_handle:
+        file_handle.write("PHOTOMETRY")
+    os.utime(input_fns[0], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.key(config, [input_dir]) == key
+
+    os.utime(input_fns[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.key(config, [input_dir]) != key
+
+
+def test_feature_cache_round_trip(tmp_path):
+    """Test that a cached entry loads back unchanged."""
+    cache = FeatureCache(tmp_path, max_bytes=2**30)
+    store = make_store()
+    metadata = pd.DataFrame({"label": ["SN Ia", "SN II", "SN Ia"]}, index=store.names)
+
+    assert cache.get("abc") is None
+    cache.put("abc", store, metadata)
+    cached_store, cached_metadata = cache.get("abc")
+    assert np.array_equal(cached_store.samples, store.samples)
+    assert np.array_equal(cached_store.names, store.names)
+    assert cached_metadata.equals(metadata)
+
+
+def test_feature_cache_eviction(tmp_path):
+    """Test that the least recently used entries are evicted first."""
+    metadata = pd.DataFrame({"label": ["SN Ia"] * 3})
+    cache = FeatureCache(tmp_path, max_bytes=2**30)
+    cache.put("first", make_store(), metadata)
+    entry_size = sum(
+        os.path.getsize(os.path.join(root, fn))
+        for root, _, files in os.walk(tmp_path) for fn in files
+    )
+
+    cache = FeatureCache(tmp_path, max_bytes=int(2.5 * entry_size))
+    cache.put("second", make_store(), metadata)
+    os.utime(os.path.join(tmp_path, "second"), (0, 0))
+    os.utime(os.path.join(tmp_path, "first"), (1, 1))
+    cache.put("third", make_store(), metadata)
+
+    assert len(cache) == 2
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
@@ -0,0 +1,44 @@
+import os
+from types import SimpleNamespace
+
+import pandas as pd
+
+from superphot_plus import feature_cache
+from superphot_plus.fit_manifest import FitManifest, fit_fingerprint, prior_hash
+
+
+def test_fit_manifest(tmp_path, monkeypatch):
+    """Test that only new or changed light curves are stale."""
+    priors = SimpleNamespace(dataframe=pd.DataFrame({"mean": [1.0, 2.0], "std": [0.1, 0.2]}))
+    priors_hash = prior_hash(priors)
+
+    lc_fns = []
+    for i in range(3):
+        lc_fns.append(os.path.join(tmp_path, f"lc_{i}.csv"))
+        with open(lc_fns[-1], "w", encoding="utf-8") as file_handle:
+            file_handle.write(f"photometry {i}")
+
+    def fingerprints(priors_hash=priors_hash, memo=None):
+        return {fn: fit_fingerprint(fn, "dynesty", priors_hash, memo=memo) for fn in lc_fns}
+
+    manifest = FitManifest(os.path.join(tmp_path, "manifest.json"))
+    assert manifest.stale(fingerprints()) == lc_fns
+    for fn, fingerprint in fingerprints(memo=manifest.hashes).items():
+        manifest.update(fn, fingerprint)
+    manifest.save()
+
+    manifest = FitManifest(os.path.join(tmp_path, "manifest.json"))
+    assert len(manifest) == 3
+    assert not manifest.stale(fingerprints())
+
+    # memoized digests of unchanged files are reused without reading them
+    with monkeypatch.context() as patch:
+        patch.setattr(feature_cache, "hash_path", None)
+        assert not manifest.stale(fingerprints(memo=manifest.hashes))
+
+    with open(lc_fns[1], "a", encoding="utf-8") as file_handle:
+        file_handle.write(" new detection")
+    assert manifest.stale(fingerprints()) == [lc_fns[1]]
+
+    priors.dataframe.loc[0, "std"] = 0.5
+    assert manifest.stale(fingerprints(prior_hash(priors))) == lc_fns
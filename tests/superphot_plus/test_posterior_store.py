@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from superphot_plus.posterior_store import (
+    PosteriorShardWriter, PosteriorStore, ShardedPosteriorStore, load_posteriors,
+)
+
+
+def make_results(num_events=5, seed=9876):
+    """Minimal stand-ins for SamplerResult objects."""
+    rng = np.random.default_rng(seed)
+    results = []
+    for i in range(num_events):
+        num_draws = 10 + i
+        results.append(SimpleNamespace(
+            fit_parameters=pd.DataFrame(rng.normal(size=(num_draws, 3)), columns=["a", "b", "c"]),
+            score=rng.uniform(0.0, 2.0, num_draws),
+            sampler="superphot_dynesty",
+            id=f"event_{i}",
+        ))
+    return results
+
+
+def test_posterior_store_round_trip(tmp_path):
+    """Test that a saved store loads back memory-mapped and unchanged."""
+    results = make_results()
+    store = PosteriorStore.from_sampler_results(results)
+    assert len(store) == 5
+    assert store.samples.dtype == np.float32
+    assert np.array_equal(store.num_draws, np.arange(10, 15))
+
+    store.save(tmp_path)
+    loaded = PosteriorStore.load(tmp_path)
+    assert isinstance(loaded.samples, np.memmap)
+    assert np.array_equal(loaded.samples, store.samples)
+    assert np.array_equal(loaded.names, store.names)
+
+    df = loaded.to_frame()
+    assert df.shape == (60, 5)
+    assert np.allclose(df.loc["event_2", ["a", "b", "c"]], results[2].fit_parameters, atol=1e-6)
+
+
+def test_posterior_store_filter():
+    """Test that filtering keeps the named events in the given order."""
+    results = make_results()
+    store = PosteriorStore.from_sampler_results(results).filter(["event_3", "missing", "event_0"])
+
+    assert list(store.names) == ["event_3", "event_0"]
+    assert np.array_equal(store.offsets, [0, 13, 23])
+    assert np.allclose(store.samples[13:], results[0].fit_parameters, atol=1e-6)
+    assert np.allclose(store.scores[:13], results[3].score, atol=1e-6)
+
+
+def test_sharded_posterior_store(tmp_path):
+    """Test that shards are written per shard_events and later fits win."""
+    results = make_results()
+    writer = PosteriorShardWriter(tmp_path, shard_events=2)
+    assert not writer.add(results[:1])
+    assert writer.add(results[1:3])
+    writer.add(results[3:])
+    writer.flush()
+    assert writer.num_shards == 2
+
+    # a new writer appends after the existing shards
+    refit = make_results(seed=1234)
+    writer = PosteriorShardWriter(tmp_path, shard_events=2)
+    writer.add([refit[1]])
+    writer.flush()
+
+    sharded = ShardedPosteriorStore(tmp_path)
+    assert len(sharded) == 5 and "event_1" in sharded
+    assert np.allclose(sharded.get("event_1").samples, refit[1].fit_parameters, atol=1e-6)
+    assert np.allclose(sharded.get("event_3").scores, results[3].score, atol=1e-6)
+
+    store = load_posteriors(tmp_path)
+    assert list(store.names) == ["event_0", "event_2", "event_3", "event_4", "event_1"]
+    assert np.allclose(store.to_frame().loc["event_4", ["a", "b", "c"]], results[4].fit_parameters, atol=1e-6)
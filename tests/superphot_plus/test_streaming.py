@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from superphot_plus.streaming import StreamingClassifier
+
+
+class MeanModel:
+    """Stand-in fold model: the probability of class A is the mean of
+    feature a over an event's draws, plus an offset."""
+
+    def __init__(self, offset):
+        self.offset = offset
+
+    def evaluate_array(self, features, offsets):
+        means = np.add.reduceat(features[:, 0], offsets[:-1]) / np.diff(offsets)
+        prob_a = means + self.offset
+        return np.stack([prob_a, 1.0 - prob_a], axis=1)
+
+
+def make_results(num_events=10, seed=9876):
+    """Minimal stand-ins for SamplerResult objects."""
+    rng = np.random.default_rng(seed)
+    return [
+        SimpleNamespace(
+            id=f"event_{i}", sampler="dynesty", score=np.zeros(5),
+            fit_parameters=pd.DataFrame(rng.uniform(0.2, 0.8, size=(5, 2)), columns=["a", "b"]),
+        )
+        for i in range(num_events)
+    ]
+
+
+def test_stream():
+    """Test micro-batching, fold averaging and counters."""
+    results = make_results()
+    classifier = StreamingClassifier(
+        [MeanModel(-0.1), MeanModel(0.1)], ["A", "B"], ["a"], batch_size=4, max_latency=60.0
+    )
+    batches = list(classifier.stream(iter(results)))
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+
+    probs_df = pd.concat(batches)
+    assert list(probs_df.index) == [sr.id for sr in results]
+    expected = [sr.fit_parameters["a"].mean() for sr in results]
+    assert np.allclose(probs_df["A"], expected, atol=1e-6)
+    assert np.array_equal(probs_df["pred_class"], np.where(np.array(expected) > 0.5, "A", "B"))
+
+    stats = classifier.stats()
+    assert stats["events"] == 10 and stats["draws"] == 50 and stats["batches"] == 3
+
+
+def test_astream():
+    """Test that the asyncio stream flushes partial batches and stops at None."""
+    results = make_results()
+    classifier = StreamingClassifier(
+        [MeanModel(0.0)], ["A", "B"], ["a"], target_label="A", batch_size=4, max_latency=0.05
+    )
+
+    async def run():
+        queue = asyncio.Queue()
+        for sampler_result in results[:3]:
+            queue.put_nowait(sampler_result)
+        batches = []
+        async for batch in classifier.astream(queue):
+            batches.append(batch)
+            if len(batches) == 1: # only after the first batch was flushed by latency
+                for sampler_result in results[3:]:
+                    queue.put_nowait(sampler_result)
+                queue.put_nowait(None)
+        return batches
+
+    batches = asyncio.run(run())
+    assert [len(batch) for batch in batches] == [3, 4, 3]
+    assert set(batches[0]["pred_class"]) <= {"A", "other"}
+    assert classifier.stats()["events"] == 10
+
+
+def test_classify_filters_draws():
+    """Test that only draws of the configured sampler within the chi-squared
+    cutoff are classified, and that events without such draws are dropped."""
+    results = make_results(num_events=4)
+    results[0].score = np.array([0.5, 2.0, 0.5, 2.0, 2.0])
+    results[1].sampler = "svi"
+    results[2].score = np.full(5, 2.0)
+    classifier = StreamingClassifier(
+        [MeanModel(0.0)], ["A", "B"], ["a"], sampler="dynesty", chisq_cutoff=1.2
+    )
+    probs_df = classifier.classify(results)
+
+    assert list(probs_df.index) == ["event_0", "event_3"]
+    assert np.isclose(probs_df.loc["event_0", "A"], results[0].fit_parameters["a"].iloc[[0, 2]].mean())
+    assert np.isclose(probs_df.loc["event_3", "A"], results[3].fit_parameters["a"].mean())
+    assert classifier.stats()["draws"] == 7
+
+    assert classifier.classify(results[1:3]).empty
+
+
+def test_from_config_rejects_redshift_features():
+    """Test that models trained with redshift features are rejected."""
+    config = SimpleNamespace(use_redshift_features=True)
+    with pytest.raises(ValueError):
+        StreamingClassifier.from_config(config)
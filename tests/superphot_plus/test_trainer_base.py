@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from astropy.cosmology import Planck13 as cosmo
+
+from superphot_plus.config import SuperphotConfig
+from superphot_plus.posterior_store import PosteriorStore
+from superphot_plus.trainer_base import TrainerBase, peak_abs_mags
+
+
+def make_results():
+    """Minimal stand-ins for SamplerResult objects: four dynesty events
+    and one from another sampler."""
+    rng = np.random.default_rng(9876)
+    results = []
+    for i, sampler in enumerate(["dynesty", "dynesty", "dynesty", "svi", "dynesty"]):
+        results.append(SimpleNamespace(
+            fit_parameters=pd.DataFrame(rng.normal(size=(20, 3)), columns=["a", "b", "c"]),
+            score=np.linspace(0.0, 2.0, 20),
+            sampler=sampler,
+            id=f"event_{i}",
+        ))
+    return results
+
+
+def test_retrieve_sampler_results():
+    """Test the sampler and chi-squared cuts, and that inputs are unchanged."""
+    trainer = TrainerBase(SuperphotConfig(create_dirs=False, chisq_cutoff=1.0))
+    metadata = pd.DataFrame(
+        {"label": ["SN Ia", "SN Ia", "SN II", "SN II"]},
+        index=["event_0", "event_1", "event_2", "event_3"],
+    )
+    results = make_results()
+    df = trainer.retrieve_sampler_results(results, metadata)
+
+    # event_3 has the wrong sampler, event_4 has no metadata
+    assert list(df.index.unique()) == ["event_0", "event_1", "event_2"]
+    assert np.all(df["score"] <= 1.0)
+    assert df.groupby(level=0).size().tolist() == [10, 10, 10]
+    assert list(df.columns) == ["a", "b", "c", "score", "sampler", "label"]
+    assert np.allclose(df.loc["event_1", ["a", "b", "c"]], results[1].fit_parameters.iloc[:10], atol=1e-6)
+    assert len(results[0].fit_parameters) == 20
+
+    store_df = trainer.retrieve_sampler_results(PosteriorStore.from_sampler_results(results), metadata)
+    assert store_df.equals(df)
+
+
+def test_retrieve_sampler_results_balanced():
+    """Test that classes contribute equal numbers of draws."""
+    trainer = TrainerBase(SuperphotConfig(create_dirs=False, fits_per_majority=3))
+    metadata = pd.DataFrame(
+        {"label": ["SN Ia", "SN Ia", "SN II"]},
+        index=["event_0", "event_1", "event_2"],
+    )
+    df = trainer.retrieve_sampler_results(make_results(), metadata, balance_classes=True)
+    assert df.groupby(level=0).size().tolist() == [3, 3, 6]
+    assert df.groupby("label").size().tolist() == [6, 6]
+
+    # events with fewer draws than their quota repeat draws
+    num_draws = trainer.retrieve_sampler_results(make_results(), metadata).groupby(level=0).size()
+    df = trainer.retrieve_sampler_results(
+        make_results(), metadata, balance_classes=True, fits_per_majority=15
+    )
+    assert df.groupby(level=0).size().tolist() == [15, 15, 30]
+    assert len(df.loc["event_2"].drop_duplicates()) == num_draws["event_2"] < 30
+
+
+def test_fold_indices():
+    """Test that every fold partitions the metadata rows."""
+    rng = np.random.default_rng(9876)
+    metadata = pd.DataFrame(
+        {"label": rng.choice(["SN Ia", "SN II", "SLSN-I"], 100)},
+        index=[f"event_{i}" for i in range(100)],
+    )
+    for n_folds in (1, 5):
+        trainer = TrainerBase(SuperphotConfig(create_dirs=False, n_folds=n_folds))
+        folds = trainer.fold_indices(metadata)
+        assert len(folds) == n_folds
+        for train_idx, val_idx, test_idx in folds:
+            all_idx = np.concatenate([train_idx, val_idx, test_idx])
+            assert np.array_equal(np.sort(all_idx), np.arange(100))
+
+
+def test_filter_posteriors():
+    """Test that filtered stores keep metadata order and drop empty events."""
+    trainer = TrainerBase(SuperphotConfig(create_dirs=False, chisq_cutoff=1.0))
+    metadata = pd.DataFrame(
+        {"label": ["SN II", "SN Ia", "SN Ia"]},
+        index=["event_2", "event_3", "event_0"],
+    )
+    store = trainer.filter_posteriors(make_results(), metadata)
+    assert list(store.names) == ["event_2", "event_0"]
+    assert np.array_equal(store.num_draws, [10, 10])
+    assert np.all(store.scores <= 1.0)
+
+
+def test_peak_abs_mags():
+    """Test the batched peak absolute magnitudes against a per-event loop."""
+    rng = np.random.default_rng(9876)
+    transients = []
+    for i, redshift in enumerate([0.05, 0.1, None, 0.2]):
+        mags = rng.uniform(17.0, 21.0, 10)
+        mags[0] = np.nan
+        transients.append(SimpleNamespace(
+            id=f"event_{i}", redshift=redshift,
+            photometry=SimpleNamespace(detections=pd.DataFrame({"mag": mags})),
+        ))
+    transients.append(SimpleNamespace(id="event_4", redshift=0.1, photometry=None))
+
+    abs_mags = peak_abs_mags(transients)
+    assert list(abs_mags.index) == [f"event_{i}" for i in range(5)]
+    assert np.isnan(abs_mags["event_2"]) and np.isnan(abs_mags["event_4"])
+    for transient in transients[:2] + transients[3:4]:
+        expected = (
+            np.nanmin(transient.photometry.detections["mag"])
+            - cosmo.distmod(transient.redshift).value
+            + 2.5 * np.log10(1.0 + transient.redshift)
+        )
+        assert np.isclose(abs_mags[transient.id], expected)